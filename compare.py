@@ -1,38 +1,34 @@
 """ふたつの設定ファイルを比較するスクリプト"""
 
+import json
 import sys
 
+from yamaha_router_config_builder.diff import diff_files
 
-def read_config(file_path: str) -> list[str]:
-    with open(file_path, "rt") as f:
-        lines = f.readlines()
-    return [
-        line.strip()
-        for line in lines
-        if line.strip()
-        and not line.startswith("#")
-        and not line.startswith("login password")
-        and not line.startswith("administrator password")
-    ]
-
+COLORS = {
+    "added": "\033[32m",  # green
+    "removed": "\033[31m",  # red
+    "moved": "\033[33m",  # yellow
+}
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print(f"Usage: {sys.argv[0]} <file1> <file2>")
+    args = [arg for arg in sys.argv[1:] if arg != "--json"]
+    if len(args) != 2:
+        print(f"Usage: {sys.argv[0]} [--json] <file1> <file2>")
         sys.exit(1)
 
-    # read files
-    config1, config2 = read_config(sys.argv[1]), read_config(sys.argv[2])
-
     # compare configs
-    set1, set2 = set(config1), set(config2)
-    lines = [(line, "added") for line in set2 - set1] + [(line, "removed") for line in set1 - set2]
+    changes = diff_files(args[0], args[1])
 
     # print results
-    for line, change_type in sorted(lines):
-        if change_type == "added":
-            print(f"\033[32m{line}\033[39m")  # green
-        elif change_type == "removed":
-            print(f"\033[31m{line}\033[39m")  # red
-        else:
-            print(line)
+    if "--json" in sys.argv:
+        for change in changes:
+            print(json.dumps(change.to_dict(), ensure_ascii=False))
+        sys.exit(0)
+
+    block = None
+    for change in changes:
+        if change.block != block:
+            block = change.block
+            print(f"# {' '.join(block)}")
+        print(f"{COLORS[change.type]}{change.line}\033[39m")
@@ -1,7 +1,18 @@
-from os import environ
+import sys
+from os import environ, path
 
 from yamaha_router_config_builder import YamahaRouterConfigBuilder
-from yamaha_router_config_builder.utils import IPv4Addr, counter
+from yamaha_router_config_builder.compiled import placeholder
+from yamaha_router_config_builder.utils import IPv4Addr, IPv6Prefix, counter
+
+# `python main.py --compile PATH` で、シークレットをプレースホルダにした中間表現を PATH に書き出す
+# (`python -m yamaha_router_config_builder.compiled PATH` で環境変数のシークレットを埋めて出力できる)
+COMPILE_PATH = sys.argv[2] if __name__ == "__main__" and sys.argv[1:2] == ["--compile"] and len(sys.argv) > 2 else None
+
+
+def secret(name: str) -> str:
+    return placeholder(name) if COMPILE_PATH else environ[name]
+
 
 config = YamahaRouterConfigBuilder("NVR700W")
 
@@ -11,7 +22,7 @@ LAN_GUEST_ADDR = IPv4Addr("192.168.2.0/24")
 LAN_IF = "lan1"
 LAN_GUEST_IF = "lan1/1"
 WAN_IF = "onu1"
-WAN_PREFIX = f"dhcp-prefix@{WAN_IF}"
+WAN_PREFIX = IPv6Prefix(f"dhcp-prefix@{WAN_IF}", 64)
 
 interface_counter = counter(1)
 IPIP6_TUNNEL_ID = next(interface_counter)
@@ -21,8 +32,8 @@ IDS_TYPES = ["ip", "ip-option", "fragment", "icmp", "udp", "tcp"]
 
 with config.section("User"):
     # ログインパスワード設定
-    config.add(f"login password {environ["USER_PASSWORD"]}")
-    config.add(f"administrator password {environ["ADMIN_PASSWORD"]}")
+    config.add(f"login password {secret("USER_PASSWORD")}")
+    config.add(f"administrator password {secret("ADMIN_PASSWORD")}")
 
     # ログインセッションの期限を1時間に設定
     config.add(f"user attribute login-timer={60 * 60}")
@@ -44,11 +55,11 @@ with config.section("LAN"):
     config.add(f"ip {LAN_IF} proxyarp on")
 
     # LAN インタフェースの IPv6 アドレスの設定
-    config.add(f"ipv6 {LAN_IF} address {WAN_PREFIX}::1/64")
+    config.add(f"ipv6 {LAN_IF} address {WAN_PREFIX(1, prefix=True)}")
 
     # ルーター広告する IPv6 プレフィックスの設定
     IPV6_PREFIX_ID = 1
-    config.add(f"ipv6 prefix {IPV6_PREFIX_ID} {WAN_PREFIX}::/64")
+    config.add(f"ipv6 prefix {IPV6_PREFIX_ID} {WAN_PREFIX}")
 
     # ルーター広告の設定
     # o_flag=on: アドレス以外の情報をホストに自動取得させる (ゲートウェイとか？？よくわかってない)
@@ -240,7 +251,7 @@ with config.section("DNS"):
 with config.section("Mail"):
     SMTP_HOST = environ["SMTP_HOST"]
     SMTP_USERNAME = environ["SMTP_USERNAME"]
-    SMTP_PASSWORD = environ["SMTP_PASSWORD"]
+    SMTP_PASSWORD = secret("SMTP_PASSWORD")
     MAIL_TO_ADDR = environ["MAIL_TO_ADDR"]
 
     # メールサーバの設定
@@ -260,57 +271,24 @@ with config.section("Mail"):
 # TODO: VPN 接続時にインターネットにアクセスできなくなる問題が解決していない (詳細は memo.md を参照)
 with config.section("VPN"):
     VPN_CLIENTS = environ["VPN_CLIENTS"].split(",")
-    VPN_PSK = environ["VPN_PSK"]
+    VPN_PSK = secret("VPN_PSK")
     VPN_GW_ID_DOMAIN = environ["VPN_GW_ID_DOMAIN"]
 
     # VPN クライアントに割り当てる IP アドレス範囲を設定
     VPN_ADDR_POOL_ID = 1
     config.add(f"ipsec ike mode-cfg address pool {VPN_ADDR_POOL_ID} {LAN_ADDR.range(250, 254)}")
 
-    for vpn_client_name in VPN_CLIENTS:
-        TUNNEL_INTERFACE_ID = next(interface_counter)
-        # セキュアゲートウェイ ID はトンネルインタフェース番号と同じものを使うことにする
-        # ※ セキュアゲートウェイ ID はトンネルインタフェース番号はいずれも機器ごとに上限が決まっている (どうやら「VPN対地数」のことらしく、NVR700W の場合は 20)
-        #   → https://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ipsec/ipsec_chapter.html
-        SECURE_GW_ID = TUNNEL_INTERFACE_ID
-        # SA ポリシー ID はトンネルインタフェース番号と同じものを使うことにする (本来同じである必要はないが)
-        SA_POLICY_ID = TUNNEL_INTERFACE_ID
-
-        # VPN クライアントごとに IPsec トンネルを作成する
-        with config.interface("tunnel", TUNNEL_INTERFACE_ID):
-            config.add(f"description tunnel {vpn_client_name}")
-            config.add("tunnel encapsulation ipsec")
-
-            # SA ポリシーを定義し、暗号化と認証の方式として ESP を設定する
-            # ※ SA (Security Association) は IPsec 接続のこと
-            config.add(f"ipsec sa policy {SA_POLICY_ID} {SECURE_GW_ID} esp")
-
-            # トンネルで使用する SA のポリシーを設定する
-            config.add(f"ipsec tunnel {SA_POLICY_ID}")
-
-            # IKE の鍵交換を自動で開始しない (クライアント側から接続するので)
-            config.add(f"ipsec auto refresh {SA_POLICY_ID} off")
-
-            # セキュアゲートウェイで使用する IKE のバージョンを設定する
-            config.add(f"ipsec ike version {SECURE_GW_ID} 2")
-
-            # IKE キープアライブのログ出力を無効にする
-            config.add(f"ipsec ike keepalive log {SECURE_GW_ID} off")
-
-            # IKE キープアライブの設定 (10秒間隔で送信し、3回届かなかったら障害とみなす)
-            config.add(f"ipsec ike keepalive use {SECURE_GW_ID} on rfc4306 10 3")
-
-            # 自分側のセキュアゲートウェイの ID として FQDN を設定する
-            config.add(f"ipsec ike local name {SECURE_GW_ID} {VPN_GW_ID_DOMAIN} fqdn")
-
-            # 事前共有鍵 (PSK) を設定する
-            config.add(f"ipsec ike pre-shared-key {SECURE_GW_ID} text {VPN_PSK}")
-
-            # 相手側のセキュアゲートウェイの ID としてユーザ FQDN を設定する
-            config.add(f"ipsec ike remote name {SECURE_GW_ID} {vpn_client_name}@{VPN_GW_ID_DOMAIN} user-fqdn")
-
-            # IPsec クライアントに内部 IP アドレスを割り当てる際のアドレスプールを設定する
-            config.add(f"ipsec ike mode-cfg address {SECURE_GW_ID} {VPN_ADDR_POOL_ID}")
+    # VPN クライアントごとに IPsec (IKEv2) トンネルを作成する
+    # トンネルインタフェース番号・セキュアゲートウェイ ID・SA ポリシー ID はクライアントごとに同じ番号を使う
+    # ※ いずれも機器ごとに上限が決まっていて (どうやら「VPN対地数」のことらしく、NVR700W の場合は 20)、超える場合はエラーになる
+    #   → https://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ipsec/ipsec_chapter.html
+    config.ikev2_remote_access(
+        VPN_CLIENTS,
+        first_id=next(interface_counter),
+        domain=VPN_GW_ID_DOMAIN,
+        psk=VPN_PSK,
+        pool_id=VPN_ADDR_POOL_ID,
+    )
 
 
 # その他
@@ -339,4 +317,17 @@ with config.section("Other"):
     config.add(f"netvolante-dns hostname host {WAN_IF} {NETVOLANTE_DNS_HOST} ipv6 address")
 
 if __name__ == "__main__":
-    print(config.build())
+    # 壊れた設定を出力しないように、出力する前に検証する
+    problems = config.validate()
+    for problem in problems:
+        print(f"error: {problem}", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+    # ルールを追加・削除しても既存のフィルタ番号が変わらないように、番号をロックファイルに記録しておく
+    config.lock_filters(path.join(path.dirname(__file__), "filter.lock.json"))
+    if COMPILE_PATH:
+        config.compile().save(COMPILE_PATH)
+    else:
+        config.build_to(sys.stdout)
+        sys.stdout.write("\n")
@@ -0,0 +1,36 @@
+"""IPv4Addr / IPv6Prefix でアドレスを生成する速度のマイクロベンチマーク
+
+usage: python -m benchmarks.bench_addr
+"""
+
+import timeit
+
+from yamaha_router_config_builder.utils import IPv4Addr, IPv6Prefix
+
+N = 100_000
+
+IPV4 = IPv4Addr("10.0.0.0/8")
+IPV6 = IPv6Prefix("2001:db8::/64")
+IPV6_REF = IPv6Prefix("dhcp-prefix@onu1", 64)
+
+CASES = {
+    "IPv4Addr(cidr)": lambda: [IPv4Addr("10.1.2.0/24") for _ in range(N)],
+    "IPv4Addr(i)": lambda: [IPV4(i) for i in range(N)],
+    "IPv4Addr(i, prefix=True)": lambda: [IPV4(i, prefix=True) for i in range(N)],
+    "IPv4Addr.range": lambda: [IPV4.range(i, i + 10) for i in range(N)],
+    "IPv4Addr.addresses": lambda: IPV4.addresses(0, N - 1),
+    "IPv6Prefix(i)": lambda: [IPV6(i) for i in range(N)],
+    "IPv6Prefix(i) (reference)": lambda: [IPV6_REF(i) for i in range(N)],
+    "IPv6Prefix.addresses": lambda: IPV6.addresses(0, N - 1),
+}
+
+
+def main():
+    print(f"{'case':<28} {'ns/address':>10}")
+    for name, case in CASES.items():
+        sec = min(timeit.repeat(case, number=1, repeat=5))
+        print(f"{name:<28} {sec / N * 1e9:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
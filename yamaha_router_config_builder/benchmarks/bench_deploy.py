@@ -0,0 +1,58 @@
+"""ローカルに起動したルーターの代わりに設定を送り、deploy のスループットと障害時の挙動を測るベンチマーク
+
+usage: python -m benchmarks.bench_deploy [--devices N] [--drop-rate R] [--fail-rate R]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.deploy import Deployer, Target
+from yamaha_router_config_builder.fakerouter import FakeRouter
+
+
+def build_config(i: int) -> list[str]:
+    builder = YamahaRouterConfigBuilder("NVR700W")
+    with builder.section("Filter"):
+        builder.ip_filter("lan1", "in", static=[f"reject 10.{i & 0xFF}.{n}.0/24 * * * *" for n in range(200)])
+    return builder.build().split("\n")
+
+
+async def run(devices: int, concurrency: int, drop_rate: float, fail_rate: float):
+    rng = random.Random(0)
+    routers = [
+        await FakeRouter(fail_first=int(rng.random() < fail_rate), drop_rate=drop_rate, seed=i).start()
+        for i in range(devices)
+    ]
+    config = build_config(0)
+    jobs = [(Target(f"r{i}", *router.address), lambda: config) for i, router in enumerate(routers)]
+    start = time.perf_counter()
+    try:
+        results = await Deployer(concurrency=concurrency, backoff=0.05, timeout=0.05, retransmits=20).deploy(jobs)
+    finally:
+        for router in routers:
+            router.close()
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--devices", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=64)
+    parser.add_argument("--drop-rate", type=float, default=0.01)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    results, sec = asyncio.run(run(args.devices, args.concurrency, args.drop_rate, args.fail_rate))
+    size = sum(result.bytes for result in results)
+    ok = sum(result.ok for result in results)
+    retried = sum(result.attempts > 1 for result in results)
+    print(f"{ok}/{len(results)} devices ok, {retried} retried")
+    print(f"{sec:.2f} s, {len(results) / sec:.0f} devices/s, {size / sec / 1e6:.2f} MB/s")
+    assert ok == len(results), "Some deployments failed"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""共通部分を derive() で共有した場合と、デバイスごとにプロファイル全体を実行した場合の所要時間とメモリを比べるベンチマーク
+
+共通部分は合成プロファイル (benchmarks.profiles) の SHARED_SITES 拠点分、デバイスごとの部分は 1 拠点分
+
+usage: python -m benchmarks.bench_derive
+"""
+
+import gc
+import time
+import tracemalloc
+
+from benchmarks.profiles import site, synthetic_profile
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+
+DEVICES = 50
+SHARED_SITES = 100
+
+
+def full() -> list[YamahaRouterConfigBuilder]:
+    builders = []
+    for i in range(DEVICES):
+        builder = synthetic_profile(SHARED_SITES)
+        site(builder, SHARED_SITES + i)
+        builders.append(builder)
+    return builders
+
+
+def derived() -> list[YamahaRouterConfigBuilder]:
+    base = synthetic_profile(SHARED_SITES).freeze()
+    builders = []
+    for i in range(DEVICES):
+        builder = base.derive()
+        site(builder, SHARED_SITES + i)
+        builders.append(builder)
+    return builders
+
+
+def main():
+    print(f"{DEVICES} devices, shared: {SHARED_SITES} sites, per device: 1 site")
+    print(f"{'case':<8} {'profile s':>10} {'build s':>10} {'MiB':>8}")
+    outputs = []
+    for name, make in [("full", full), ("derived", derived)]:
+        gc.collect()
+        start = time.perf_counter()
+        builders = make()
+        profile = time.perf_counter() - start
+        start = time.perf_counter()
+        outputs.append([builder.build() for builder in builders])
+        build = time.perf_counter() - start
+        del builders
+        gc.collect()
+        tracemalloc.start()
+        builders = make()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del builders
+        print(f"{name:<8} {profile:>10.3f} {build:>10.3f} {memory / 2**20:>8.1f}")
+    assert outputs[0] == outputs[1], "derived builders must produce the same configs"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Filter.add / build の所要時間が定義数に対して線形に伸びることを確認するベンチマーク
+
+usage: python -m benchmarks.bench_filter
+"""
+
+import time
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+
+SIZES = [1_000, 10_000, 100_000]
+# 1 回の ip_filter 呼び出しで追加する定義数 (生成されたブロックリストを小分けに登録するケースを想定)
+CHUNK = 50
+
+
+def build_profile(n: int) -> YamahaRouterConfigBuilder:
+    builder = YamahaRouterConfigBuilder()
+    defs = [f"reject 10.{i >> 16 & 0xFF}.{i >> 8 & 0xFF}.{i & 0xFF} * * * *" for i in range(n)]
+    for i in range(0, n, CHUNK):
+        builder.ip_filter(f"lan{i // CHUNK}", "in", static=defs[i : i + CHUNK])
+    return builder
+
+
+def measure(n: int) -> float:
+    start = time.perf_counter()
+    build_profile(n).build()
+    return time.perf_counter() - start
+
+
+def main():
+    results = [(n, measure(n)) for n in SIZES]
+    print(f"{'defs':>8} {'seconds':>10} {'us/def':>8}")
+    for n, sec in results:
+        print(f"{n:>8} {sec:>10.4f} {sec / n * 1e6:>8.2f}")
+
+    # 定義あたりの時間が規模によらずほぼ一定であれば線形
+    (n_min, sec_min), (n_max, sec_max) = results[0], results[-1]
+    ratio = (sec_max / n_max) / (sec_min / n_min)
+    print(f"per-def time ratio ({n_max} / {n_min}): {ratio:.2f}")
+    assert ratio < 3, "Filter build time is not growing linearly"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""コマンドを追加したビルダーが保持しているメモリを tracemalloc で測るベンチマーク
+
+コマンド種別ごとに N 個追加した場合と、合成プロファイル (benchmarks.profiles) の場合の bytes/command を出す
+文字列は呼び出しごとに作り直す (プロファイルで f-string を使って組み立てた場合と同じ) ので、同じ値の文字列を共有できているかどうかも結果に表れる
+
+usage: python -m benchmarks.bench_memory [--scale small medium large]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from typing import Callable
+
+from benchmarks.profiles import SCALES, synthetic_profile
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+
+N = 100_000
+
+
+def add(builder: YamahaRouterConfigBuilder):
+    for i in range(N):
+        builder.add(f"ip lan1 address 10.{i >> 16 & 0xFF}.{i >> 8 & 0xFF}.{i & 0xFF}/32")
+
+
+def ip_filter(builder: YamahaRouterConfigBuilder):
+    for i in range(N):
+        builder.ip_filter(
+            f"tunnel{i % 20 + 1}",
+            "in",
+            static=[f"reject * * * * {k}" for k in range(3)],
+            dynamic=[f"* * {proto}" for proto in ("domain", "www")],
+        )
+
+
+def ip_route(builder: YamahaRouterConfigBuilder):
+    for i in range(N):
+        with builder.ip_route(f"10.{i >> 16 & 0xFF}.{i >> 8 & 0xFF}.{i & 0xFF}/32") as route:
+            route.gateway(f"tunnel {i % 20 + 1}", filters=[f"reject * * * * {k}" for k in range(2)], weight=2)
+            route.gateway(f"pp {1}", hide=True)
+
+
+def measure(profile: Callable[[], YamahaRouterConfigBuilder]) -> tuple[int, int, int]:
+    """(コマンド数, ビルダーが保持しているメモリ, ピーク) (bytes)"""
+    gc.collect()
+    tracemalloc.start()
+    builder = profile()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(builder.commands), current, peak
+
+
+def filled(fill: Callable[[YamahaRouterConfigBuilder], None]) -> Callable[[], YamahaRouterConfigBuilder]:
+    def profile():
+        builder = YamahaRouterConfigBuilder()
+        fill(builder)
+        return builder
+
+    return profile
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Measure memory held by builder commands")
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["medium"])
+    args = parser.parse_args(argv)
+
+    cases = {"add": filled(add), "ip_filter": filled(ip_filter), "ip_route": filled(ip_route)}
+    for scale in args.scale:
+        cases[f"profile ({scale})"] = lambda sites=SCALES[scale]: synthetic_profile(sites)
+
+    print(f"{'case':<20} {'commands':>9} {'MiB':>8} {'peak MiB':>9} {'bytes/command':>14}")
+    for name, profile in cases.items():
+        commands, current, peak = measure(profile)
+        print(f"{name:<20} {commands:>9} {current / 2**20:>8.1f} {peak / 2**20:>9.1f} {current / commands:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""PolicySimulator のスループット (flows/sec) を測るベンチマーク
+
+usage: python -m benchmarks.bench_simulator
+"""
+
+import time
+
+import numpy as np
+
+from yamaha_router_config_builder.simulator import Flows, PolicySimulator
+
+# main.py のトンネルインタフェース (IN) 相当のフィルタ
+DEFS = [
+    "reject 192.168.57.0/24 * * * *",
+    "reject * * udp,tcp 135 *",
+    "reject * * udp,tcp * 135",
+    "reject * * udp,tcp netbios_ns-netbios_ssn *",
+    "reject * * udp,tcp * netbios_ns-netbios_ssn",
+    "reject * * udp,tcp 445 *",
+    "reject * * udp,tcp * 445",
+    "pass * 192.168.57.0/24 icmp * *",
+    "pass * 192.168.57.0/24 tcp * 80,443",
+]
+N = 5_000_000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    flows = Flows(
+        rng.integers(0, 1 << 32, N, dtype=np.uint32),
+        rng.integers(0xC0A83900, 0xC0A83A00, N, dtype=np.uint32),
+        rng.choice(np.array([1, 6, 17], dtype=np.uint8), N),
+        rng.integers(0, 1 << 16, N, dtype=np.uint16),
+        rng.choice(np.array([80, 135, 443, 445, 53], dtype=np.uint16), N),
+    )
+    simulator = PolicySimulator(DEFS)
+    start = time.perf_counter()
+    verdicts, _ = simulator.evaluate(flows)
+    sec = time.perf_counter() - start
+    print(f"{N} flows in {sec:.3f} s ({N / sec / 1e6:.2f} M flows/sec), passed: {int((verdicts == 1).sum())}")
+
+
+if __name__ == "__main__":
+    main()
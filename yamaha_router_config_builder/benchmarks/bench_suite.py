@@ -0,0 +1,154 @@
+"""合成プロファイルで各処理の所要時間とメモリ使用量のピークを測り、ベースラインと比較するベンチマーク
+
+結果は JSON で書き出す (--output)。--baseline に以前の結果を渡すと、
+所要時間かメモリのピークが threshold (既定 25%) を超えて悪化したケースがあれば終了コード 1 で終わる
+
+usage: python -m benchmarks.bench_suite [--scale small medium large] [--output FILE] [--baseline FILE] [--threshold 0.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from benchmarks.profiles import SCALES, STATIC_DEFS, synthetic_profile
+from yamaha_router_config_builder.compiled import CompiledConfig
+from yamaha_router_config_builder.diff import diff
+from yamaha_router_config_builder.filter import Filter
+from yamaha_router_config_builder.reorder import reorder_rules
+from yamaha_router_config_builder.running import RunningConfig
+from yamaha_router_config_builder.utils import IPv4Addr
+
+# 拠点あたりのフィルタ定義数・アドレス数 (Filter / IPv4Addr のケース)
+ITEMS_PER_SITE = 100
+# 拠点あたりの並べ替えるルール数 (reorder のケース)
+RULES_PER_SITE = 5
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> float:
+    """repeat 回実行したうちの最短時間"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    """fn の実行中に確保されたメモリのピーク (bytes)"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def filter_case(n: int):
+    filter = Filter("ip", False, 1000, n)
+    for i in range(0, n, 50):
+        filter.add(f"reject 10.{k >> 16 & 0xFF}.{k >> 8 & 0xFF}.{k & 0xFF} * * * *" for k in range(i, min(i + 50, n)))
+    table = filter.build_table()
+    filter.build_commands(table)
+    return sum(_def in filter for _def in STATIC_DEFS)
+
+
+def ipv4addr_case(n: int):
+    network = IPv4Addr("10.0.0.0/8")
+    for i in range(n):
+        network(i)
+        network(i, prefix=True)
+
+
+def reorder_case(n: int):
+    # 送信元のネットワークごとに pass と reject が交互に並ぶテーブル
+    defs = [
+        f"{'pass' if k % 2 else 'reject'} 10.{k >> 8 & 0xFF}.{k & 0xFF}.0/24 192.168.{k % 4}.{k % 251} tcp * {80 if k % 3 else 443}"
+        for k in range(n)
+    ]
+    return reorder_rules("ip", defs, {_def: k % 97 for k, _def in enumerate(defs)})
+
+
+def cases(scale: str) -> dict[str, tuple[Callable[[], Any], bool]]:
+    """ケース名 → (計測する処理, メモリも測るか)"""
+    sites = SCALES[scale]
+    builder = synthetic_profile(sites)
+    old = builder.build().split("\n")
+    new = synthetic_profile(sites, variant=1).build().split("\n")
+    text = "\n".join(old)
+    # プロファイルを実行する代わりに、保存した中間表現を読み込んでレンダリングする場合
+    compiled = os.path.join(tempfile.mkdtemp(), "compiled.json")
+    builder.compile().save(compiled)
+    return {
+        f"{scale}/profile": (lambda: synthetic_profile(sites), True),
+        f"{scale}/build": (builder.build, True),
+        f"{scale}/validate": (builder.validate, True),
+        f"{scale}/compiled": (lambda: CompiledConfig.load(compiled).render({}), True),
+        f"{scale}/diff": (lambda: sum(1 for _ in diff(old, new)), True),
+        f"{scale}/running": (lambda: RunningConfig(text), True),
+        f"{scale}/filter": (lambda: filter_case(sites * ITEMS_PER_SITE), False),
+        f"{scale}/ipv4addr": (lambda: ipv4addr_case(sites * ITEMS_PER_SITE), False),
+        f"{scale}/reorder": (lambda: reorder_case(sites * RULES_PER_SITE), False),
+    }
+
+
+def run(scales: list[str], repeat: int) -> dict[str, dict[str, float | int]]:
+    results: dict[str, dict[str, float | int]] = {}
+    for scale in scales:
+        for name, (fn, traced) in cases(scale).items():
+            result: dict[str, float | int] = {"seconds": measure(fn, repeat)}
+            if traced:
+                result["peak_bytes"] = peak_memory(fn)
+            results[name] = result
+            memory = f"{result['peak_bytes'] / 2**20:.1f} MiB" if "peak_bytes" in result else "-"
+            print(f"{name:<18} {result['seconds']:>10.4f} s {memory:>12}")
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float | int]], baseline: dict[str, dict[str, float | int]], threshold: float
+) -> list[str]:
+    """ベースラインから threshold を超えて悪化した (ケース, 指標) の一覧"""
+    regressions = []
+    for name, result in results.items():
+        for metric, value in result.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            ratio = value / base
+            print(f"{name:<18} {metric:<10} {ratio:>6.2f}x")
+            if ratio > 1 + threshold:
+                regressions.append(f"{name} {metric}: {base:.4g} -> {value:.4g} ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark builds of synthetic profiles")
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write results as JSON (use as a baseline later)")
+    parser.add_argument("--baseline", help="results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / memory growth ratio")
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.repeat)
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline, "rt") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            sys.exit("Performance regressions:\n" + "\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
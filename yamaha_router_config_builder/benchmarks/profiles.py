@@ -0,0 +1,63 @@
+"""ベンチマーク用の合成プロファイル
+
+拠点 (site) ごとに、フィルタ・ゲートウェイ付きの経路・NAT ディスクリプタ・DHCP の固定割り当て・VPN トンネルを持つセクションを作る
+1 拠点あたり約 155 行なので、SCALES の large で約 100 万行になる
+"""
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.utils import IPv4Addr
+
+# 拠点数
+SCALES = {
+    "small": 64,
+    "medium": 640,
+    "large": 6400,
+}
+
+ROUTES = 20
+NAT_STATICS = 10
+DHCP_BINDS = 50
+VPN_CLIENTS = 5
+
+# 拠点間で共有するフィルタ定義 (フィルタテーブルの 1000 個の枠に収まる数)
+STATIC_DEFS = [f"reject 192.168.{i >> 4}.{(i & 15) << 4}/28 * * * *" for i in range(900)]
+DYNAMIC_DEFS = [f"* * {proto}" for proto in ("domain", "www", "ftp", "smtp", "pop3", "submission", "tcp", "udp")]
+
+
+def site(builder: YamahaRouterConfigBuilder, i: int, variant: int = 0):
+    """
+    i 番目の拠点の設定を追加する
+    variant を変えると 10 拠点に 1 拠点の割合で、経路の重み・DHCP の固定割り当て・VPN クライアントが変わる
+    """
+    changed = variant != 0 and i % 10 == 0
+    with builder.section(f"Site {i}"):
+        builder.ip_filter(
+            f"lan{i % 3 + 1}/{i}",
+            "in",
+            static=[STATIC_DEFS[(i * 7 + k) % len(STATIC_DEFS)] for k in range(8)],
+            dynamic=DYNAMIC_DEFS[: i % len(DYNAMIC_DEFS) + 1],
+        )
+        for k in range(ROUTES):
+            with builder.ip_route(f"10.{i >> 8 & 0xFF}.{i & 0xFF}.{k * 8}/29") as route:
+                route.gateway(f"tunnel {i * VPN_CLIENTS + 1}", filters=STATIC_DEFS[k : k + 2], weight=2 + changed)
+                route.gateway("pp 1", hide=True)
+        with builder.nat(f"lan{i % 3 + 1}/{i}", "masquerade") as nat:
+            for k in range(NAT_STATICS):
+                nat.add(f"nat descriptor masquerade static {nat.descriptor} {k + 1} 172.16.{i & 0xFF}.{k + 1} tcp {8000 + k}")
+        scope = builder.dhcp_scope(i + 1, IPv4Addr(f"172.{16 + (i >> 8)}.{i & 0xFF}.0/24"), 2, 254)
+        for k in range(DHCP_BINDS + changed):
+            scope.bind(f"172.{16 + (i >> 8)}.{i & 0xFF}.{10 + k}", f"02:00:{i >> 8 & 0xFF:02x}:{i & 0xFF:02x}:00:{k:02x}")
+        builder.ikev2_remote_access(
+            [f"site{i}-user{k}" for k in range(VPN_CLIENTS - changed)],
+            first_id=i * VPN_CLIENTS + 1,
+            domain="example.com",
+            psk="secret",
+            pool_id=1,
+        )
+
+
+def synthetic_profile(sites: int, variant: int = 0) -> YamahaRouterConfigBuilder:
+    builder = YamahaRouterConfigBuilder("Router", "1.0.0")
+    for i in range(sites):
+        site(builder, i, variant)
+    return builder
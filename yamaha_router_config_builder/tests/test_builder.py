@@ -1,4 +1,10 @@
+import io
+
+import pytest
+
 from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.cache import SectionCache
+from yamaha_router_config_builder.utils import IPv4Addr
 
 
 def test_builder_basic_add():
@@ -46,3 +52,171 @@ def test_builder_interface_context():
     assert "lan1 select 10" in config
     assert "ip address 192.0.2.1/24" in config
     assert "lan1 enable 10" in config
+
+
+def test_builder_build_iter_and_build_to():
+    builder = YamahaRouterConfigBuilder()
+    with builder.section("TestSection"):
+        builder.ipv6_filter("lan1", "out", static=["pass * * * * *"], dynamic=["* * domain"])
+        with builder.nat("lan1", "masquerade"):
+            pass
+        builder.add("section command")
+    config = builder.build()
+    assert "\n".join(builder.build_iter()) == config
+
+    for buffer_size in [1, 16, 64 * 1024]:
+        file = io.StringIO()
+        builder.build_to(file, buffer_size)
+        assert file.getvalue() == config
+
+
+def test_builder_filter_numbers_are_resolved():
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["reject * * * * 135", "pass * * * * *"])
+    builder.ip_filter("lan1", "out", static=["pass * * * * *"], dynamic=["* * domain", "* * www"])
+    with builder.ip_route("default") as route:
+        route.gateway("tunnel 1", filters=["reject * * * * 135"], hide=True, weight=2, keepalive=False)
+    config = builder.build()
+    assert "ip filter 1000 reject * * * * 135" in config
+    assert "ip filter dynamic 2001 * * www" in config
+    assert "ip lan1 secure filter in 1000 1001" in config
+    assert "ip lan1 secure filter out 1001 dynamic 2000 2001" in config
+    assert "ip route default gateway tunnel 1 filter 1000 hide weight 2" in config
+
+
+def test_builder_lock_filters(tmp_path):
+    lock = str(tmp_path / "filter.lock.json")
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["pass * * tcp * *", "pass * * * * *"])
+    builder.lock_filters(lock)
+    assert "ip lan1 secure filter in 1000 1001" in builder.build()
+
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["reject * * * * 135", "pass * * tcp * *", "pass * * * * *"])
+    builder.lock_filters(lock)
+    config = builder.build()
+    assert "ip filter 1002 reject * * * * 135" in config
+    assert "ip lan1 secure filter in 1002 1000 1001" in config
+
+
+def test_builder_add_filter_after_lock(tmp_path):
+    lock = tmp_path / "filter.lock.json"
+    lock.write_text('{"ip_filter": {"x": 1001}}')
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["x"])
+    builder.lock_filters(str(lock))
+    builder.ip_filter("lan2", "in", static=["y"])
+    config = builder.build()
+    assert "ip filter 1001 x" in config
+    assert "ip filter 1000 y" in config
+    assert "ip lan2 secure filter in 1000" in config
+
+
+def test_builder_section_cache(tmp_path):
+    def make_builder(mtu: int):
+        builder = YamahaRouterConfigBuilder()
+        with builder.section("A"):
+            builder.add("a")
+            builder.ip_filter("lan1", "in", static=["pass * * * * *"])
+        with builder.section("B"):
+            builder.add(f"ip lan1 mtu {mtu}")
+        builder.add("outside")
+        return builder
+
+    cache = SectionCache(str(tmp_path))
+    builder = make_builder(1500)
+    assert builder.build(cache) == builder.build()
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    builder = make_builder(1400)
+    assert builder.build(cache) == builder.build()
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    [(title_a, hash_a), (title_b, hash_b)] = builder.section_hashes()
+    assert (title_a, title_b) == ("A", "B")
+    assert hash_a == make_builder(1500).section_hashes()[0][1]
+    assert hash_b != make_builder(1500).section_hashes()[1][1]
+
+
+def test_builder_section_cache_skips_secrets(tmp_path):
+    builder = YamahaRouterConfigBuilder()
+    with builder.section("User"):
+        builder.add("login password hunter2")
+    with builder.section("LAN"):
+        builder.add("ip lan1 mtu 1500")
+    cache = SectionCache(str(tmp_path))
+    assert builder.build(cache) == builder.build()
+    assert builder.build(cache) == builder.build()
+    assert (cache.hits, cache.misses) == (1, 3)
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1 and "hunter2" not in files[0].read_text()
+
+
+def test_builder_derive_shares_base():
+    def base_profile(builder):
+        with builder.section("Base"):
+            builder.ip_filter("lan1", "in", static=["reject * * * * 135", "pass * * * * *"])
+            with builder.nat("lan2", "masquerade"):
+                pass
+            builder.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 100)
+
+    def device_profile(builder, i):
+        with builder.section(f"Device {i}"):
+            builder.ip_filter("lan2", "in", static=[f"reject 10.0.{i}.0/24 * * * *", "pass * * * * *"])
+            with builder.nat("lan3", "masquerade"):
+                pass
+            builder.mode_cfg_address_pool(1, IPv4Addr("192.168.0.0/24"), 101 + i, 101 + i)
+
+    base = YamahaRouterConfigBuilder("NVR700W", "1.0")
+    base_profile(base)
+    base_config = base.build()
+    for i in range(2):
+        config = base.derive()
+        device_profile(config, i)
+
+        # 派生したビルダーの出力は、共通部分とデバイスごとの部分を 1 つのビルダーで組み立てた場合と同じ
+        expected = YamahaRouterConfigBuilder("NVR700W", "1.0")
+        base_profile(expected)
+        device_profile(expected, i)
+        assert config.build() == expected.build()
+        assert config.commands[: len(base.commands)] == base.commands
+        assert all(a is b for a, b in zip(config.commands, base.commands))
+        assert config.nat_descriptions[0] is base.nat_descriptions[0]
+
+        # 派生したビルダーでの変更は共通部分に影響しない
+        assert base.build() == base_config
+        assert len(base.filters["ip_filter"]) == 2
+
+    with pytest.raises(ValueError):
+        base.add("more")
+    with pytest.raises(ValueError):
+        base.ip_filter("lan1", "out", static=["pass * * * * *"])
+
+
+def test_builder_frozen_handles():
+    base = YamahaRouterConfigBuilder()
+    route = base.ip_route("default")
+    scope = base.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 100)
+    with base.nat("lan2", "masquerade") as nat:
+        pass
+    config = base.derive()
+
+    # 派生元のビルダーが返したオブジェクトを通しても、共有している状態は変更できない
+    with pytest.raises(ValueError):
+        route.gateway("pp 1", filters=["pass * * * * *"])
+    with pytest.raises(ValueError):
+        scope.bind("192.168.0.10", "00:11:22:33:44:55")
+    with pytest.raises(ValueError):
+        nat.add("nat descriptor address outer 1 primary")
+    assert route.gateways == [] and scope.by_ip == {} and len(nat.commands) == 1
+    config.build()
+
+
+def test_builder_derived_optimize_does_not_touch_base():
+    base = YamahaRouterConfigBuilder()
+    base.ip_filter("lan1", "in", static=["reject * * udp,tcp 135 *", "pass * * * * *", "reject * * udp,tcp 445 *"])
+    base_config = base.build()
+    config = base.derive()
+    assert config.optimize_filters()[0].removed == 1
+    assert "ip lan1 secure filter in 1000 1001" in config.build()
+    assert base.build() == base_config
@@ -0,0 +1,63 @@
+import pytest
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.command import FilterCommand, RouteCommand
+from yamaha_router_config_builder.utils import IPv4Addr
+
+
+def test_commands_have_no_instance_dict():
+    builder = YamahaRouterConfigBuilder()
+    builder.add("test command")
+    builder.ip_filter("lan1", "in", static=["pass * * * * *"])
+    with builder.ip_route("default") as route:
+        route.gateway("pp 1", weight=2)
+    builder.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 100)
+    builder.ikev2_remote_access(["alice"], 1, "vpn.example.com", "secret", 1)
+    assert {type(command).__name__ for command in builder.commands} >= {"DhcpScopeCommand", "IkeV2RemoteAccess"}
+    for obj in [*builder.commands, route.gateways[0]]:
+        assert not hasattr(obj, "__dict__")
+        with pytest.raises(AttributeError):
+            obj.unknown = 1
+
+
+def test_repeated_tokens_are_shared():
+    builder = YamahaRouterConfigBuilder()
+    for i in range(2):
+        builder.ip_filter("".join(["tunnel", "1"]), "in", static=[f"reject * * * * {135}"])
+    a, b = builder.commands
+    assert isinstance(a, FilterCommand) and isinstance(b, FilterCommand)
+    assert a.interface is b.interface
+    assert a.prefix is b.prefix
+    assert a.static_filters[0] is b.static_filters[0]
+    assert a.static_table == "ip_filter" and a.dynamic_table == "ip_dynamic_filter"
+
+
+def test_gateway_parameters_are_tuples():
+    builder = YamahaRouterConfigBuilder()
+    for network in ["10.0.0.0/8", "172.16.0.0/12"]:
+        with builder.ipv6_route(network) as route:
+            route.gateway("tunnel 1", filters=["pass * * * * *"], hide=True, weight=2, keepalive=False)
+    a, b = (command.gateways[0] for command in builder.commands if isinstance(command, RouteCommand))
+    assert a.parameters == (("hide", True), ("weight", 2), ("keepalive", False))
+    assert a.options == ("hide", "weight 2")
+    assert all(x is y for x, y in zip(a.options, b.options))
+    assert a.protocol == "ipv6" and a.table == "ipv6_filter"
+    assert "ipv6 route 10.0.0.0/8 gateway tunnel 1 filter 3000 hide weight 2" in builder.build()
+
+    # ハッシュできないパラメータも使える
+    with builder.ip_route("default") as route:
+        route.gateway("pp 1", note=["a"])
+    assert route.gateways[0].options == ("note ['a']",)
+
+
+def test_gateway_options_do_not_depend_on_call_order():
+    builder = YamahaRouterConfigBuilder()
+    for kwargs in [{"keepalive": True}, {"keepalive": 1}, {"weight": 2}, {"weight": 2.0}]:
+        with builder.ip_route("default") as route:
+            route.gateway("pp 1", **kwargs)
+    assert [route.gateways[0].options for route in builder.commands] == [  # type: ignore
+        ("keepalive",),
+        ("keepalive 1",),
+        ("weight 2",),
+        ("weight 2.0",),
+    ]
@@ -0,0 +1,72 @@
+import pytest
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.compiled import CompiledConfig, placeholder
+from yamaha_router_config_builder.utils import IPv4Addr
+
+
+def profile(password: str, psk: str) -> YamahaRouterConfigBuilder:
+    config = YamahaRouterConfigBuilder("NVR700W", "Rev.15.00.24")
+    with config.section("Basic"):
+        config.add(f"login password {password}")
+    with config.section("LAN"):
+        config.ip_filter("lan1", "in", static=["reject * * udp,tcp 135 *", "pass * * * * *"], dynamic=["* * www"])
+        with config.nat("lan2", "masquerade") as nat:
+            nat.add("nat descriptor masquerade static 1000 1 192.168.0.1 tcp 22")
+        scope = config.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 100)
+        scope.bind("192.168.0.10", "00:11:22:33:44:55")
+        with config.section("Route"):
+            with config.ip_route("default") as route:
+                route.gateway("pp 1", filters=["pass * * * * *"])
+    with config.section("VPN"):
+        config.ikev2_remote_access(["a", "b"], first_id=1, domain="example.com", psk=psk, pool_id=1)
+    return config
+
+
+def compiled() -> CompiledConfig:
+    return profile(placeholder("USER_PASSWORD"), placeholder("VPN_PSK")).compile()
+
+
+def test_render_matches_build():
+    secrets = {"USER_PASSWORD": "p@ss", "VPN_PSK": "secret$1"}
+    expected = profile(secrets["USER_PASSWORD"], secrets["VPN_PSK"]).build()
+    config = compiled()
+    assert config.secrets == ["USER_PASSWORD", "VPN_PSK"]
+    assert config.render(secrets) == expected
+    # 余分なシークレットは無視する
+    assert config.render({**secrets, "OTHER": "x"}) == expected
+
+
+def test_render_missing_secrets():
+    config = compiled()
+    with pytest.raises(ValueError, match="Missing secrets: VPN_PSK"):
+        config.render({"USER_PASSWORD": "x"})
+
+
+@pytest.mark.parametrize("name", ["compiled.json", "compiled.json.gz"])
+def test_save_and_load(tmp_path, name):
+    config = compiled()
+    path = str(tmp_path / name)
+    config.save(path)
+    loaded = CompiledConfig.load(path)
+    assert loaded.to_dict() == config.to_dict()
+    assert loaded.lines() == config.lines()
+    assert "p@ss" not in (tmp_path / name).read_bytes().decode("latin-1")
+
+
+def test_load_rejects_other_format():
+    data = compiled().to_dict()
+    data["format"] = 0
+    with pytest.raises(ValueError, match="Unsupported compiled config format"):
+        CompiledConfig.from_dict(data)
+
+
+def test_sections():
+    config = compiled()
+    titles = [title for title, _, _ in config.sections]
+    assert titles == ["Basic", "LAN", "Route", "VPN"]
+    ranges = {title: config.commands[start:end] for title, start, end in config.sections}
+    assert ranges["Basic"] == ["\n# Basic", "login password ${USER_PASSWORD}"]
+    assert ranges["Route"][-1].startswith("ip route default gateway pp 1 filter ")
+    assert ranges["LAN"][-len(ranges["Route"]) :] == ranges["Route"]
+    assert ranges["VPN"][-1] == config.commands[-1]
@@ -0,0 +1,69 @@
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.delta import removal
+
+
+def make_builder(static: list[str], mtu: int = 1460, tunnels: list[int] = [1]):
+    builder = YamahaRouterConfigBuilder()
+    builder.add("ip lan1 address 192.168.0.1/24")
+    for id in tunnels:
+        with builder.interface("tunnel", id):
+            builder.add(f"ip tunnel mtu {mtu}")
+            builder.ip_filter("tunnel", "in", static=static)
+    return builder
+
+
+def test_removal():
+    assert removal("ip filter 1000 pass * * * * *") == "no ip filter 1000"
+    assert removal("ipv6 filter dynamic 4000 * * domain") == "no ipv6 filter dynamic 4000"
+    assert removal("ip lan1 secure filter in 1000 1001") == "no ip lan1 secure filter in"
+    assert removal("ip route default gateway tunnel 1") == "no ip route default"
+    assert removal("nat descriptor type 1 masquerade") == "no nat descriptor type 1"
+    assert removal("dns service fallback on") == "no dns service fallback"
+    assert removal('description lan1 "office LAN"') == "no description lan1"
+    assert removal("save") == "no save"
+
+
+def test_build_delta_unchanged():
+    previous = make_builder(["pass * * * * *"]).build().splitlines()
+    assert make_builder(["pass * * * * *"]).build_delta(previous) == ""
+
+
+def test_build_delta_orders_filters_before_bindings():
+    previous = make_builder(["pass * * * * *"]).build().splitlines()
+    delta = make_builder(["reject * * * * 135", "pass * * * * *"]).build_delta(previous)
+    assert delta.splitlines() == [
+        "ip filter 1000 reject * * * * 135",
+        "ip filter 1001 pass * * * * *",
+        "tunnel select 1",
+        "ip tunnel secure filter in 1000 1001",
+        "tunnel enable 1",
+    ]
+
+
+def test_build_delta_removes_unused():
+    previous = make_builder(["reject * * * * 135", "pass * * * * *"], tunnels=[1, 2]).build().splitlines()
+    delta = make_builder(["reject * * * * 135"], mtu=1280).build_delta(previous)
+    assert delta.splitlines() == [
+        "tunnel select 1",
+        # 値が変わった行は上書きするだけで、設定を一旦消さない
+        "ip tunnel mtu 1280",
+        "ip tunnel secure filter in 1000",
+        "tunnel enable 1",
+        "tunnel select 2",
+        "no ip tunnel mtu",
+        "no ip tunnel secure filter in",
+        "tunnel disable 2",
+        "no ip filter 1001",
+    ]
+
+
+def test_build_delta_changes_nat_type():
+    def make_nat_builder(type: str):
+        builder = YamahaRouterConfigBuilder()
+        with builder.nat("lan2", type):
+            pass
+        return builder
+
+    previous = make_nat_builder("masquerade").build().splitlines()
+    delta = make_nat_builder("nat-masquerade").build_delta(previous)
+    assert delta.splitlines() == ["nat descriptor type 1 nat-masquerade"]
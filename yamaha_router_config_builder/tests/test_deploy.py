@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.deploy import (
+    BLOCK_SIZE,
+    Deployer,
+    SshConnection,
+    Target,
+    iter_blocks,
+    main,
+    read_lines,
+)
+from yamaha_router_config_builder.fakerouter import FakeRouter, start_fake_routers
+
+
+def run_deploy(configs: list[str], router_options: dict = {}, **options):
+    """ルーターの代わりを configs の数だけ起動して設定を送り、(結果, ルーター) を返す"""
+
+    async def main():
+        routers = await start_fake_routers(len(configs), **router_options)
+        jobs = [
+            (Target(f"r{i}", *router.address, admin_password="secret"), lambda config=config: config.splitlines())
+            for i, (router, config) in enumerate(zip(routers, configs))
+        ]
+        try:
+            return await Deployer(**options).deploy(jobs), routers
+        finally:
+            for router in routers:
+                router.close()
+
+    return asyncio.run(main())
+
+
+def test_iter_blocks():
+    assert list(iter_blocks(["abc", "de\n"], size=4)) == [b"abc\n", b"de\n"]
+    # ちょうど割り切れる場合は終端を示す空のブロックを付ける
+    assert list(iter_blocks(["abc"], size=4)) == [b"abc\n", b""]
+    assert list(iter_blocks([])) == [b""]
+
+
+def test_deploy_many_routers():
+    configs = [
+        "\n".join([f"# router {i}"] + [f"ip filter {n} pass * * * * *" for n in range(i % 50)]) for i in range(500)
+    ]
+    results, routers = run_deploy(configs, concurrency=64)
+    assert [result.name for result in results] == [f"r{i}" for i in range(500)]
+    assert all(result.ok and result.attempts == 1 for result in results)
+    for router, config in zip(routers, configs):
+        assert router.config == config + "\n"
+        assert router.sessions[-1].filename == "config/secret"
+
+
+def test_deploy_builder_output(tmp_path):
+    config = YamahaRouterConfigBuilder()
+    config.ip_filter("lan1", "in", static=[f"reject 10.0.{i}.0/24 * * * *" for i in range(100)])
+    path = tmp_path / "config.txt"
+    path.write_text(config.build() + "\n")
+    assert len(path.read_text()) > BLOCK_SIZE * 4
+
+    async def main():
+        (router,) = await start_fake_routers(1)
+        try:
+            results = await Deployer().deploy([(Target("r", *router.address), read_lines(str(path)))])
+        finally:
+            router.close()
+        return results, router
+
+    (result,), router = asyncio.run(main())
+    assert result.ok
+    assert result.bytes == len(path.read_text())
+    assert router.config == path.read_text()
+
+
+def test_deploy_retries_with_backoff():
+    results, routers = run_deploy(["a", "b"], {"fail_first": 2}, retries=3, backoff=0.01)
+    assert [(result.ok, result.attempts) for result in results] == [(True, 3), (True, 3)]
+    results, routers = run_deploy(["a"], {"fail_first": 5}, retries=2, backoff=0.01)
+    assert not results[0].ok
+    assert results[0].attempts == 3
+    assert "Busy" in results[0].error
+
+
+def test_deploy_survives_packet_loss():
+    configs = ["\n".join(f"line {n}" for n in range(500))] * 5
+    results, routers = run_deploy(configs, {"drop_rate": 0.2}, timeout=0.02, retransmits=20, backoff=0.01)
+    assert all(result.ok for result in results)
+    assert all(router.config == configs[0] + "\n" for router in routers)
+
+
+def test_deploy_does_not_retry_access_violation():
+    results, routers = run_deploy(["a"], {"password": "other"}, retries=3, backoff=0.01)
+    assert not results[0].ok
+    assert results[0].attempts == 1
+    assert routers[0].requests == 1
+
+
+def test_deploy_limits_connections_per_host():
+    async def main():
+        (router,) = await start_fake_routers(1, delay=0.005)
+        target = Target("r", *router.address)
+        jobs = [(target, lambda i=i: [f"config {i}"] * 200) for i in range(4)]
+        try:
+            results = await Deployer(per_host=1).deploy(jobs)
+        finally:
+            router.close()
+        return results, router
+
+    results, router = asyncio.run(main())
+    assert all(result.ok for result in results)
+    assert len(router.sessions) == 4
+    assert router.max_active == 1
+
+
+def test_deploy_records_unexpected_errors():
+    def broken():
+        raise ValueError("cannot read config")
+
+    async def main():
+        routers = await start_fake_routers(2)
+        jobs = [(Target("broken", *routers[0].address), broken), (Target("ok", *routers[1].address), lambda: ["a"])]
+        try:
+            return await Deployer(retries=3, backoff=0.01).deploy(jobs), routers
+        finally:
+            for router in routers:
+                router.close()
+
+    (broken_result, ok_result), routers = asyncio.run(main())
+    assert not broken_result.ok
+    assert broken_result.attempts == 1
+    assert broken_result.error == "ValueError: cannot read config"
+    assert ok_result.ok and routers[1].config == "a\n"
+
+
+def test_deploy_ignores_short_packets():
+    class RuntRouter(FakeRouter):
+        def send_ack(self, addr: tuple, block: int):
+            assert self.transport is not None
+            self.transport.sendto(b"\0", addr)
+            super().send_ack(addr, block)
+
+    async def main():
+        router = await RuntRouter().start()
+        try:
+            return await Deployer().deploy([(Target("r", *router.address), lambda: ["a"])]), router
+        finally:
+            router.close()
+
+    (result,), router = asyncio.run(main())
+    assert result.ok
+    assert router.config == "a\n"
+
+
+def test_deploy_resends_lost_final_ack():
+    class LossyRouter(FakeRouter):
+        lost = False
+
+        def send_ack(self, addr: tuple, block: int):
+            # 最後のブロックへの最初の ACK だけを落とす
+            if self.sessions and not self.lost:
+                self.lost = True
+                return
+            super().send_ack(addr, block)
+
+    async def main():
+        router = await LossyRouter().start()
+        try:
+            return await Deployer(timeout=0.05).deploy([(Target("r", *router.address), lambda: ["a"])]), router
+        finally:
+            router.close()
+
+    (result,), router = asyncio.run(main())
+    assert router.lost
+    # 再送された最後のブロックに ACK が返るので、転送をやり直さない
+    assert result.ok and result.attempts == 1
+    assert router.requests == 1 and len(router.sessions) == 1
+
+def test_ssh_checks_host_keys(tmp_path):
+    # 既定では ~/.ssh/known_hosts、ターゲットに指定があればそのファイルで検証する
+    assert SshConnection(Target("r", "192.0.2.1")).known_hosts == ()
+    assert SshConnection(Target("r", "192.0.2.1", known_hosts="hosts")).known_hosts == "hosts"
+    # 検証しないのは明示的に指定したときだけ
+    assert SshConnection(Target("r", "192.0.2.1", known_hosts="hosts"), host_key_check=False).known_hosts is None
+
+    targets = tmp_path / "targets.json"
+    targets.write_text("[]")
+    with pytest.raises(SystemExit):
+        main([str(targets), "--no-host-key-check"])
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.delta import removal
+from yamaha_router_config_builder.dhcp import DhcpScope, normalize_mac
+from yamaha_router_config_builder.utils import IPv4Addr
+
+
+def test_normalize_mac():
+    assert normalize_mac("2C-CF-67-11-40-CD") == "2c:cf:67:11:40:cd"
+    assert normalize_mac("2ccf671140cd") == "2c:cf:67:11:40:cd"
+    with pytest.raises(ValueError):
+        normalize_mac("2c:cf:67:11:40")
+    with pytest.raises(ValueError):
+        normalize_mac("2c:cf-67:11:40:cd")
+
+
+def test_bind_sorted_by_address():
+    scope = DhcpScope(1, IPv4Addr("192.168.0.0/24"), 2, 249)
+    scope.bind("192.168.0.100", "00:00:00:00:00:02")
+    scope.bind("192.168.0.20", "00:00:00:00:00:01")
+    assert scope.commands() == [
+        "dhcp scope 1 192.168.0.2-192.168.0.249/24",
+        "dhcp scope bind 1 192.168.0.20 00:00:00:00:00:01",
+        "dhcp scope bind 1 192.168.0.100 00:00:00:00:00:02",
+    ]
+
+
+def test_bind_conflicts():
+    scope = DhcpScope(1, IPv4Addr("192.168.0.0/24"), 2, 249)
+    scope.bind("192.168.0.10", "00:00:00:00:00:01")
+    with pytest.raises(ValueError, match="out of DHCP scope"):
+        scope.bind("192.168.0.250", "00:00:00:00:00:02")
+    with pytest.raises(ValueError, match="already bound"):
+        scope.bind("192.168.0.10", "00:00:00:00:00:02")
+    with pytest.raises(ValueError, match="already bound"):
+        scope.bind("192.168.0.11", "00-00-00-00-00-01")
+    # 失敗した割り当ては登録されない
+    assert len(scope.by_ip) == len(scope.by_mac) == 1
+
+
+def test_load_csv_and_json(tmp_path):
+    scope = DhcpScope(1, IPv4Addr("10.0.0.0/16"), 1, 65534)
+    path = tmp_path / "binds.csv"
+    path.write_text("ip,mac,comment\n10.0.1.1,00:00:00:00:01:01,printer\n10.0.0.1,00:00:00:00:00:01,nas\n")
+    scope.load(str(path))
+    path = tmp_path / "binds.json"
+    path.write_text(json.dumps([{"ip": "10.0.2.1", "mac": "00:00:00:00:02:01"}]))
+    scope.load(str(path))
+    assert scope.commands()[1:] == [
+        "dhcp scope bind 1 10.0.0.1 00:00:00:00:00:01",
+        "dhcp scope bind 1 10.0.1.1 00:00:00:00:01:01",
+        "dhcp scope bind 1 10.0.2.1 00:00:00:00:02:01",
+    ]
+
+
+def test_bind_all_reports_every_error():
+    scope = DhcpScope(1, IPv4Addr("10.0.0.0/16"), 1, 65534)
+    rows = [
+        {"ip": "10.0.0.1", "mac": "00:00:00:00:00:01"},
+        {"ip": "10.0.0.1", "mac": "00:00:00:00:00:02"},
+        {"ip": "10.1.0.1", "mac": "00:00:00:00:00:03"},
+        {"ip": "10.0.0.4"},
+    ]
+    with pytest.raises(ValueError) as e:
+        scope.bind_all(rows)
+    assert [line.split(":")[0] for line in str(e.value).splitlines()] == ["row 2", "row 3", "row 4"]
+    assert len(scope.by_ip) == 1
+
+
+def test_bulk_bind_large_scope():
+    scope = DhcpScope(1, IPv4Addr("10.0.0.0/8"), 1, 0xFFFFFE)
+    rows = []
+    for i in range(50000, 0, -1):
+        octets = (i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF)
+        rows.append({"ip": "10.{}.{}.{}".format(*octets), "mac": "02:00:00:{:02x}:{:02x}:{:02x}".format(*octets)})
+    scope.bind_all(rows)
+    commands = scope.commands()
+    assert len(commands) == 50001
+    assert commands[1] == "dhcp scope bind 1 10.0.0.1 02:00:00:00:00:01"
+
+
+def test_builder_dhcp_scope():
+    config = YamahaRouterConfigBuilder()
+    scope = config.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 249)
+    scope.bind("192.168.0.4", "00:00:00:00:00:01")
+    assert config.build().splitlines()[-2:] == [
+        "dhcp scope 1 192.168.0.2-192.168.0.249/24",
+        "dhcp scope bind 1 192.168.0.4 00:00:00:00:00:01",
+    ]
+
+
+def test_removal():
+    assert removal("dhcp scope bind 1 192.168.0.4 00:00:00:00:00:01") == "no dhcp scope bind 1 192.168.0.4"
+    assert removal("dhcp scope 1 192.168.0.2-192.168.0.249/24") == "no dhcp scope 1"
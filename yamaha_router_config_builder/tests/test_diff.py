@@ -0,0 +1,81 @@
+from yamaha_router_config_builder.diff import diff, parse_blocks
+
+
+def changes(old: str, new: str) -> list[dict[str, str]]:
+    return [change.to_dict() for change in diff(old.splitlines(), new.splitlines())]
+
+
+def test_parse_blocks():
+    config = """
+# header
+login password secret
+ip lan1 address 192.168.0.1/24
+ip filter 1000 pass * * * * *
+ip filter dynamic 2000 * * domain
+nat descriptor type 1 masquerade
+nat descriptor address outer 1 map-e
+nat descriptor type 2 masquerade
+tunnel select 1
+ ip tunnel mtu 1460
+tunnel enable 1
+nat descriptor address outer 2 primary
+"""
+    # ブロックは閉じた時点で返す
+    assert list(parse_blocks(config.splitlines())) == [
+        (("global", "ip lan1 address 192.168.0.1/24"), ["ip lan1 address 192.168.0.1/24"]),
+        (("filter", "ip", "static", "1000"), ["ip filter 1000 pass * * * * *"]),
+        (("filter", "ip", "dynamic", "2000"), ["ip filter dynamic 2000 * * domain"]),
+        (("nat", "1"), ["nat descriptor type 1 masquerade", "nat descriptor address outer 1 map-e"]),
+        (("nat", "2"), ["nat descriptor type 2 masquerade"]),
+        (("tunnel", "1"), ["ip tunnel mtu 1460"]),
+        (("nat", "2"), ["nat descriptor address outer 2 primary"]),
+    ]
+
+
+def test_diff_identical():
+    config = "a\nb\ntunnel select 1\nc\ntunnel enable 1"
+    assert changes(config, config) == []
+
+
+def test_diff_command_moved_between_tunnels():
+    old = "tunnel select 1\nfoo\ntunnel enable 1\ntunnel select 2\ntunnel enable 2"
+    new = "tunnel select 1\ntunnel enable 1\ntunnel select 2\nfoo\ntunnel enable 2"
+    assert changes(old, new) == [
+        {"block": "tunnel 1", "type": "removed", "line": "foo"},
+        {"block": "tunnel 2", "type": "added", "line": "foo"},
+    ]
+
+
+def test_diff_filter_changed_by_number():
+    old = "ip filter 1000 pass * * * * *\nip filter 1001 reject * * * * *"
+    new = "ip filter 1000 pass * * * * *\nip filter 1001 pass * * tcp * *"
+    assert changes(old, new) == [
+        {"block": "filter ip static 1001", "type": "removed", "line": "ip filter 1001 reject * * * * *"},
+        {"block": "filter ip static 1001", "type": "added", "line": "ip filter 1001 pass * * tcp * *"},
+    ]
+
+
+def test_diff_duplicates_and_order():
+    assert changes("a\nb\nc", "a\nb\nc\nc") == [{"block": "global", "type": "added", "line": "c"}]
+    old, new = "tunnel select 1\na\nb\nc\ntunnel enable 1", "tunnel select 1\nc\na\nb\ntunnel enable 1"
+    assert changes(old, new) == [{"block": "tunnel 1", "type": "moved", "line": "c"}]
+    # グローバルな行は順序を比較しない
+    assert changes("a\nb\nc", "c\na\nb") == []
+
+
+def test_diff_many_global_lines():
+    def lines(mtu: int):
+        for i in range(10000):
+            yield f"ip lan{i} mtu {mtu if i == 5000 else 1500}"
+
+    changes = diff(lines(1500), lines(1400))
+    assert [(change.type, change.line) for change in changes] == [
+        ("removed", "ip lan5000 mtu 1500"),
+        ("added", "ip lan5000 mtu 1400"),
+    ]
+
+
+def test_diff_repeated_block_with_offset():
+    old = "tunnel select 1\na\ntunnel enable 1\ntunnel select 1\nb\ntunnel enable 1"
+    new = "tunnel select 2\nz\ntunnel enable 2\n" + old
+    assert changes(old, new) == [{"block": "tunnel 2", "type": "added", "line": "z"}]
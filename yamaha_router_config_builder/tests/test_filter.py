@@ -0,0 +1,70 @@
+import pytest
+
+from yamaha_router_config_builder.filter import Filter
+
+
+def test_filter_add_keeps_order_and_uniq():
+    filter = Filter("ip", False, 1000)
+    filter.add(["a", "b", "a"])
+    filter.add(["c", "b"])
+    assert filter.defs == ["a", "b", "c"]
+    assert len(filter) == 3
+    assert "b" in filter
+
+
+def test_filter_number():
+    filter = Filter("ip", False, 1000)
+    filter.add(["a", "b"])
+    filter.add(["c"])
+    assert filter.number("a") == 1000
+    assert filter.number("c") == 1002
+    assert filter.build_table() == {"a": "1000", "b": "1001", "c": "1002"}
+
+
+def test_filter_build_commands():
+    filter = Filter("ipv6", True, 4000)
+    filter.add(["* * domain"])
+    assert filter.build_commands() == ["ipv6 filter dynamic 4000 * * domain"]
+
+
+def test_filter_allocate_keeps_numbers():
+    filter = Filter("ip", False, 1000)
+    filter.add(["a", "b", "c"])
+    lock = filter.allocate({})
+    assert lock == {"a": 1000, "b": 1001, "c": 1002}
+
+    # 先頭にルールを追加しても既存のルールの番号は変わらない
+    filter = Filter("ip", False, 1000)
+    filter.add(["new", "a", "b", "c"])
+    assert filter.allocate(lock) == {"a": 1000, "b": 1001, "c": 1002, "new": 1003}
+
+
+def test_filter_allocate_reclaims_removed():
+    filter = Filter("ip", False, 1000)
+    filter.add(["a", "c", "d"])
+    lock = filter.allocate({"a": 1000, "b": 1001, "c": 1002})
+    assert lock == {"a": 1000, "d": 1001, "c": 1002}
+    assert filter.build_commands()[1] == "ip filter 1001 d"
+
+
+def test_filter_add_after_allocate():
+    filter = Filter("ip", False, 1000)
+    filter.add(["x", "z"])
+    filter.allocate({"x": 1001, "z": 1003})
+    filter.add(["y", "x", "w"])
+    assert dict(filter.items()) == {"y": 1000, "x": 1001, "w": 1002, "z": 1003}
+    assert list(filter.build_table().items()) == [("y", "1000"), ("x", "1001"), ("w", "1002"), ("z", "1003")]
+    filter.add(["v"])
+    assert filter.number("v") == 1004
+    # 番号の範囲を使い切った後の追加は allocate() と同じくエラーにする
+    filter.add(f"d{i}" for i in range(995))
+    with pytest.raises(ValueError):
+        filter.add(["overflow"])
+
+
+def test_filter_allocate_overflow():
+    filter = Filter("ip", False, 1000, filter_num_size=2)
+    filter.add(["a", "b", "c"])
+    assert filter.overflowed()
+    with pytest.raises(ValueError):
+        filter.allocate({})
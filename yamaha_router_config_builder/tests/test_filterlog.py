@@ -0,0 +1,44 @@
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.filterlog import builder_definitions, config_definitions, count_hits, report
+
+LOG = """\
+2025/01/01 00:00:00: LAN1 Rejected at IN(1001) filter: TCP 192.0.2.1:12345 > 192.168.57.2:445
+2025/01/01 00:00:01: TUNNEL[1] Passed at OUT(1002) filter: UDP 192.168.57.2:5353 > 192.0.2.1:53
+2025/01/01 00:00:02: [DHCPD] LAN1(host) Allocates 192.168.57.10: 00:00:00:00:00:00
+2025/01/01 00:00:03: LAN1 Rejected at IN(1001) filter: TCP 192.0.2.1:12346 > 192.168.57.2:445
+"""
+
+
+def test_count_hits(tmp_path):
+    path = tmp_path / "syslog.txt"
+    path.write_text(LOG * 10)
+    expected = {("LAN1", "in", "rejected", 1001): 20, ("TUNNEL[1]", "out", "passed", 1002): 10}
+    assert count_hits(str(path)) == expected
+    assert count_hits(str(path), chunk_size=100) == expected
+    assert count_hits(str(path), jobs=3, chunk_size=100) == expected
+
+
+def test_count_hits_empty(tmp_path):
+    path = tmp_path / "syslog.txt"
+    path.write_text("")
+    assert count_hits(str(path), jobs=2) == {}
+
+
+def test_report_with_definitions(tmp_path):
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["pass * * * * *", "reject * * tcp * 445"])
+    definitions = builder_definitions(builder)
+    assert definitions == config_definitions(builder.build().splitlines())
+
+    path = tmp_path / "syslog.txt"
+    path.write_text(LOG)
+    rows = report(count_hits(str(path)), definitions)
+    assert rows[0] == {
+        "interface": "LAN1",
+        "direction": "in",
+        "action": "rejected",
+        "filter": 1001,
+        "definition": "reject * * tcp * 445",
+        "hits": 2,
+    }
+    assert rows[1]["definition"] is None
@@ -0,0 +1,69 @@
+import pytest
+
+from yamaha_router_config_builder.fleet import Device, build_fleet
+
+
+def site_profile(config, env):
+    with config.section("User"):
+        config.add(f"login password {env['USER_PASSWORD']}")
+    config.ip_filter("lan1", "in", static=["pass * * * * *"])
+
+
+def make_devices():
+    return [Device(f"site{i}", site_profile, "NVR700W", "1.0", {"USER_PASSWORD": f"pw{i}"}) for i in range(4)]
+
+
+def test_build_fleet_writes_each_device(tmp_path):
+    results = build_fleet(make_devices(), str(tmp_path))
+    assert [result.name for result in results] == ["site0", "site1", "site2", "site3"]
+    config = (tmp_path / "site2.txt").read_text()
+    assert "# YAMAHA NVR700W config (version 1.0)" in config
+    assert "login password pw2" in config
+
+
+def test_build_fleet_is_deterministic(tmp_path):
+    serial = build_fleet(make_devices(), str(tmp_path / "serial"), jobs=1)
+    parallel = build_fleet(make_devices(), str(tmp_path / "parallel"), jobs=3)
+    assert [result.name for result in serial] == [result.name for result in parallel]
+    for a, b in zip(serial, parallel):
+        assert open(a.path).read() == open(b.path).read()
+
+
+def test_build_fleet_rejects_duplicate_names(tmp_path):
+    devices = make_devices()
+    devices[1].name = devices[0].name
+    with pytest.raises(ValueError):
+        build_fleet(devices, str(tmp_path))
+
+
+def shared_profile(config, env):
+    with config.section("Other"):
+        config.add(f"ntpdate server name {env['NTP_SERVER']}")
+    config.ip_filter("lan1", "in", static=["reject * * * * 135"])
+
+
+def test_build_fleet_with_shared_base(tmp_path):
+    devices = [
+        Device(
+            f"site{i}",
+            site_profile,
+            "NVR700W",
+            "1.0",
+            {"USER_PASSWORD": f"pw{i}"},
+            base=shared_profile,
+            base_env={"NTP_SERVER": "ntp"},
+        )
+        for i in range(3)
+    ]
+    for jobs in [1, 2]:
+        build_fleet(devices, str(tmp_path / str(jobs)), jobs=jobs)
+        config = (tmp_path / str(jobs) / "site1.txt").read_text()
+        assert config.index("ntpdate server name ntp") < config.index("login password pw1")
+        assert "ip filter 1001 pass * * * * *" in config and "ip lan1 secure filter in 1001" in config
+    # 共通部分は同じ bases を渡したデバイス間で 1 回だけ実行して共有する
+    bases = {}
+    a, b = devices[0].builder(bases), devices[1].builder(bases)
+    assert a.commands[0] is b.commands[0]
+    assert len(bases) == 1
+    # bases を渡さなければ共有しない (プロセス全体で共通部分をキャッシュしない)
+    assert devices[0].builder().commands[0] is not devices[1].builder().commands[0]
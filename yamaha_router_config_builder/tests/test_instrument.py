@@ -0,0 +1,84 @@
+import json
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.cache import SectionCache
+from yamaha_router_config_builder.instrument import Instrumentation, ProfileHook, TracemallocHook
+
+
+def build_profile(builder: YamahaRouterConfigBuilder):
+    with builder.section("LAN"):
+        builder.ip_filter("lan1", "in", static=[f"reject 10.0.{i}.0/24 * * * *" for i in range(10)])
+        with builder.nat("lan1", "masquerade"):
+            pass
+        with builder.section("Route"):
+            with builder.ip_route("default") as route:
+                route.gateway("tunnel 1")
+    builder.add("global command")
+    with builder.section("Other"):
+        builder.add("other command")
+
+
+def test_instrumented_build_is_identical(tmp_path):
+    plain = YamahaRouterConfigBuilder()
+    build_profile(plain)
+    builder = YamahaRouterConfigBuilder(instrument=Instrumentation())
+    build_profile(builder)
+    assert builder.build() == plain.build()
+    assert builder.build(SectionCache(str(tmp_path))) == plain.build()
+    assert builder.build(SectionCache(str(tmp_path))) == plain.build()
+
+
+def test_instrument_report():
+    calls = []
+    instrument = Instrumentation(hooks=[lambda kind, name, seconds: calls.append((kind, name))])
+    builder = YamahaRouterConfigBuilder("NVR700W", instrument=instrument)
+    build_profile(builder)
+    builder.build()
+    report = json.loads(instrument.to_json(builder))
+
+    assert report["device"] == "NVR700W"
+    assert report["build_seconds"] >= sum(report["phases"].values()) > 0
+    assert list(report["phases"]) == ["filters", "nat", "commands"]
+    assert [section["title"] for section in report["sections"]] == ["LAN", "Route", "Other"]
+    lan, route, other = report["sections"]
+    assert lan["seconds"] >= route["seconds"] > 0
+    # 入れ子のセクションは外側のセクションとしてまとめて出力する
+    assert lan["render_seconds"] > 0 and route["render_seconds"] is None
+    assert (lan["commands"], route["commands"], other["commands"]) == (5, 2, 2)
+    assert report["commands"] == {"BasicCommand": 6, "FilterCommand": 1, "RouteCommand": 1}
+    assert report["filters"]["ip_filter"] == {"size": 10, "capacity": 1000, "overflowed": False}
+
+    # フックは区間が終わった順に呼ばれる
+    assert calls[:3] == [("section", "Route"), ("section", "LAN"), ("section", "Other")]
+    assert calls[-1] == ("build", "build")
+    assert ("render", "LAN") in calls and ("render", "Route") not in calls
+
+
+def test_instrument_hooks():
+    profile = ProfileHook(limit=5)
+    memory = TracemallocHook()
+    builder = YamahaRouterConfigBuilder(instrument=Instrumentation(hooks=[profile, memory]))
+    with builder.section("Big"):
+        builder.ip_filter("lan1", "in", static=[f"reject 10.0.{i >> 8}.{i & 0xFF} * * * *" for i in range(1000)])
+    builder.build()
+    hooks = builder.instrument.report(builder)["hooks"]  # type: ignore
+
+    assert 0 < len(hooks["ProfileHook"]) <= 5
+    assert any("build" in row["function"] for row in hooks["ProfileHook"])
+    assert hooks["TracemallocHook"]["section:Big"] > 1000 * 30
+    assert set(hooks["TracemallocHook"]) == {"section:Big", "phase:filters", "phase:nat", "phase:commands"}
+
+
+def test_instrumented_build_streams():
+    instrument = Instrumentation()
+    builder = YamahaRouterConfigBuilder(instrument=instrument)
+    build_profile(builder)
+    lines = builder.build_iter()
+    next(lines)
+    # 最初の行を返した時点では、コマンドはまだ生成していない
+    assert instrument.totals("phase") == {}
+    rest = list(lines)
+    assert rest[-1] == "other command"
+    assert list(instrument.totals("phase")) == ["filters", "nat", "commands"]
+    # 行を少しずつ返しても、1 回のビルドは 1 つの build 区間として数える
+    assert [(kind, name) for kind, name, _ in instrument.spans if kind == "build"] == [("build", "build")]
@@ -0,0 +1,75 @@
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.optimizer import optimize_rules
+from yamaha_router_config_builder.policy import parse_rule
+
+
+def test_parse_rule():
+    rule = parse_rule("ip", "reject * * udp,tcp netbios_ns-netbios_ssn *")
+    assert rule is not None
+    assert rule.action == "reject"
+    assert rule.protocols == frozenset([6, 17])
+    assert rule.sport == ((137, 139),)
+    assert parse_rule("ip", "pass 192.168.0.0/24 tcp * ident") is None
+    assert parse_rule("ipv6", "pass dhcp-prefix@onu1::/64 * * * *") is None
+
+
+def test_optimize_removes_shadowed():
+    defs = [
+        "reject * * udp,tcp 135 *",
+        "pass * * * * *",
+        "reject * * udp,tcp 445 *",
+    ]
+    assert optimize_rules("ip", defs) == defs[:2]
+
+
+def test_optimize_removes_duplicates_in_run():
+    defs = [
+        "reject * * tcp * 135",
+        "reject * * udp,tcp * 135",
+        "pass * * * * *",
+    ]
+    assert optimize_rules("ip", defs) == defs[1:]
+
+
+def test_optimize_merges_cidrs_and_ports():
+    defs = [
+        "reject 10.0.0.0/25 * * * *",
+        "reject 10.0.0.128/25 * * * *",
+        "pass * * tcp * 80",
+        "pass * * tcp * 81-90",
+        "reject * * * * *",
+    ]
+    assert optimize_rules("ip", defs) == [
+        "reject 10.0.0.0/24 * * * *",
+        "pass * * tcp * 80-90",
+        "reject * * * * *",
+    ]
+
+
+def test_optimize_keeps_order_across_actions():
+    defs = [
+        "reject 10.0.0.0/24 * * * *",
+        "pass 10.0.0.0/16 * tcp * *",
+        "reject 10.0.1.0/24 * * * *",
+    ]
+    assert optimize_rules("ip", defs) == defs
+
+
+def test_optimize_keeps_unknown_rules():
+    defs = [
+        "reject 10.0.0.0/25 * * * *",
+        "pass * * established * *",
+        "reject 10.0.0.128/25 * * * *",
+    ]
+    assert optimize_rules("ip", defs) == defs
+
+
+def test_builder_optimize_filters():
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["pass * * * * *", "reject * * * * *"])
+    builder.ip_filter("lan2", "in", static=["reject * * * * *"])
+    results = builder.optimize_filters()
+    assert [(r.interface, r.direction, r.removed) for r in results] == [("lan1", "in", 1), ("lan2", "in", 0)]
+    config = builder.build()
+    assert "ip lan1 secure filter in 1000" in config
+    assert "ip lan2 secure filter in 1001" in config
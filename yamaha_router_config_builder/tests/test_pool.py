@@ -0,0 +1,72 @@
+import pytest
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.pool import AddressPool
+from yamaha_router_config_builder.utils import IPv4Addr
+
+
+def test_reserve_and_allocate():
+    pool = AddressPool(IPv4Addr("192.168.0.0/24"))
+    assert pool.reserve(2, 249, "dhcp scope 1") == "192.168.0.2-192.168.0.249/24"
+    assert pool.allocate() == 1
+    assert pool.allocate() == 250
+    assert pool.allocate_range(4, "ipsec ike mode-cfg address pool 1") == (251, 254)
+    with pytest.raises(ValueError, match="No free address"):
+        pool.allocate()
+    assert pool.owner(100) == "dhcp scope 1"
+    assert pool.owner(252, 253) == "ipsec ike mode-cfg address pool 1"
+    assert pool.owner(250) is None
+
+
+def test_reserve_overlap():
+    pool = AddressPool(IPv4Addr("192.168.0.0/24"))
+    pool.reserve(2, 249, "dhcp scope 1")
+    with pytest.raises(ValueError, match="overlaps dhcp scope 1"):
+        pool.reserve(240, 254, "ipsec ike mode-cfg address pool 1")
+    pool.allocate()
+    with pytest.raises(ValueError, match="overlaps allocated addresses"):
+        pool.reserve(1, 1, "router")
+    with pytest.raises(ValueError, match="out of"):
+        pool.reserve(250, 255, "broadcast")
+
+
+def test_allocate_range_skips_used_addresses():
+    pool = AddressPool(IPv4Addr("10.0.0.0/24"))
+    pool.reserve(5, 5, "a")
+    pool.reserve(20, 30, "b")
+    assert pool.allocate_range(8, "c") == (6, 13)
+    assert pool.allocate_range(10, "d") == (31, 40)
+    assert pool.allocate_range(4, "e") == (1, 4)
+    assert pool.is_free(14, 19)
+    assert not pool.is_free(14, 20)
+
+
+def test_release():
+    pool = AddressPool(IPv4Addr("10.0.0.0/24"))
+    pool.reserve(10, 19, "a")
+    with pytest.raises(ValueError, match="partially"):
+        pool.release(10, 15)
+    pool.release(10, 19)
+    assert pool.owner(10, 19) is None
+    assert pool.allocate_range(10, "b") == (1, 10)
+
+
+def test_large_pool():
+    pool = AddressPool(IPv4Addr("10.0.0.0/8"))
+    assert len(pool.bitmap) == 2 * 1024 * 1024
+    pool.reserve(1, 0xFFFF00, "dhcp scope 1")
+    assert pool.allocate_range(200, "vpn") == (0xFFFF01, 0xFFFFC8)
+    for i in range(0xFFFFC9, 0xFFFFFF):
+        assert pool.allocate() == i
+    with pytest.raises(ValueError):
+        pool.allocate()
+
+
+def test_builder_rejects_overlapping_pools():
+    config = YamahaRouterConfigBuilder()
+    lan = IPv4Addr("192.168.0.0/24")
+    config.dhcp_scope(1, lan, 2, 249)
+    config.mode_cfg_address_pool(1, lan, 250, 254)
+    with pytest.raises(ValueError, match="overlaps dhcp scope 1"):
+        config.mode_cfg_address_pool(2, lan, 200, 210)
+    assert "ipsec ike mode-cfg address pool 1 192.168.0.250-192.168.0.254/24" in config.build()
@@ -0,0 +1,73 @@
+import json
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.policy import parse_rule
+from yamaha_router_config_builder.reorder import expected_cost, load_hits, reorder_rules
+
+
+def test_reorder_moves_busy_rules_forward():
+    defs = [
+        "reject * * udp,tcp * 135",
+        "reject * * udp,tcp * 445",
+        "pass * * tcp * 443",
+    ]
+    hits = {"pass * * tcp * 443": 100, "reject * * udp,tcp * 445": 10}
+    assert reorder_rules("ip", defs, hits) == [
+        "pass * * tcp * 443",
+        "reject * * udp,tcp * 445",
+        "reject * * udp,tcp * 135",
+    ]
+
+
+def test_reorder_keeps_overlapping_rules_with_different_actions():
+    defs = [
+        "reject 10.0.0.0/8 * * * *",
+        "pass * * tcp * 443",
+        "pass 192.168.0.0/16 * * * *",
+    ]
+    hits = {"pass * * tcp * 443": 10, "pass 192.168.0.0/16 * * * *": 50}
+    # 2 番目は 1 番目と重なるので前に出せないが、3 番目は 1 番目と重ならないので前に出せる
+    assert reorder_rules("ip", defs, hits) == [
+        "pass 192.168.0.0/16 * * * *",
+        "reject 10.0.0.0/8 * * * *",
+        "pass * * tcp * 443",
+    ]
+
+
+def test_reorder_keeps_unknown_rules_in_place():
+    defs = ["reject * * * * *", "pass * * established * *", "pass * * tcp * 443"]
+    assert reorder_rules("ip", defs, {"pass * * tcp * 443": 100}) == defs
+
+
+def test_reorder_many_rules_keeps_constraints():
+    # OverlapIndex のブロックをまたぐ数のルールでも、重なる異なる動作のルールの前後関係は保つ
+    defs = [
+        f"{'pass' if k % 3 else 'reject'} 10.0.{k % 40}.0/{24 if k % 5 else 16} * tcp * {80 if k % 2 else '*'}"
+        for k in range(200)
+    ]
+    defs = list(dict.fromkeys(defs))
+    hits = {_def: k % 7 for k, _def in enumerate(defs)}
+    reordered = reorder_rules("ip", defs, hits)
+    assert sorted(reordered) == sorted(defs)
+    position = {_def: k for k, _def in enumerate(reordered)}
+    rules = [parse_rule("ip", _def) for _def in defs]
+    for j, b in enumerate(rules):
+        for a in rules[:j]:
+            if a.action != b.action and a.overlaps(b):  # type: ignore
+                assert position[a.definition] < position[b.definition]  # type: ignore
+
+def test_expected_cost():
+    assert expected_cost(["a", "b"], {"a": 1, "b": 3}) == 1.75
+    assert expected_cost(["a"], {}) == 0.0
+
+
+def test_builder_reorder_filters(tmp_path):
+    path = tmp_path / "hits.json"
+    path.write_text(json.dumps({"pass * * tcp * 443": 9, "reject * * udp,tcp * 135": 1}))
+    assert load_hits(str(path)) == {"pass * * tcp * 443": 9, "reject * * udp,tcp * 135": 1}
+
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["reject * * udp,tcp * 135", "pass * * tcp * 443"])
+    [result] = builder.reorder_filters(str(path))
+    assert (result.interface, result.before_cost, result.after_cost) == ("lan1", 1.9, 1.1)
+    assert "ip lan1 secure filter in 1001 1000" in builder.build()
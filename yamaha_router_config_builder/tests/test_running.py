@@ -0,0 +1,92 @@
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.running import RunningConfig
+from yamaha_router_config_builder.utils import IPv4Addr
+
+
+def make_config() -> YamahaRouterConfigBuilder:
+    config = YamahaRouterConfigBuilder("NVR700W", "1.0")
+    with config.section("LAN"):
+        config.add("ip lan1 address 192.168.0.1/24")
+        config.ip_filter("lan1", "in", static=["reject 10.0.0.0/8 * * * *", "pass * * * * *"], dynamic=["* * tcp"])
+    with config.section("Route"):
+        with config.ip_route("default") as route:
+            route.gateway("tunnel 1")
+        with config.ipv6_route("default") as route:
+            route.gateway("dhcp onu1")
+    with config.section("Tunnel"):
+        with config.interface("tunnel", 1):
+            config.add("tunnel encapsulation ipip")
+            config.ip_filter("tunnel", "out", static=["pass * * * * *"])
+            with config.nat("tunnel", "masquerade") as nat:
+                nat.add(f"nat descriptor address outer {nat.descriptor} map-e")
+    with config.section("DHCP"):
+        scope = config.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 249)
+        scope.bind("192.168.0.4", "2c:cf:67:11:40:cd")
+    return config
+
+
+def test_round_trip():
+    text = make_config().build()
+    assert RunningConfig(text).render() == text
+    assert RunningConfig(text + "\n").render() == text + "\n"
+
+
+def test_indexes():
+    running = RunningConfig(make_config().build())
+    assert running.filters["ip_filter"] == {1000: "reject 10.0.0.0/8 * * * *", 1001: "pass * * * * *"}
+    assert running.filters["ip_dynamic_filter"] == {2000: "* * tcp"}
+    assert running.filter(2000) == "* * tcp"
+    assert running.filter(9999) is None
+
+    lan = running.secure_filters[("ip", "lan1", "in")]
+    assert (lan.static, lan.dynamic) == ([1000, 1001], [2000])
+    tunnel = running.secure_filters[("ip", "tunnel1", "out")]
+    assert (tunnel.static, tunnel.dynamic) == ([1001], [])
+
+    block = running.tunnels[1]
+    assert [running.lines[i] for i in block.lines] == [
+        "tunnel encapsulation ipip",
+        "ip tunnel secure filter out 1001",
+        "ip tunnel nat descriptor 1",
+    ]
+    assert running.lines[block.end] == "tunnel enable 1"
+
+    assert [running.lines[i] for i in running.nat_descriptors[1]] == [
+        "nat descriptor type 1 masquerade",
+        "nat descriptor address outer 1 map-e",
+    ]
+    assert running.dhcp_binds[(1, "192.168.0.4")] == "2c:cf:67:11:40:cd"
+    assert running.dhcp_macs[(1, "2c:cf:67:11:40:cd")] == "192.168.0.4"
+    assert running.lines[running.routes[("ip", "default")]] == "ip route default gateway tunnel 1"
+    assert ("ipv6", "default") in running.routes
+    assert running.find("ip address") == ["ip lan1 address 192.168.0.1/24"]
+    assert running.find("ip secure") == [
+        "ip lan1 secure filter in 1000 1001 dynamic 2000",
+        "ip tunnel secure filter out 1001",
+    ]
+
+
+def test_show_config_indentation():
+    text = "tunnel select 2\n tunnel encapsulation ipsec\n ip tunnel secure filter in 1 2\n tunnel enable 2\nip filter 1 pass * * * * *"
+    running = RunningConfig(text)
+    assert running.render() == text
+    assert running.secure_filters[("ip", "tunnel2", "in")].static == [1, 2]
+    assert running.tunnels[2].end == 3
+    assert running.filters["ip_filter"][1] == "pass * * * * *"
+
+
+def test_parse_large_config():
+    lines = []
+    for i in range(50_000):
+        lines.append(f"ip filter {i + 1} reject 10.{i >> 8 & 0xFF}.{i & 0xFF}.0/24 * * * *")
+    for t in range(1, 10_001):
+        lines += [f"tunnel select {t}", "tunnel encapsulation ipsec", f"ip tunnel secure filter in {t} {t + 1}"]
+        lines += [f"ipsec tunnel {t}", f"tunnel enable {t}"]
+    for i in range(100_000):
+        octets = (i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF)
+        lines.append("dhcp scope bind 1 10.{}.{}.{} 02:00:00:{:02x}:{:02x}:{:02x}".format(*octets, *octets))
+    running = RunningConfig("\n".join(lines))
+    assert len(running.lines) == 200_000
+    assert len(running.tunnels) == 10_000
+    assert running.filter(50_000) == "reject 10.195.79.0/24 * * * *"
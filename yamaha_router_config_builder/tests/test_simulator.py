@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.simulator import PASS, REJECT, UNKNOWN, Flows, PolicySimulator, build_simulators
+
+TCP, UDP, ICMP = 6, 17, 1
+
+
+def flows(*rows):
+    return Flows(*zip(*rows))
+
+
+def test_simulator_first_match():
+    simulator = PolicySimulator(
+        [
+            "reject 10.0.0.0/8 * * * *",
+            "reject * * udp,tcp 135 *",
+            "pass * 192.168.0.0/24 icmp * *",
+            "pass * * tcp * 80-90,443",
+        ],
+        [1000, 1001, 1002, 1003],
+    )
+    verdicts, numbers = simulator.evaluate(
+        flows(
+            (0x0A000001, 0xC0A80001, TCP, 1234, 80),  # 10.0.0.1 は最初のルールで破棄
+            (0x01010101, 0xC0A80001, UDP, 135, 53),
+            (0x01010101, 0xC0A80001, ICMP, 0, 0),
+            (0x01010101, 0x02020202, TCP, 1234, 443),
+            (0x01010101, 0x02020202, TCP, 1234, 22),  # どれにもマッチしない
+        ),
+        batch_size=2,
+    )
+    assert verdicts.tolist() == [REJECT, REJECT, PASS, PASS, REJECT]
+    assert numbers.tolist() == [1000, 1001, 1002, 1003, 0]
+
+
+def test_simulator_unknown_rule():
+    simulator = PolicySimulator(["reject * * tcp * 22", "pass * * established * *", "pass * * * * *"])
+    verdicts, numbers = simulator.evaluate(flows((1, 2, TCP, 1, 22), (1, 2, TCP, 1, 80)))
+    assert verdicts.tolist() == [REJECT, UNKNOWN]
+    assert numbers.tolist() == [1, 2]
+
+
+def test_build_simulators():
+    builder = YamahaRouterConfigBuilder()
+    builder.ip_filter("lan1", "in", static=["reject * * tcp * 22", "pass * * * * *"])
+    simulator = build_simulators(builder)[("lan1", "in")]
+    verdicts, numbers = simulator.evaluate(flows((1, 2, TCP, 1, 22), (1, 2, UDP, 1, 53)))
+    assert verdicts.tolist() == [REJECT, PASS]
+    assert numbers.tolist() == [1000, 1001]
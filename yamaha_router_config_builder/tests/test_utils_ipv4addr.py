@@ -1,3 +1,5 @@
+import pytest
+
 from yamaha_router_config_builder.utils import IPv4Addr
 
 
@@ -34,3 +36,28 @@ def test_ipv4addr_edge_cases():
     addr = IPv4Addr("0.0.0.0/0")
     assert addr(0) == "0.0.0.0"
     assert addr.prefix() == 0
+
+
+def test_ipv4addr_addresses():
+    addr = IPv4Addr("10.0.0.0/16")
+    assert addr.addresses(254, 257) == ["10.0.0.254", "10.0.0.255", "10.0.1.0", "10.0.1.1"]
+    assert addr.addresses(1, 2, prefix=True) == ["10.0.0.1/16", "10.0.0.2/16"]
+    assert addr.addresses(255, 255) == [addr(255)]
+
+
+def test_ipv4addr_host_bits_are_masked():
+    addr = IPv4Addr("192.168.1.77/24")
+    assert addr.addr == 0xC0A8014D
+    assert addr(1) == "192.168.1.1"
+    assert addr.cidr() == "192.168.1.0/24"
+
+
+def test_ipv4addr_out_of_range():
+    addr = IPv4Addr("255.255.255.0/24")
+    assert addr(255) == "255.255.255.255"
+    with pytest.raises(AssertionError):
+        addr(300)
+    with pytest.raises(AssertionError):
+        IPv4Addr("0.0.0.0/8")(-1)
+    with pytest.raises(AssertionError):
+        addr.addresses(250, 256)
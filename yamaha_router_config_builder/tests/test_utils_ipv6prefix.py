@@ -0,0 +1,43 @@
+import pytest
+
+from yamaha_router_config_builder.utils import IPv6Prefix
+
+
+def test_ipv6prefix_literal():
+    prefix = IPv6Prefix("2001:db8:1:2::/64")
+    assert prefix(1) == "2001:db8:1:2::1"
+    assert prefix(0x10000, prefix=True) == "2001:db8:1:2::1:0/64"
+    assert str(prefix) == "2001:db8:1:2::/64"
+    assert prefix.prefix() == 64
+
+
+def test_ipv6prefix_host_bits_are_masked():
+    prefix = IPv6Prefix("2001:db8::1234/48")
+    assert prefix.cidr() == "2001:db8::/48"
+
+
+def test_ipv6prefix_reference():
+    prefix = IPv6Prefix("dhcp-prefix@onu1")
+    assert prefix(1, prefix=True) == "dhcp-prefix@onu1::1/64"
+    assert prefix(0x10000) == "dhcp-prefix@onu1::1:0"
+    assert str(prefix) == "dhcp-prefix@onu1::/64"
+    assert IPv6Prefix("ra-prefix@lan2::/56").cidr() == "ra-prefix@lan2::/56"
+
+
+def test_ipv6prefix_range_and_addresses():
+    prefix = IPv6Prefix("dhcp-prefix@onu1", 64)
+    assert prefix.range(0x10, 0x20) == "dhcp-prefix@onu1::10-dhcp-prefix@onu1::20/64"
+    assert prefix.addresses(1, 2) == ["dhcp-prefix@onu1::1", "dhcp-prefix@onu1::2"]
+
+
+def test_ipv6prefix_out_of_range():
+    assert IPv6Prefix("2001:db8:1:2::/64")(0xFFFF_FFFF_FFFF_FFFF) == "2001:db8:1:2:ffff:ffff:ffff:ffff"
+    assert IPv6Prefix("dhcp-prefix@onu1")(0xFFFF_FFFF_FFFF_FFFF) == "dhcp-prefix@onu1::ffff:ffff:ffff:ffff"
+    for prefix in [IPv6Prefix("2001:db8:1:2::/64"), IPv6Prefix("dhcp-prefix@onu1")]:
+        # 負の数やホスト部に収まらない数は次のプレフィックスに食い込むので受け付けない
+        with pytest.raises(AssertionError):
+            prefix(-1)
+        with pytest.raises(AssertionError):
+            prefix(1 << 64)
+        with pytest.raises(AssertionError):
+            prefix.addresses(0xFFFF_FFFF_FFFF_FFFF, 1 << 64)
@@ -0,0 +1,89 @@
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.utils import IPv4Addr
+
+
+def codes(builder: YamahaRouterConfigBuilder) -> list[tuple[str, str | None]]:
+    return [(problem.code, problem.section) for problem in builder.validate()]
+
+
+def test_validate_valid_config():
+    config = YamahaRouterConfigBuilder("NVR700W")
+    with config.section("LAN"):
+        config.ip_filter("lan1", "in", static=["pass * * * * *"])
+        with config.nat("lan2", "masquerade"):
+            pass
+        scope = config.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 100)
+        scope.bind("192.168.0.10", "00:11:22:33:44:55")
+    with config.section("VPN"):
+        with config.interface("tunnel", 1):
+            pass
+        config.ikev2_remote_access(["a", "b"], first_id=2, domain="example.com", psk="x", pool_id=1)
+    assert config.validate() == []
+
+
+def test_validate_tunnel_limit_and_duplicates():
+    config = YamahaRouterConfigBuilder("NVR700W")
+    with config.section("Tunnel"):
+        with config.interface("tunnel", 21):
+            pass
+        with config.interface("tunnel", 1):
+            pass
+    with config.section("VPN"):
+        config.ikev2_remote_access(["a"], first_id=2, domain="example.com", psk="x", pool_id=1, max_peers=50)
+        with config.interface("tunnel", 1):
+            pass
+    assert codes(config) == [("tunnel-limit", "Tunnel"), ("duplicate-interface", "VPN")]
+    problem = config.validate()[0]
+    assert problem.to_dict() == {
+        "code": "tunnel-limit",
+        "message": "tunnel 21 exceeds the 20 peers supported by NVR700W",
+        "command": 1,
+        "section": "Tunnel",
+    }
+    assert str(problem) == "[Tunnel] tunnel 21 exceeds the 20 peers supported by NVR700W"
+
+
+def test_validate_nat_without_type():
+    config = YamahaRouterConfigBuilder()
+    with config.nat("lan2", "masquerade"):
+        pass
+    config.add("nat descriptor type 5 masquerade")
+    with config.section("WAN"):
+        config.add("ip lan2 nat descriptor 1 5 6")
+    assert codes(config) == [("nat-without-type", "WAN")]
+    assert "NAT descriptor 6" in config.validate()[0].message
+
+
+def test_validate_filter_overflow():
+    config = YamahaRouterConfigBuilder()
+    config.ip_filter("lan1", "in", static=[f"reject 10.0.{i >> 8}.{i & 0xFF} * * * *" for i in range(1000)])
+    assert config.validate() == []
+    with config.section("Extra"):
+        config.ip_filter("lan2", "in", static=["reject 10.0.0.0 * * * *", "pass * * * * *"])
+    assert codes(config) == [("filter-overflow", "Extra")]
+
+
+def test_validate_duplicate_dhcp_bind():
+    config = YamahaRouterConfigBuilder()
+    with config.section("DHCP"):
+        scope = config.dhcp_scope(1, IPv4Addr("192.168.0.0/24"), 2, 100)
+        scope.bind("192.168.0.10", "00:11:22:33:44:55")
+        config.add("dhcp scope bind 1 192.168.0.10 00:11:22:33:44:66")
+        config.add("dhcp scope bind 1 192.168.0.11 00:11:22:33:44:77")
+        config.add("dhcp scope bind 1 ipcp")
+        config.add("dhcp scope 1 192.168.0.2-192.168.0.100/24")
+    assert codes(config) == [("duplicate-dhcp-bind", "DHCP"), ("duplicate-dhcp-scope", "DHCP")]
+
+
+def test_validate_large_profile():
+    config = YamahaRouterConfigBuilder("NVR700W")
+    for i in range(1000):
+        with config.section(f"Site {i}"):
+            for k in range(100):
+                config.add(f"ip lan1/{i} address 10.{i >> 8}.{i & 0xFF}.{k}/32")
+    assert len(config.commands) > 100_000
+    assert config.validate() == []
+    # 大きなプロファイルでも、問題のあるコマンドのセクションは正しく求まる
+    with config.section("Extra"):
+        config.add("ip lan2 nat descriptor 9")
+    assert codes(config) == [("nat-without-type", "Extra")]
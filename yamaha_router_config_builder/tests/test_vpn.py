@@ -0,0 +1,58 @@
+import pytest
+
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+from yamaha_router_config_builder.vpn import IkeV2RemoteAccess
+
+
+def test_render_client_block():
+    vpn = IkeV2RemoteAccess(["alice"], 2, "example.com", "s{e}cret", 1)
+    assert vpn.build({}) == [
+        "tunnel select 2",
+        "description tunnel alice",
+        "tunnel encapsulation ipsec",
+        "ipsec sa policy 2 2 esp",
+        "ipsec tunnel 2",
+        "ipsec auto refresh 2 off",
+        "ipsec ike version 2 2",
+        "ipsec ike keepalive log 2 off",
+        "ipsec ike keepalive use 2 on rfc4306 10 3",
+        "ipsec ike local name 2 example.com fqdn",
+        "ipsec ike pre-shared-key 2 text s{e}cret",
+        "ipsec ike remote name 2 alice@example.com user-fqdn",
+        "ipsec ike mode-cfg address 2 1",
+        "tunnel enable 2",
+    ]
+
+
+def test_ids_are_sequential():
+    vpn = IkeV2RemoteAccess([f"client{i}" for i in range(300)], 1, "example.com", "psk", 1)
+    lines = vpn.build({})
+    assert len(lines) == 300 * 14
+    assert all("\n" not in line for line in lines)
+    assert lines[-14:-12] == ["tunnel select 300", "description tunnel client299"]
+
+
+def test_peer_limit():
+    IkeV2RemoteAccess([f"c{i}" for i in range(19)], 2, "example.com", "psk", 1, max_peers=20)
+    with pytest.raises(ValueError, match="up to 20 peers"):
+        IkeV2RemoteAccess([f"c{i}" for i in range(20)], 2, "example.com", "psk", 1, max_peers=20)
+    with pytest.raises(ValueError, match="unique"):
+        IkeV2RemoteAccess(["a", "a"], 2, "example.com", "psk", 1)
+
+
+def test_builder_enforces_device_limit_and_used_ids():
+    config = YamahaRouterConfigBuilder("NVR700W")
+    with config.interface("tunnel", 1):
+        config.add("tunnel encapsulation ipip")
+    with pytest.raises(ValueError, match="already in use: 1"):
+        config.ikev2_remote_access(["a", "b"], 1, "example.com", "psk", 1)
+    with pytest.raises(ValueError, match="up to 20 peers"):
+        config.ikev2_remote_access([f"c{i}" for i in range(20)], 2, "example.com", "psk", 1)
+    config.ikev2_remote_access(["a", "b"], 2, "example.com", "psk", 1)
+    lines = config.build().split("\n")
+    assert lines.count("tunnel enable 3") == 1
+    with pytest.raises(ValueError, match="already in use: 3"):
+        config.ikev2_remote_access(["c"], 3, "example.com", "psk", 1)
+
+    # 上限のわからない機種では制限しない
+    YamahaRouterConfigBuilder().ikev2_remote_access([f"c{i}" for i in range(100)], 1, "example.com", "psk", 1)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from yamaha_router_config_builder.cache import MemorySectionCache
+from yamaha_router_config_builder.watch import Watcher, load_profile
+
+PROFILE = """
+from yamaha_router_config_builder import YamahaRouterConfigBuilder
+
+config = YamahaRouterConfigBuilder("RTX830", "Rev.15.02.30")
+with config.section("LAN"):
+    config.add("ip lan1 address 192.168.0.1/24")
+    config.ip_filter("lan1", "in", static=["pass * * * * *"])
+with config.section("WAN"):
+{wan}
+if __name__ == "__main__":
+    raise SystemExit("must not run")
+"""
+
+
+def write_profile(path, wan: list[str]):
+    path.write_text(PROFILE.format(wan="".join(f"    config.add({line!r})\n" for line in wan)))
+    # 同じ時刻に書き換えても変更を検出できるように mtime をずらす
+    mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_rebuild_only_changed_sections(tmp_path):
+    profile = tmp_path / "profile.py"
+    output = tmp_path / "config.txt"
+    write_profile(profile, ["ip lan2 address dhcp"])
+    watcher = Watcher(str(profile), str(output))
+    assert watcher.changed()
+    assert not watcher.changed()
+
+    first = watcher.rebuild()
+    assert first.problems == [] and first.changes == []
+    assert (first.rendered, first.cached) == (2, 0)
+    assert output.read_text() == load_profile(str(profile)).build() + "\n"
+    assert list(first.seconds) == ["profile", "validate", "build", "diff", "write"]
+
+    write_profile(profile, ["ip lan2 address 203.0.113.1/24"])
+    assert watcher.changed()
+    second = watcher.rebuild()
+    assert (second.rendered, second.cached) == (1, 1)
+    assert [(change.type, change.line) for change in second.changes] == [
+        ("removed", "ip lan2 address dhcp"),
+        ("added", "ip lan2 address 203.0.113.1/24"),
+    ]
+    assert "ip lan2 address 203.0.113.1/24\n" in output.read_text()
+    assert second.to_dict()["sections"] == {"rendered": 1, "cached": 1}
+
+
+def test_rebuild_keeps_output_on_problems(tmp_path):
+    profile = tmp_path / "profile.py"
+    output = tmp_path / "config.txt"
+    write_profile(profile, ["ip lan2 address dhcp"])
+    watcher = Watcher(str(profile), str(output))
+    watcher.rebuild()
+    before = output.read_text()
+
+    write_profile(profile, ["ip lan2 address dhcp", "ip lan2 nat descriptor 9"])
+    result = watcher.rebuild()
+    assert [problem.code for problem in result.problems] == ["nat-without-type"]
+    assert output.read_text() == before
+
+
+def test_load_profile_requires_builder(tmp_path):
+    profile = tmp_path / "profile.py"
+    profile.write_text("config = None\n")
+    with pytest.raises(ValueError, match="does not define a YamahaRouterConfigBuilder"):
+        load_profile(str(profile))
+
+
+def test_memory_section_cache_prune():
+    cache = MemorySectionCache()
+    cache.put("a", ["x"])
+    cache.put("b", ["y"])
+    cache.prune()
+    assert cache.get("a") == ["x"]
+    cache.prune()
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -1,10 +1,30 @@
-from contextlib import contextmanager
+import copy
+import json
+import os
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Iterable, Iterator, TextIO
 
+from .cache import Section, SectionCache, section_hash
 from .command import BasicCommand, FilterCommand, RouteCommand, YamahaRouterCommand
+from .compiled import CompiledConfig
+from .delta import build_delta
+from .dhcp import DhcpScope, DhcpScopeCommand
 from .filter import Filter
+from .instrument import Instrumentation
 from .nat import Nat
+from .optimizer import FilterOptimization, optimize_filters
+from .pool import AddressPool
+from .render import build_filters, build_header, build_nat
+from .reorder import FilterReordering, load_hits, reorder_filters
 from .types import Direction
-from .utils import Counter, counter
+from .utils import Counter, IPv4Addr, counter
+from .validate import Problem, validate
+from .vpn import MAX_PEERS, IkeV2RemoteAccess
+
+
+def _no_span(kind: str, name: str) -> AbstractContextManager[None]:
+    """instrument を渡さなかった場合の、何もしない計測区間"""
+    return nullcontext()
 
 
 class YamahaRouterConfigBuilder:
@@ -14,10 +34,21 @@ class YamahaRouterConfigBuilder:
     filters: dict[str, Filter]
     nat_descriptor_counter: Counter
     nat_descriptions: list[Nat]
+    sections: list[Section]
+    address_pools: dict[str, AddressPool]
+    interface_ids: set[tuple[str, int]]
+    instrument: Instrumentation | None
+    # freeze() した (これ以上コマンドを追加できない) か
+    frozen: bool
+    # 先頭の shared_commands 個のコマンドは derive() の派生元と共有している (書き換える前に複製する)
+    shared_commands: int
+    # 派生元と共有しているアドレスプール (予約する前に複製する)
+    shared_pools: set[str]
 
-    def __init__(self, device: str | None = None, version: str | None = None):
+    def __init__(self, device: str | None = None, version: str | None = None, instrument: Instrumentation | None = None):
         self.device = device or "Router"
         self.version = version or "0.0.0"
+        self.instrument = instrument
         self.commands = []
         self.filters = {
             "ip_filter": Filter("ip", False, 1000),
@@ -27,19 +58,74 @@ class YamahaRouterConfigBuilder:
         }
         self.nat_descriptor_counter = counter(1)
         self.nat_descriptions = []
+        self.sections = []
+        self.address_pools = {}
+        self.interface_ids = set()
+        self.frozen = False
+        self.shared_commands = 0
+        self.shared_pools = set()
+
+    def freeze(self) -> "YamahaRouterConfigBuilder":
+        """これ以上コマンドを追加・変更できないようにする (derive() で派生したビルダーと状態を共有するため)"""
+        self.frozen = True
+        return self
+
+    def derive(
+        self, device: str | None = None, version: str | None = None, instrument: Instrumentation | None = None
+    ) -> "YamahaRouterConfigBuilder":
+        """
+        このビルダーを凍結し、その内容を引き継いだビルダーを作る (派生したビルダーで追加したコマンドは引き継いだコマンドの後に出力される)
+        コマンド・NAT ディスクリプタ・セクションは複製せずに同じオブジェクトを共有し、
+        フィルタテーブルとアドレスプールは派生したビルダーで変更するときに初めて複製する
+        """
+        self.freeze()
+        config = YamahaRouterConfigBuilder(device or self.device, version or self.version, instrument)
+        config.commands = list(self.commands)
+        config.shared_commands = len(self.commands)
+        config.filters = {name: filter.copy() for name, filter in self.filters.items()}
+        config.nat_descriptor_counter = counter(max((nat.descriptor for nat in self.nat_descriptions), default=0) + 1)
+        config.nat_descriptions = list(self.nat_descriptions)
+        config.sections = list(self.sections)
+        config.address_pools = dict(self.address_pools)
+        config.shared_pools = set(self.address_pools)
+        config.interface_ids = set(self.interface_ids)
+        return config
+
+    def _check_frozen(self):
+        if self.frozen:
+            raise ValueError("Cannot modify a frozen builder (use derive() to add device-specific commands)")
+
+    def _unshare_filter_commands(self):
+        """派生元と共有している FilterCommand を書き換える前に複製する"""
+        for i in range(self.shared_commands):
+            command = self.commands[i]
+            if isinstance(command, FilterCommand):
+                self.commands[i] = copy.copy(command)
 
     @contextmanager
     def section(self, title: str):
+        section = Section(title, len(self.commands), len(self.nat_descriptions))
         self.add(f"\n# {title}")
-        yield
+        try:
+            if self.instrument is None:
+                yield
+            else:
+                with self.instrument.span("section", title):
+                    yield
+        finally:
+            section.close(len(self.commands), len(self.nat_descriptions))
+            self.sections.append(section)
 
     def add(self, command):
+        self._check_frozen()
         self.commands.append(BasicCommand(command))
 
     def ip_filter(self, interface, direction: Direction, static: list[str] = [], dynamic: list[str] = []):
+        self._check_frozen()
         self.commands.append(FilterCommand(self.filters, "ip", interface, direction, static, dynamic))
 
     def ipv6_filter(self, interface, direction: Direction, static: list[str] = [], dynamic: list[str] = []):
+        self._check_frozen()
         self.commands.append(FilterCommand(self.filters, "ipv6", interface, direction, static, dynamic))
 
     def ip_route(self, network: str):
@@ -47,7 +133,8 @@ class YamahaRouterConfigBuilder:
         IP の経路情報の設定
         http://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ip/ip_route.html
         """
-        route = RouteCommand(self.filters, "ip", network)
+        self._check_frozen()
+        route = RouteCommand(self.filters, "ip", network, self)
         self.commands.append(route)
         return route
 
@@ -56,12 +143,67 @@ class YamahaRouterConfigBuilder:
         IPv6 の経路情報の設定
         http://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ipv6/ipv6_route.html
         """
-        route = RouteCommand(self.filters, "ipv6", network)
+        self._check_frozen()
+        route = RouteCommand(self.filters, "ipv6", network, self)
         self.commands.append(route)
         return route
 
+    def dhcp_scope(self, id: int, network: IPv4Addr, min: int, max: int) -> DhcpScope:
+        """
+        DHCP スコープの設定 (返り値の bind() / load() で固定割り当てを追加する)
+        http://www.rtpro.yamaha.co.jp/RT/manual/rt-common/dhcp/dhcp_scope.html
+        """
+        self._check_frozen()
+        self.address_pool(network).reserve(min, max, f"dhcp scope {id}")
+        scope = DhcpScope(id, network, min, max, self)
+        self.commands.append(DhcpScopeCommand(scope))
+        return scope
+
+    def mode_cfg_address_pool(self, id: int, network: IPv4Addr, min: int, max: int):
+        """
+        IKE XAUTH Mode-Cfg method で払い出すアドレスプールの設定
+        http://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ipsec/ipsec_ike_mode-cfg_address_pool.html
+        """
+        self._check_frozen()
+        addresses = self.address_pool(network).reserve(min, max, f"ipsec ike mode-cfg address pool {id}")
+        self.add(f"ipsec ike mode-cfg address pool {id} {addresses}")
+
+    def address_pool(self, network: IPv4Addr) -> AddressPool:
+        """ネットワークごとのアドレス割り当て表 (DHCP スコープや mode-cfg のアドレスプールが重ならないことを確認する)"""
+        cidr = network.cidr()
+        if cidr not in self.address_pools:
+            self.address_pools[cidr] = AddressPool(network)
+        elif cidr in self.shared_pools:
+            self.address_pools[cidr] = self.address_pools[cidr].copy()
+            self.shared_pools.discard(cidr)
+        return self.address_pools[cidr]
+
+    def ikev2_remote_access(
+        self,
+        clients: list[str],
+        first_id: int,
+        domain: str,
+        psk: str,
+        pool_id: int,
+        max_peers: int | None = None,
+    ) -> IkeV2RemoteAccess:
+        """
+        VPN クライアントごとの IPsec トンネル (IKEv2) をまとめて設定する
+        トンネル番号は first_id から順に割り当て、機種の VPN 対地数 (max_peers) や使用済みのトンネル番号と重なる場合はエラーにする
+        """
+        self._check_frozen()
+        vpn = IkeV2RemoteAccess(clients, first_id, domain, psk, pool_id, max_peers or MAX_PEERS.get(self.device))
+        used = sorted(id for id in vpn.ids if ("tunnel", id) in self.interface_ids)
+        if used:
+            raise ValueError(f"Tunnel IDs already in use: {', '.join(map(str, used))}")
+        self.interface_ids.update(("tunnel", id) for id in vpn.ids)
+        self.commands.append(vpn)
+        return vpn
+
     @contextmanager
     def interface(self, interface: str, id: int):
+        self._check_frozen()
+        self.interface_ids.add((interface, id))
         self.add(f"{interface} select {id}")
         try:
             yield
@@ -70,31 +212,166 @@ class YamahaRouterConfigBuilder:
 
     @contextmanager
     def nat(self, interface: str, type: str = "none"):
-        nat = Nat(next(self.nat_descriptor_counter), type)
+        self._check_frozen()
+        nat = Nat(next(self.nat_descriptor_counter), type, self)
         self.nat_descriptions.append(nat)
         self.add(f"ip {interface} nat descriptor {nat.descriptor}")
         yield nat
 
-    def build(self) -> str:
-        commands = [
-            f"# YAMAHA {self.device} config (version {self.version})",
-            "# This file is auto-generated by YamahaRouterConfigBuilder",
-            "# See also: https://github.com/hoto17296/yamaha-router-config",
+    def optimize_filters(self) -> list[FilterOptimization]:
+        """
+        secure filter に適用する静的フィルタから、評価結果を変えずに削除・統合できるルールを取り除く
+        インタフェース・方向ごとに削除したルール数を返す
+        """
+        self._check_frozen()
+        self._unshare_filter_commands()
+        return optimize_filters(self)
+
+    def reorder_filters(self, hits: dict[str, int] | str) -> list[FilterReordering]:
+        """
+        フィルタ定義ごとのヒット数 (またはそのファイルのパス) をもとに、評価結果を変えずに secure filter の静的フィルタを並べ替える
+        インタフェース・方向ごとに、マッチしたパケットあたりの平均比較回数が並べ替えの前後でどう変わったかを返す
+        """
+        self._check_frozen()
+        self._unshare_filter_commands()
+        if isinstance(hits, str):
+            hits = load_hits(hits)
+        return reorder_filters(self, hits)
+
+    def validate(self) -> list[Problem]:
+        """
+        出力する前にビルダーの状態を検証し、見つかった問題をコマンドの順に返す (問題がなければ空のリスト)
+        VPN 対地数を超えるトンネル番号、type を設定していない NAT ディスクリプタ、フィルタ番号の枠の超過、
+        インタフェース番号・DHCP スコープ・DHCP の固定割り当ての重複を検出する
+        """
+        return validate(self)
+
+    def lock_filters(self, path: str):
+        """
+        フィルタ番号をロックファイル (JSON) に記録し、次回以降のビルドでも同じ定義には同じ番号を使う
+        すべてのフィルタを追加した後、ビルドする前に呼ぶ
+        (後から追加した定義には空いている番号が割り当てられるが、ロックファイルには記録されない)
+        """
+        self._check_frozen()
+        lock = {}
+        if os.path.exists(path):
+            with open(path, "rt") as f:
+                lock = json.load(f)
+        lock = {name: filter.allocate(lock.get(name, {})) for name, filter in self.filters.items()}
+        with open(path, "wt") as f:
+            json.dump(lock, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    def compile_filters(self) -> dict[str, dict[str, str]]:
+        """フィルタ定義 → フィルタ番号のテーブルを確定させる (build 時に 1 回だけ呼ぶ)"""
+        return {name: filter.build_table() for name, filter in self.filters.items()}
+
+    def section_hashes(self) -> list[tuple[str, str | None]]:
+        """セクションごとのコンテンツハッシュ (キャッシュできないコマンドを含むセクションは None)"""
+        filter_tables = self.compile_filters()
+        return [
+            (section.title, section_hash(section, self.commands, self.nat_descriptions, filter_tables))
+            for section in sorted(self.sections, key=lambda section: section.start)
         ]
 
-        if len(self.filters) > 0:
-            commands.append("\n# Filter")
-        filter_tables = {}
-        for name, filter in self.filters.items():
-            commands += filter.build_commands()
-            filter_tables[name] = filter.build_table()
+    def build(self, cache: SectionCache | None = None) -> str:
+        return "\n".join(self.build_iter(cache))
+
+    def build_iter(self, cache: SectionCache | None = None) -> Iterator[str]:
+        """
+        設定を 1 行ずつ (セクション単位で遅延評価しながら) 生成する
+        cache を渡すと、内容が変わっていないセクションはキャッシュされた出力を使う
+        """
+        # instrument を渡した場合は、ビルド全体 (生成し終わるまで) を 1 つの build 区間として、フェーズ・セクションごとにも計測する
+        # 呼び出し側の処理時間がフェーズ・セクションの計測に混ざらないように、その区間の中で生成した行は区間を抜けてから返す
+        span = self.instrument.span if self.instrument is not None else _no_span
 
-        if len(self.nat_descriptions) > 0:
-            commands.append("\n# NAT")
-        for nat_description in self.nat_descriptions:
-            commands += nat_description.commands
+        with span("build", "build"):
+            yield from self.header()
+
+            with span("phase", "filters"):
+                filter_tables = self.compile_filters()
+                lines = list(build_filters(self.filters, filter_tables))
+            yield from lines
+            with span("phase", "nat"):
+                lines = list(build_nat([nat.commands for nat in self.nat_descriptions]))
+            yield from lines
+
+            for section, start, end in self._chunks():
+                with span("phase", "commands"):
+                    if section is None:
+                        lines = [line for command in self.commands[start:end] for line in command.build(filter_tables)]
+                    else:
+                        with span("render", section.title):
+                            lines = self._build_section(section, filter_tables, cache)
+                yield from lines
+
+    def header(self) -> list[str]:
+        return build_header(self.device, self.version)
+
+    def _top_level_sections(self) -> dict[int, Section]:
+        """最も外側のセクション (開始位置 → セクション)、入れ子になったセクションは外側のセクションとしてまとめて扱う"""
+        sections: dict[int, Section] = {}
+        covered = 0
+        for section in sorted(self.sections, key=lambda section: (section.start, -section.end)):
+            if section.start >= covered:
+                sections[section.start] = section
+                covered = section.end
+        return sections
+
+    def _chunks(self, batch: int = 1024) -> Iterator[tuple[Section | None, int, int]]:
+        """
+        コマンドを生成する単位 (セクション, 開始位置, 終了位置)
+        最も外側のセクションごと、およびセクションの外の連続した最大 batch 個のコマンドごと (この場合のセクションは None)
+        """
+        sections = self._top_level_sections()
+        i = 0
+        while i < len(self.commands):
+            section = sections.get(i)
+            if section is not None:
+                yield section, section.start, section.end
+                i = section.end
+                continue
+            start = i
+            while i < len(self.commands) and i - start < batch and i not in sections:
+                i += 1
+            yield None, start, i
+
+    def _build_section(
+        self, section: Section, filter_tables: dict[str, dict[str, str]], cache: SectionCache | None
+    ) -> list[str]:
+        key = section_hash(section, self.commands, self.nat_descriptions, filter_tables) if cache is not None else None
+        lines = cache.get(key) if cache is not None and key is not None else None
+        if lines is None:
+            commands = self.commands[section.start : section.end]
+            lines = [line for command in commands for line in command.build(filter_tables)]
+            if cache is not None and key is not None:
+                cache.put(key, lines)
+        return lines
+
+    def compile(self) -> CompiledConfig:
+        """
+        フィルタ番号を確定させてレンダリングした中間表現 (save() しておけば、プロファイルを実行せずに render() できる)
+        シークレットは値の代わりに compiled.placeholder(name) を使ってプロファイルを実行しておく
+        """
+        return CompiledConfig.from_builder(self)
 
-        for command in self.commands:
-            commands += command.build(filter_tables)
+    def build_delta(self, previous: Iterable[str]) -> str:
+        """前回の設定 (行のイテラブル) から今回の設定にするために必要なコマンドだけを出力する"""
+        return "\n".join(build_delta(self, previous))
 
-        return "\n".join(commands)
+    def build_to(self, file: TextIO, buffer_size: int = 64 * 1024, cache: SectionCache | None = None):
+        """設定をファイルに書き出す (build() と同じ内容を buffer_size 文字程度ずつ書き込む)"""
+        chunk: list[str] = []
+        size = 0
+        for i, line in enumerate(self.build_iter(cache)):
+            if i > 0:
+                line = "\n" + line
+            chunk.append(line)
+            size += len(line)
+            if size >= buffer_size:
+                file.write("".join(chunk))
+                chunk.clear()
+                size = 0
+        if chunk:
+            file.write("".join(chunk))
@@ -0,0 +1,135 @@
+"""
+section() ごとの出力をコンテンツハッシュをキーにしてディスクにキャッシュする
+
+ハッシュはセクション内のコマンドの入力 (YamahaRouterCommand.cache_key())、それらが参照するフィルタの番号、
+およびセクション内で作った NAT ディスクリプタの内容から計算するので、
+いずれかが変わったセクションだけが再レンダリングされる
+シークレットを含むコマンド (SECRET_COMMANDS) を含むセクションは、値が平文で残らないようにディスクには書き出さない
+"""
+
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING
+
+from .nat import Nat
+
+if TYPE_CHECKING:
+    from .command import YamahaRouterCommand
+
+# 値にパスワードや事前共有鍵を含むコマンド
+SECRET_COMMANDS = (
+    "login password",
+    "login user",
+    "administrator password",
+    "ipsec ike pre-shared-key",
+    "mail server smtp",
+    "pp auth myname",
+    "pp auth username",
+    "l2tp tunnel auth",
+)
+
+
+def contains_secret(lines: list[str], secret_commands: tuple[str, ...] = SECRET_COMMANDS) -> bool:
+    return any(line.lstrip().startswith(secret_commands) for line in lines)
+
+
+class Section:
+    """section() で囲まれたコマンドの範囲 (commands[start:end]、nat_descriptions[nat_start:nat_end])"""
+
+    def __init__(self, title: str, start: int, nat_start: int):
+        self.title = title
+        self.start = start
+        self.end = start
+        self.nat_start = nat_start
+        self.nat_end = nat_start
+
+    def close(self, end: int, nat_end: int):
+        self.end = end
+        self.nat_end = nat_end
+
+
+def section_hash(
+    section: Section,
+    commands: list["YamahaRouterCommand"],
+    nat_descriptions: list[Nat],
+    filter_tables: dict[str, dict[str, str]],
+) -> str | None:
+    """セクションのコンテンツハッシュ (キャッシュできないコマンドを含む場合は None)"""
+    h = hashlib.sha256(section.title.encode())
+    for command in commands[section.start : section.end]:
+        key = command.cache_key()
+        if key is None:
+            return None
+        h.update(b"\0" + type(command).__name__.encode() + b"\0" + key.encode())
+        for table, _def in command.filter_refs():
+            h.update(b"\0" + filter_tables[table][_def].encode())
+    for nat in nat_descriptions[section.nat_start : section.nat_end]:
+        h.update(b"\0" + "\n".join(nat.commands).encode())
+    return h.hexdigest()
+
+
+class SectionCache:
+    """
+    レンダリング済みのセクションを `<directory>/<hash>.json` に保存する
+    secret_commands で始まる行を含むセクションは保存しない (毎回レンダリングする)
+    """
+
+    def __init__(self, directory: str, secret_commands: tuple[str, ...] = SECRET_COMMANDS):
+        self.directory = directory
+        self.secret_commands = secret_commands
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> list[str] | None:
+        try:
+            with open(self.path(key), "rt") as f:
+                lines = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return lines
+
+    def put(self, key: str, lines: list[str]):
+        if contains_secret(lines, self.secret_commands):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # 書き込み途中のファイルを読まないように、一時ファイルに書いてから置き換える
+        tmp = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wt") as f:
+            json.dump(lines, f, ensure_ascii=False)
+        os.replace(tmp, self.path(key))
+
+
+class MemorySectionCache(SectionCache):
+    """
+    レンダリング済みのセクションをメモリに保持する (同じプロセスで何度もビルドする watch モード用)
+    ディスクに書き出さないので、シークレットを含むセクションも保持する
+    prune() を呼ぶと、前回の prune() 以降に使われなかったセクションを捨てる
+    """
+
+    def __init__(self):
+        super().__init__("")
+        self.entries: dict[str, list[str]] = {}
+        self.used: set[str] = set()
+
+    def get(self, key: str) -> list[str] | None:
+        lines = self.entries.get(key)
+        if lines is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used.add(key)
+        return lines
+
+    def put(self, key: str, lines: list[str]):
+        self.entries[key] = lines
+        self.used.add(key)
+
+    def prune(self):
+        self.entries = {key: lines for key, lines in self.entries.items() if key in self.used}
+        self.used = set()
@@ -1,59 +1,154 @@
+"""
+ビルダーが保持するコマンド
+
+プロファイルによっては数十万個のコマンドを保持するので、インスタンスは __slots__ で __dict__ を持たないようにし、
+プロトコル・インタフェース名・方向・フィルタ定義などの繰り返し現れる文字列は intern して同じオブジェクトを共有する
+"""
+
+import re
+import sys
 from abc import ABCMeta, abstractmethod
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
 
 from .filter import Filter
 from .types import Direction, NetProtocol
 
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+# プロトコルごとの (静的フィルタのテーブル名, 動的フィルタのテーブル名)
+_TABLES: dict[str, tuple[str, str]] = {
+    "ip": ("ip_filter", "ip_dynamic_filter"),
+    "ipv6": ("ipv6_filter", "ipv6_dynamic_filter"),
+}
+
+
+def _intern_all(values: Iterable[str]) -> tuple[str, ...]:
+    return tuple(map(sys.intern, values))
+
 
 class YamahaRouterCommand(metaclass=ABCMeta):
+    __slots__ = ()
+
     @abstractmethod
     def build(self, filter_tables: dict[str, dict[str, str]]) -> list[str]:
         raise NotImplementedError
 
+    @classmethod
+    def removal(cls, line: str) -> str | None:
+        """
+        このコマンド種別が出力した行を取り消す `no` コマンドを返す (このコマンド種別の行でなければ None)
+        同じ `no` コマンドになる行同士は、新しい行を設定するだけで古い行が上書きされる
+        """
+        return None
+
+    def cache_key(self) -> str | None:
+        """
+        出力を左右する入力 (参照するフィルタの番号を除く) を表す文字列
+        セクションのキャッシュに使う (None の場合、このコマンドを含むセクションはキャッシュしない)
+        """
+        return None
+
+    def filter_refs(self) -> Iterator[tuple[str, str]]:
+        """参照しているフィルタ (テーブル名, フィルタ定義)"""
+        return iter(())
+
 
 class BasicCommand(YamahaRouterCommand):
+    __slots__ = ("command",)
+
+    # 最後の単語 (引用符で囲まれた文字列はまとめて 1 つ) を値とみなす
+    _removal = re.compile(r'^(.+?)\s+("[^"]*"|\S+)$')
+
     def __init__(self, command: str):
         self.command = command
 
     def build(self, filter_tables):
         return [self.command]
 
+    @classmethod
+    def removal(cls, line):
+        # 値だけが変わった行は新しい行を設定すれば上書きされるので、値を除いたコマンドで取り消す
+        m = cls._removal.match(line)
+        return f"no {m[1] if m else line}"
+
+    def cache_key(self):
+        return self.command
+
 
 class FilterCommand(YamahaRouterCommand):
+    __slots__ = ("protocol", "interface", "direction", "static_filters", "dynamic_filters", "tables", "prefix")
+
     def __init__(
         self,
         filters: dict[str, Filter],
         protocol: NetProtocol,
         interface: str,
         direction: Direction,
-        static_filters: list[str] = [],
-        dynamic_filters: list[str] = [],
+        static_filters: Iterable[str] = (),
+        dynamic_filters: Iterable[str] = (),
     ):
-        self.protocol: NetProtocol = protocol
-        self.interface = interface
-        self.direction = direction
-        self.static_filters = static_filters
-        self.dynamic_filters = dynamic_filters
-        filters[f"{protocol}_filter"].add(static_filters)
-        filters[f"{protocol}_dynamic_filter"].add(dynamic_filters)
+        self.protocol: NetProtocol = sys.intern(protocol)  # type: ignore
+        self.interface = sys.intern(interface)
+        self.direction: Direction = sys.intern(direction)  # type: ignore
+        self.static_filters = _intern_all(static_filters)
+        self.dynamic_filters = _intern_all(dynamic_filters)
+        # テーブル名とコマンドの先頭部分は build のたびに組み立てずに済むよう先に作っておく
+        self.tables = _TABLES[protocol]
+        self.prefix = sys.intern(f"{protocol} {interface} secure filter {direction}")
+        filters[self.static_table].add(self.static_filters)
+        filters[self.dynamic_table].add(self.dynamic_filters)
+
+    @property
+    def static_table(self) -> str:
+        return self.tables[0]
+
+    @property
+    def dynamic_table(self) -> str:
+        return self.tables[1]
 
     def build(self, filter_tables):
-        command = f"{self.protocol} {self.interface} secure filter {self.direction}"
-        for filter_def in self.static_filters:
-            command += f" {filter_tables[f'{self.protocol}_filter'][filter_def]}"
+        words = [self.prefix]
+        if len(self.static_filters) > 0:
+            words += map(filter_tables[self.static_table].__getitem__, self.static_filters)
         if len(self.dynamic_filters) > 0:
-            command += " dynamic"
-        for filter_def in self.dynamic_filters:
-            command += f" {filter_tables[f'{self.protocol}_dynamic_filter'][filter_def]}"
-        return [command]
+            words.append("dynamic")
+            words += map(filter_tables[self.dynamic_table].__getitem__, self.dynamic_filters)
+        return [" ".join(words)]
+
+    def cache_key(self):
+        return repr((self.prefix, self.static_filters, self.dynamic_filters))
+
+    def filter_refs(self):
+        for _def in self.static_filters:
+            yield self.static_table, _def
+        for _def in self.dynamic_filters:
+            yield self.dynamic_table, _def
+
+    _removal = re.compile(r"^ip(v6)? \S+ secure filter (in|out)\b")
+
+    @classmethod
+    def removal(cls, line):
+        m = cls._removal.match(line)
+        return f"no {m[0]}" if m else None
 
 
 class RouteCommand(YamahaRouterCommand):
-    def __init__(self, filters: dict[str, Filter], protocol: NetProtocol, network: str):
+    __slots__ = ("filters", "protocol", "network", "gateways", "owner")
+
+    def __init__(
+        self,
+        filters: dict[str, Filter],
+        protocol: NetProtocol,
+        network: str,
+        owner: "YamahaRouterConfigBuilder | None" = None,
+    ):
         self.filters = filters
-        self.protocol: NetProtocol = protocol
+        self.protocol: NetProtocol = sys.intern(protocol)  # type: ignore
         self.network = network
         self.gateways: list[Gateway] = []
+        # このコマンドを追加したビルダー (凍結した後は経路を追加できない)
+        self.owner = owner
 
     def __enter__(self):
         return self
@@ -62,38 +157,71 @@ class RouteCommand(YamahaRouterCommand):
         if ex_value:
             raise ex_value
 
-    def gateway(self, gateway: str, filters: list[str] = [], **kwargs):
+    def gateway(self, gateway: str, filters: Iterable[str] = (), **kwargs):
         """
         経路情報を追加する
         静的フィルターおよび各種パラメータを指定できるが、DPI フィルタには未対応
         """
-        self.gateways.append(Gateway(self.protocol, gateway, filters, **kwargs))
-        self.filters[f"{self.protocol}_filter"].add(filters)
+        if self.owner is not None:
+            self.owner._check_frozen()
+        gw = Gateway(self.protocol, gateway, filters, **kwargs)
+        self.gateways.append(gw)
+        self.filters[gw.table].add(gw.filters)
 
     def build(self, filter_tables):
-        command = f"{self.protocol} route {self.network}"
+        return [" ".join([f"{self.protocol} route {self.network}", *(gw.build(filter_tables) for gw in self.gateways)])]
+
+    def cache_key(self):
+        return repr((self.protocol, self.network, [(gw.gateway, gw.filters, gw.options) for gw in self.gateways]))
+
+    def filter_refs(self):
         for gateway in self.gateways:
-            command += f" {gateway.build(filter_tables)}"
-        return [command]
+            for _def in gateway.filters:
+                yield gateway.table, _def
+
+    _removal = re.compile(r"^ip(v6)? route \S+")
+
+    @classmethod
+    def removal(cls, line):
+        m = cls._removal.match(line)
+        return f"no {m[0]}" if m else None
+
+
+# ゲートウェイのパラメータ (キーワード引数の順序を保った (名前, 値) のタプル)
+type GatewayParameters = tuple[tuple[str, Any], ...]
+
+
+def _format_options(parameters: GatewayParameters) -> tuple[str, ...]:
+    """オプションの文字列 (同じ文字列は intern して共有する)"""
+    options = []
+    for key, val in parameters:
+        if type(val) is bool:
+            if val:
+                options.append(sys.intern(key))
+        else:
+            options.append(sys.intern(f"{key} {val}"))
+    return tuple(options)
 
 
 class Gateway:
-    def __init__(self, protocol: NetProtocol, gateway: str, filters: list[str], **kwargs):
-        self.protocol: NetProtocol = protocol
-        self.gateway = gateway
-        self.filters = filters
-        self.parameters: dict[str, Any] = kwargs
+    __slots__ = ("table", "gateway", "filters", "parameters", "options")
+
+    def __init__(self, protocol: NetProtocol, gateway: str, filters: Iterable[str], **kwargs):
+        self.table = _TABLES[protocol][0]
+        self.gateway = sys.intern(gateway)
+        self.filters = _intern_all(filters)
+        # パラメータ部分はフィルタ番号に依存しないので先に文字列化しておく
+        self.parameters: GatewayParameters = tuple(kwargs.items())
+        self.options = _format_options(self.parameters)
+
+    @property
+    def protocol(self) -> NetProtocol:
+        return "ip" if self.table == "ip_filter" else "ipv6"
 
     def build(self, filter_tables: dict[str, dict[str, str]]) -> str:
-        option = f"gateway {self.gateway}"
+        words = [f"gateway {self.gateway}"]
         if len(self.filters) > 0:
-            option += " filter"
-        for filter_def in self.filters:
-            option += f" {filter_tables[f'{self.protocol}_filter'][filter_def]}"
-        for key, val in self.parameters.items():
-            if type(val) is bool:
-                if val:
-                    option += f" {key}"
-            else:
-                option += f" {key} {val}"
-        return option
+            words.append("filter")
+            words += map(filter_tables[self.table].__getitem__, self.filters)
+        words += self.options
+        return " ".join(words)
@@ -0,0 +1,202 @@
+"""
+ビルダーの状態をコンパイル済みの中間表現として保存・読み込みする
+
+中間表現はフィルタ番号を確定させたフィルタテーブル・NAT ディスクリプタ・レンダリング済みのコマンド・セクションの範囲を持つ JSON
+(パスが .gz で終わる場合は gzip で圧縮する)
+シークレットは値の代わりに placeholder(name) (`${NAME}`) を渡してプロファイルを実行しておき、render() に渡した値で置き換える
+中間表現にはシークレットの値が含まれないので、CI などでキャッシュしてよい
+
+usage: python -m yamaha_router_config_builder.compiled <compiled.json[.gz]> [--output FILE]
+       (シークレットは同じ名前の環境変数から読む)
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+from typing import IO, TYPE_CHECKING, Any, Mapping
+
+from .filter import Filter
+from .render import build_filters, build_nat
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+# 中間表現の形式のバージョン (互換性のない変更をしたら上げる)
+FORMAT_VERSION = 1
+
+_PLACEHOLDER = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+def placeholder(name: str) -> str:
+    """シークレットの代わりにプロファイルに渡す文字列"""
+    return "${" + name + "}"
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore
+    return open(path, mode + "t", encoding="utf-8")
+
+
+class CompiledConfig:
+    device: str
+    version: str
+    header: list[str]
+    # テーブル名 → フィルタ定義とフィルタ番号
+    filters: dict[str, Filter]
+    # NAT ディスクリプタごとのコマンド
+    nat: list[list[str]]
+    # レンダリング済みのコマンド (build_iter() の NAT より後の部分)
+    commands: list[str]
+    # (セクション名, commands の開始位置, 終了位置) (開始位置の順)
+    sections: list[tuple[str, int, int]]
+    # 出力に含まれるシークレットの名前
+    secrets: list[str]
+
+    def __init__(
+        self,
+        device: str,
+        version: str,
+        header: list[str],
+        filters: dict[str, Filter],
+        nat: list[list[str]],
+        commands: list[str],
+        sections: list[tuple[str, int, int]],
+        secrets: list[str],
+    ):
+        self.device = device
+        self.version = version
+        self.header = header
+        self.filters = filters
+        self.nat = nat
+        self.commands = commands
+        self.sections = sections
+        self.secrets = secrets
+
+    @classmethod
+    def from_builder(cls, builder: "YamahaRouterConfigBuilder") -> "CompiledConfig":
+        filter_tables = builder.compile_filters()
+        commands: list[str] = []
+        # コマンドごとの commands の開始位置
+        offsets: list[int] = []
+        for command in builder.commands:
+            offsets.append(len(commands))
+            commands.extend(command.build(filter_tables))
+        offsets.append(len(commands))
+
+        filters = {}
+        for name, filter in builder.filters.items():
+            frozen = Filter(filter.protocol, filter.dynamic, filter.filter_num_base, filter.filter_num_size)
+            frozen.index = dict(filter.items())
+            filters[name] = frozen
+        nat = [list(nat.commands) for nat in builder.nat_descriptions]
+        sections = [
+            (section.title, offsets[section.start], offsets[section.end])
+            for section in sorted(builder.sections, key=lambda section: (section.start, -section.end))
+        ]
+
+        secrets: set[str] = set()
+        for lines in [commands, *nat, *(filter.index for filter in filters.values())]:
+            for line in lines:
+                if "${" in line:
+                    secrets.update(_PLACEHOLDER.findall(line))
+        return cls(
+            builder.device,
+            builder.version,
+            builder.header(),
+            filters,
+            nat,
+            commands,
+            sections,
+            sorted(secrets),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "format": FORMAT_VERSION,
+            "device": self.device,
+            "version": self.version,
+            "header": self.header,
+            "filters": {
+                name: {
+                    "protocol": filter.protocol,
+                    "dynamic": filter.dynamic,
+                    "base": filter.filter_num_base,
+                    "size": filter.filter_num_size,
+                    "index": filter.index,
+                }
+                for name, filter in self.filters.items()
+            },
+            "nat": self.nat,
+            "commands": self.commands,
+            "sections": [list(section) for section in self.sections],
+            "secrets": self.secrets,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "CompiledConfig":
+        if data.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled config format: {data.get('format')} (expected {FORMAT_VERSION})")
+        filters = {}
+        for name, table in data["filters"].items():
+            filter = Filter(table["protocol"], table["dynamic"], table["base"], table["size"])
+            filter.index = table["index"]
+            filters[name] = filter
+        return cls(
+            data["device"],
+            data["version"],
+            data["header"],
+            filters,
+            data["nat"],
+            data["commands"],
+            [(title, start, end) for title, start, end in data["sections"]],
+            data["secrets"],
+        )
+
+    def save(self, path: str):
+        with _open(path, "w") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledConfig":
+        with _open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def lines(self) -> list[str]:
+        """シークレットをプレースホルダのままにした出力 (YamahaRouterConfigBuilder.build_iter() と同じ行)"""
+        return [*self.header, *build_filters(self.filters), *build_nat(self.nat), *self.commands]
+
+    def render(self, secrets: Mapping[str, str]) -> str:
+        """プレースホルダを secrets の値で置き換えた設定 (足りないシークレットがあれば ValueError)"""
+        missing = [name for name in self.secrets if name not in secrets]
+        if missing:
+            raise ValueError(f"Missing secrets: {', '.join(missing)}")
+        text = "\n".join(self.lines())
+        if not self.secrets:
+            return text
+        names = set(self.secrets)
+        return _PLACEHOLDER.sub(lambda m: secrets[m[1]] if m[1] in names else m[0], text)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Render a compiled YAMAHA router config with secrets from the environment")
+    parser.add_argument("compiled", help="compiled config (JSON, optionally gzipped)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        text = CompiledConfig.load(args.compiled).render(os.environ)
+    except ValueError as e:
+        sys.exit(str(e))
+    if args.output:
+        with open(args.output, "wt") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+前回の設定 (ビルド結果や保存した running-config) との差分だけを適用するコマンド列を作る
+
+適用順序は以下の通り
+1. 追加・変更されたフィルタ定義 (インタフェースに適用する前に定義しておく)
+2. 追加・変更された NAT ディスクリプタ
+3. グローバルな設定とインタフェースごとの設定 (`tunnel select` 〜 `tunnel enable` でまとめる)
+4. 削除された NAT ディスクリプタとフィルタ定義 (インタフェースから外した後に削除する)
+"""
+
+from typing import TYPE_CHECKING, Iterable
+
+from .command import BasicCommand, FilterCommand, RouteCommand
+from .dhcp import DhcpScopeCommand
+from .diff import GLOBAL_BLOCK, BlockKey, diff
+from .filter import Filter
+from .nat import Nat
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+# 行から `no` コマンドを求める際に試すコマンド種別 (BasicCommand はどの行にもマッチするので最後に置く)
+COMMAND_TYPES = (Filter, Nat, FilterCommand, RouteCommand, DhcpScopeCommand, BasicCommand)
+
+
+def removal(line: str) -> str:
+    for command_type in COMMAND_TYPES:
+        if (command := command_type.removal(line)) is not None:
+            return command
+    raise ValueError(f"Cannot remove: {line}")
+
+
+def block_delta(removed: list[str], added: list[str]) -> tuple[list[str], list[str]]:
+    """ブロック内の削除コマンドと追加コマンドを返す (追加する行で上書きされる行は `no` しない)"""
+    overwritten = {removal(line) for line in added}
+    # 同じ `no` コマンドになる行が複数削除された場合も 1 回だけ送る
+    removals = dict.fromkeys(command for line in removed if (command := removal(line)) not in overwritten)
+    return list(removals), added
+
+
+def build_delta(builder: "YamahaRouterConfigBuilder", previous: Iterable[str]) -> list[str]:
+    # 今回の設定に存在するインタフェースブロック
+    selected: set[BlockKey] = set()
+
+    def current():
+        for item in builder.build_iter():
+            for line in item.split("\n"):
+                words = line.split()
+                if len(words) == 3 and words[1] == "select":
+                    selected.add((words[0], words[2]))
+                yield line
+
+    blocks: dict[BlockKey, tuple[list[str], list[str]]] = {}
+    for change in diff(previous, current()):
+        # 位置が変わっただけの行は適用し直す必要がない
+        if change.type == "moved":
+            continue
+        removed, added = blocks.setdefault(change.block, ([], []))
+        (removed if change.type == "removed" else added).append(change.line)
+
+    filters, nats, globals_, interfaces = [], [], [], []
+    for key, (removed, added) in blocks.items():
+        if key[0] == "filter":
+            filters.append(block_delta(removed, added))
+        elif key[0] == "nat":
+            nats.append(block_delta(removed, added))
+        elif key == GLOBAL_BLOCK:
+            globals_.append(block_delta(removed, added))
+        else:
+            removals, additions = block_delta(removed, added)
+            interface, id = key
+            commands = [f"{interface} select {id}", *removals, *additions]
+            # 前回にしか存在しないインタフェースは無効にする
+            commands.append(f"{interface} {'enable' if key in selected else 'disable'} {id}")
+            interfaces.append(commands)
+
+    commands = []
+    for _, additions in filters + nats:
+        commands += additions
+    for removals, additions in globals_:
+        commands += removals + additions
+    for interface_commands in interfaces:
+        commands += interface_commands
+    for removals, _ in nats + filters:
+        commands += removals
+    return commands
@@ -0,0 +1,431 @@
+"""
+ビルドした設定 (または差分) を asyncio で多数のルーターに並列に送る
+
+- 同時に転送する台数は全体で concurrency 台まで、1 台あたり per_host 本までに制限する
+- コネクションはホストごとにプールして、同じホストへの次の転送で使い回す
+- 失敗した転送は指数バックオフ (ジッタ付き) を挟んで retries 回までやり直す (認証エラーはやり直さない)
+- 通信エラー以外の例外 (設定の読み込みの失敗など) はやり直さずにその台の結果として記録し、他の台の転送は続ける
+- 設定は 1 ブロック (512 バイト) ずつ読みながら送るので、ファイル全体をメモリに載せない
+
+転送方法は TFTP (ルーターの `tftp host` で許可したホストから `config/<管理パスワード>` に書き込む) と
+SSH (administrator モードでコマンドを流し込んで save する、要 asyncssh) に対応する
+SSH ではホスト鍵を known_hosts (既定は ~/.ssh/known_hosts、ターゲットごとに "known_hosts" で指定できる) で検証する
+検証を省くには --no-host-key-check を明示的に指定する (パスワードと設定を盗聴されるおそれがある)
+
+usage: python -m yamaha_router_config_builder.deploy <targets.json> [--transport tftp|ssh] [--concurrency N] [--no-host-key-check]
+
+targets.json は `{"name", "host", "config"}` (必要に応じて "port", "username", "password", "admin_password", "known_hosts") のリスト
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import struct
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Protocol
+
+# TFTP のオペコード
+RRQ, WRQ, DATA, ACK, ERROR = 1, 2, 3, 4, 5
+BLOCK_SIZE = 512
+
+# 転送のたびに設定の行を読み直す関数 (やり直すときも先頭から送り直すため)
+type Source = Callable[[], Iterable[str]]
+
+
+class Target:
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        port: int | None = None,
+        username: str | None = None,
+        password: str | None = None,
+        admin_password: str | None = None,
+        known_hosts: str | None = None,
+    ):
+        """
+        password は SSH のログインパスワード、admin_password は管理パスワード (TFTP と administrator コマンドで使う)
+        known_hosts は SSH のホスト鍵を検証する known_hosts ファイル (None なら ~/.ssh/known_hosts)
+        """
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.admin_password = admin_password
+        self.known_hosts = known_hosts
+
+
+class DeployResult:
+    def __init__(self, name: str, ok: bool, attempts: int, bytes: int, seconds: float, error: str | None = None):
+        self.name = name
+        self.ok = ok
+        self.attempts = attempts
+        self.bytes = bytes
+        self.seconds = seconds
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "ok": self.ok,
+            "attempts": self.attempts,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "error": self.error,
+        }
+
+
+class Connection(Protocol):
+    async def send(self, blocks: Iterable[bytes]) -> int: ...
+
+    async def close(self): ...
+
+
+def read_lines(path: str) -> Source:
+    """ファイルから設定を読む Source"""
+
+    def source() -> Iterator[str]:
+        with open(path, "rt") as f:
+            yield from f
+
+    return source
+
+
+def iter_blocks(lines: Iterable[str], size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    行を size バイトずつのブロックにする (改行で終わらない行には改行を付ける)
+    最後のブロックは必ず size 未満になる (ちょうど割り切れる場合は空のブロックを付ける)
+    """
+    buffer = bytearray()
+    for line in lines:
+        buffer += line.encode()
+        if not line.endswith("\n"):
+            buffer += b"\n"
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    yield bytes(buffer)
+
+
+class _TftpProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.queue: asyncio.Queue[tuple[bytes, tuple]] = asyncio.Queue()
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.queue.put_nowait((data, addr))
+
+    def error_received(self, exc: Exception):
+        # ICMP port unreachable などは応答なしとして扱い、再送に任せる
+        pass
+
+
+class TftpConnection:
+    """UDP ソケット 1 つで TFTP (RFC 1350, octet モード) の書き込みを行う"""
+
+    def __init__(self, target: Target, timeout: float = 1.0, retransmits: int = 5):
+        self.target = target
+        self.timeout = timeout
+        self.retransmits = retransmits
+        self.address: tuple | None = None
+        self.transport: asyncio.DatagramTransport | None = None
+        self.protocol: _TftpProtocol | None = None
+
+    async def open(self) -> "TftpConnection":
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(self.target.host, self.target.port or 69, type=socket.SOCK_DGRAM)
+        family, _, _, _, self.address = infos[0]
+        self.transport, self.protocol = await loop.create_datagram_endpoint(
+            _TftpProtocol, local_addr=("::" if family == socket.AF_INET6 else "0.0.0.0", 0), family=family
+        )
+        return self
+
+    async def send(self, blocks: Iterable[bytes]) -> int:
+        assert self.protocol is not None and self.address is not None
+        # 前回の転送の遅れて届いた応答を捨てる
+        while not self.protocol.queue.empty():
+            self.protocol.queue.get_nowait()
+        filename = f"config/{self.target.admin_password}" if self.target.admin_password else "config"
+        # サーバーは別のポート (TID) から応答してくることがあるので、最初の ACK の送信元を以降の宛先にする
+        peer = await self._exchange(struct.pack("!H", WRQ) + filename.encode() + b"\0octet\0", self.address, 0)
+        size = 0
+        block = 0
+        for data in blocks:
+            block = (block + 1) & 0xFFFF
+            await self._exchange(struct.pack("!HH", DATA, block) + data, peer, block)
+            size += len(data)
+        return size
+
+    async def _exchange(self, packet: bytes, address: tuple, block: int) -> tuple:
+        """packet を送り、block 番の ACK を受け取るまで再送する (ACK の送信元を返す)"""
+        assert self.transport is not None and self.protocol is not None
+        loop = asyncio.get_running_loop()
+        for _ in range(self.retransmits + 1):
+            self.transport.sendto(packet, address)
+            deadline = loop.time() + self.timeout
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    data, source = await asyncio.wait_for(self.protocol.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if source[0] != address[0] or (block > 0 and source[1] != address[1]):
+                    continue
+                # オペコードとブロック番号に満たない壊れたパケットは無視する
+                if len(data) < 4:
+                    continue
+                opcode, number = struct.unpack("!HH", data[:4])
+                if opcode == ERROR:
+                    message = data[4:].rstrip(b"\0").decode(errors="replace")
+                    # Access violation は認証エラーなので、やり直しても成功しない
+                    error = PermissionError if number == 2 else ConnectionError
+                    raise error(f"TFTP error from {self.target.name}: {message}")
+                if opcode == ACK and number == block:
+                    return source
+        raise TimeoutError(f"No response from {self.target.name}")
+
+    async def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class SshConnection:
+    """SSH でログインし、administrator モードでコマンドを流し込んで save する"""
+
+    def __init__(self, target: Target, timeout: float = 30.0, host_key_check: bool = True):
+        """host_key_check=False はホスト鍵を検証しない (中間者にパスワードと設定を渡してしまうので、検証用の環境以外では使わない)"""
+        self.target = target
+        self.timeout = timeout
+        self.host_key_check = host_key_check
+        self.connection = None
+
+    @property
+    def known_hosts(self) -> str | tuple | None:
+        """asyncssh.connect に渡す known_hosts (() は asyncssh の既定の ~/.ssh/known_hosts、None は検証しない)"""
+        if not self.host_key_check:
+            return None
+        return self.target.known_hosts or ()
+
+    @contextmanager
+    def _errors(self) -> Iterator[None]:
+        """asyncssh の例外を、Deployer が扱う例外 (認証エラーは PermissionError、それ以外は ConnectionError) にする"""
+        import asyncssh  # 要 asyncssh (`pip install yamaha-router-config-builder[deploy]`)
+
+        try:
+            yield
+        except asyncssh.PermissionDenied as e:
+            raise PermissionError(f"SSH authentication failed for {self.target.name}: {e.reason}") from e
+        except asyncssh.Error as e:
+            raise ConnectionError(f"SSH error from {self.target.name}: {e.reason}") from e
+
+    async def open(self) -> "SshConnection":
+        import asyncssh
+
+        with self._errors():
+            self.connection = await asyncio.wait_for(
+                asyncssh.connect(
+                    self.target.host,
+                    self.target.port or 22,
+                    username=self.target.username,
+                    password=self.target.password,
+                    known_hosts=self.known_hosts,
+                ),
+                self.timeout,
+            )
+        return self
+
+    async def send(self, blocks: Iterable[bytes]) -> int:
+        assert self.connection is not None
+        with self._errors():
+            process = await self.connection.create_process(term_type="vt100", encoding=None)
+            password = (self.target.admin_password or "").encode()
+            process.stdin.write(b"administrator\n" + password + b"\n")
+            size = 0
+            for data in blocks:
+                process.stdin.write(data)
+                await process.stdin.drain()
+                size += len(data)
+            process.stdin.write(b"save\nquit\nquit\n")
+            process.stdin.write_eof()
+            await asyncio.wait_for(process.wait(), self.timeout)
+        return size
+
+    async def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            await self.connection.wait_closed()
+
+
+TRANSPORTS: dict[str, Callable[..., TftpConnection | SshConnection]] = {
+    "tftp": TftpConnection,
+    "ssh": SshConnection,
+}
+
+
+class ConnectionPool:
+    """
+    ホストごとのコネクションプール (同じホストに同時に張るコネクションも size 本までに制限する)
+    limit を渡すと、ホストの空きを待ってから全体の同時転送数の枠を取る (空きのないホストが全体の枠を塞がない)
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[Target], Awaitable[Connection]],
+        size: int = 1,
+        limit: asyncio.Semaphore | None = None,
+    ):
+        self.connect = connect
+        self.size = size
+        self.limit = limit
+        self.hosts: dict[tuple[str, int | None], tuple[asyncio.Semaphore, list[Connection]]] = {}
+
+    @asynccontextmanager
+    async def acquire(self, target: Target) -> AsyncIterator[Connection]:
+        semaphore, idle = self.hosts.setdefault((target.host, target.port), (asyncio.Semaphore(self.size), []))
+        async with semaphore, self.limit or nullcontext():
+            connection = idle.pop() if idle else await self.connect(target)
+            try:
+                yield connection
+            except BaseException:
+                # 失敗したコネクションは状態がわからないので使い回さない
+                await connection.close()
+                raise
+            idle.append(connection)
+
+    async def close(self):
+        for _, idle in self.hosts.values():
+            for connection in idle:
+                await connection.close()
+            idle.clear()
+
+
+class Deployer:
+    def __init__(
+        self,
+        transport: str = "tftp",
+        concurrency: int = 64,
+        per_host: int = 1,
+        retries: int = 3,
+        backoff: float = 0.5,
+        **options,
+    ):
+        """options は転送方法ごとのコネクションに渡す (TFTP なら timeout, retransmits)"""
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.options = options
+
+    async def connect(self, target: Target) -> Connection:
+        return await TRANSPORTS[self.transport](target, **self.options).open()
+
+    async def push(self, pool: ConnectionPool, target: Target, source: Source) -> DeployResult:
+        start = time.perf_counter()
+        error = None
+        for attempt in range(1, self.retries + 2):
+            try:
+                async with pool.acquire(target) as connection:
+                    size = await connection.send(iter_blocks(source()))
+                return DeployResult(target.name, True, attempt, size, time.perf_counter() - start)
+            except PermissionError as e:
+                return DeployResult(target.name, False, attempt, 0, time.perf_counter() - start, str(e))
+            except OSError as e:
+                error = f"{type(e).__name__}: {e}"
+            except Exception as e:
+                # やり直しても同じ結果になる可能性が高いので、この台は失敗として他の台の転送を続ける
+                return DeployResult(
+                    target.name, False, attempt, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+                )
+            if attempt <= self.retries:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+        return DeployResult(target.name, False, self.retries + 1, 0, time.perf_counter() - start, error)
+
+    async def deploy(self, jobs: Iterable[tuple[Target, Source]]) -> list[DeployResult]:
+        """全台に設定を送り、結果を jobs と同じ順序で返す"""
+        pool = ConnectionPool(self.connect, self.per_host, asyncio.Semaphore(self.concurrency))
+        try:
+            return list(await asyncio.gather(*(self.push(pool, target, source) for target, source in jobs)))
+        finally:
+            await pool.close()
+
+
+def deploy_fleet(jobs: Iterable[tuple[Target, Source]], **options) -> list[DeployResult]:
+    """Deployer(**options).deploy(jobs) をイベントループを作って実行する"""
+    return asyncio.run(Deployer(**options).deploy(jobs))
+
+
+def load_targets(path: str) -> list[tuple[Target, Source]]:
+    with open(path, "rt") as f:
+        rows = json.load(f)
+    names = [row["name"] for row in rows]
+    if len(set(names)) != len(names):
+        raise ValueError("Target names must be unique")
+    return [
+        (
+            Target(
+                row["name"],
+                row["host"],
+                row.get("port"),
+                row.get("username"),
+                row.get("password"),
+                row.get("admin_password"),
+                row.get("known_hosts"),
+            ),
+            read_lines(row["config"]),
+        )
+        for row in rows
+    ]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Push YAMAHA router configs to many devices concurrently")
+    parser.add_argument(
+        "targets", help="JSON list of {name, host, config[, port, username, password, admin_password, known_hosts]}"
+    )
+    parser.add_argument("-t", "--transport", choices=sorted(TRANSPORTS), default="tftp")
+    parser.add_argument("-c", "--concurrency", type=int, default=64)
+    parser.add_argument("--per-host", type=int, default=1)
+    parser.add_argument("-r", "--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument(
+        "--no-host-key-check",
+        action="store_true",
+        help="do not verify SSH host keys (INSECURE: passwords and configs can be intercepted)",
+    )
+    args = parser.parse_args(argv)
+    options = {}
+    if args.no_host_key_check:
+        if args.transport != "ssh":
+            parser.error("--no-host-key-check is only for --transport ssh")
+        options["host_key_check"] = False
+
+    start = time.perf_counter()
+    results = deploy_fleet(
+        load_targets(args.targets),
+        transport=args.transport,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        retries=args.retries,
+        backoff=args.backoff,
+        **options,
+    )
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            status = "ok" if result.ok else f"FAILED ({result.error})"
+            print(f"{result.name}\t{status}\t{result.attempts} attempts\t{result.seconds * 1000:.1f} ms")
+        failed = sum(not result.ok for result in results)
+        print(f"{len(results)} devices in {time.perf_counter() - start:.2f} s ({failed} failed)")
+    if any(not result.ok for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
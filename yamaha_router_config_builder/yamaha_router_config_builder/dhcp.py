@@ -0,0 +1,120 @@
+import csv
+import json
+import re
+from typing import TYPE_CHECKING, Iterable
+
+from .command import YamahaRouterCommand
+from .utils import IPv4Addr, addr2int, int2addr
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+_MAC = re.compile(r"^[0-9a-f]{2}([:-]?)[0-9a-f]{2}(\1[0-9a-f]{2}){4}$")
+
+# 一括登録でエラーがあった場合に例外メッセージに含める件数の上限
+MAX_REPORTED_ERRORS = 20
+
+
+class DhcpScope:
+    """
+    DHCP スコープと固定割り当て (dhcp scope bind) の集合
+    IP アドレスと MAC アドレスそれぞれのハッシュインデックスを持ち、重複を 1 件あたり O(1) で検出する
+    """
+
+    def __init__(
+        self, id: int, network: IPv4Addr, min: int, max: int, owner: "YamahaRouterConfigBuilder | None" = None
+    ):
+        self.id = id
+        self.network = network
+        self.min = min
+        self.max = max
+        base = network.addr & network.mask
+        self.first = base + min
+        self.last = base + max
+        self.by_ip: dict[int, str] = {}
+        self.by_mac: dict[str, int] = {}
+        # このスコープを追加したビルダー (凍結した後は固定割り当てを追加できない)
+        self.owner = owner
+
+    def bind(self, ip: str, mac: str):
+        """固定割り当てを追加する (範囲外のアドレスや、IP アドレス・MAC アドレスの重複は ValueError)"""
+        if self.owner is not None:
+            self.owner._check_frozen()
+        addr = _parse_addr(ip)
+        if not self.first <= addr <= self.last:
+            raise ValueError(f"{ip} is out of DHCP scope {self.id} ({self.network.range(self.min, self.max)})")
+        mac = normalize_mac(mac)
+        if addr in self.by_ip:
+            raise ValueError(f"{ip} is already bound to {self.by_ip[addr]} in DHCP scope {self.id}")
+        if mac in self.by_mac:
+            raise ValueError(f"{mac} is already bound to {int2addr(self.by_mac[mac])} in DHCP scope {self.id}")
+        self.by_ip[addr] = mac
+        self.by_mac[mac] = addr
+
+    def bind_all(self, rows: Iterable[dict[str, str]]):
+        """
+        `ip` と `mac` を持つ行をまとめて追加する
+        エラーがあった行はスキップして最後まで処理し、エラーがあればまとめて ValueError にする
+        """
+        errors = []
+        for i, row in enumerate(rows, 1):
+            try:
+                self.bind(row["ip"], row["mac"])
+            except (KeyError, ValueError) as e:
+                errors.append(f"row {i}: {e}")
+        if errors:
+            more = f"\n... and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+            raise ValueError("\n".join(errors[:MAX_REPORTED_ERRORS]) + more)
+
+    def load(self, path: str):
+        """CSV (`ip,mac` のヘッダを持つ) または JSON (`ip`, `mac` を持つオブジェクトのリスト) から固定割り当てを読み込む"""
+        with open(path, newline="") as f:
+            if path.endswith(".json"):
+                self.bind_all(json.load(f))
+            else:
+                self.bind_all(csv.DictReader(f))
+
+    def commands(self) -> list[str]:
+        """スコープの設定と、IP アドレス順に並べた固定割り当て"""
+        commands = [f"dhcp scope {self.id} {self.network.range(self.min, self.max)}"]
+        commands += [
+            f"dhcp scope bind {self.id} {int2addr(addr)} {self.by_ip[addr]}" for addr in sorted(self.by_ip)
+        ]
+        return commands
+
+
+def _parse_addr(ip: str) -> int:
+    try:
+        return addr2int(ip.strip())
+    except (AssertionError, ValueError):
+        raise ValueError(f"Invalid IPv4 address: {ip}")
+
+
+def normalize_mac(mac: str) -> str:
+    """MAC アドレスを小文字のコロン区切りにする"""
+    mac = mac.strip().lower()
+    if not _MAC.match(mac):
+        raise ValueError(f"Invalid MAC address: {mac}")
+    digits = mac.replace(":", "").replace("-", "")
+    return ":".join(digits[i : i + 2] for i in range(0, 12, 2))
+
+
+class DhcpScopeCommand(YamahaRouterCommand):
+    __slots__ = ("scope",)
+
+    def __init__(self, scope: DhcpScope):
+        self.scope = scope
+
+    def build(self, filter_tables):
+        return self.scope.commands()
+
+    def cache_key(self):
+        scope = self.scope
+        return repr((scope.id, scope.network.cidr(), scope.min, scope.max, sorted(scope.by_ip.items())))
+
+    _removal = re.compile(r"^dhcp scope (bind \d+ \S+|\d+)")
+
+    @classmethod
+    def removal(cls, line):
+        m = cls._removal.match(line)
+        return f"no {m[0]}" if m else None
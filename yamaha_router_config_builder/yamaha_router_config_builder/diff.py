@@ -0,0 +1,188 @@
+"""
+ふたつの設定ファイルをコンテキスト (ブロック) 単位で比較する
+
+行をストリームとして読み、以下のブロックに振り分けてからブロックごとに差分を取る
+- `tunnel select N` 〜 `tunnel enable N` などのインタフェースブロック
+- `ip filter N ...` などのフィルタ定義 (フィルタ番号ごと)
+- `nat descriptor ... N ...` (NAT ディスクリプタ番号ごと、同じ番号の行が連続する範囲)
+- それ以外のグローバルな行 (1 行ずつ、行の内容をキーにする)
+
+どのブロックも読んだ時点で返し、両方のファイルで対になるブロックが出揃ったら差分を出して破棄するので、
+メモリに残るのは最大のブロックと、片方のファイルにしかまだ現れていないブロックだけになる
+グローバルな行は同じ内容の行同士を対にするので、追加・削除は検出するが、順序の入れ替わり (moved) は検出しない
+"""
+
+import re
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+from .types import ChangeType
+
+type BlockKey = tuple[str, ...]
+
+GLOBAL_BLOCK: BlockKey = ("global",)
+
+# 比較対象から除外する行 (パスワードは暗号化されて出力されることがあるため)
+DEFAULT_IGNORE = ("login password", "administrator password")
+
+_SELECT = re.compile(r"^(\S+) select (\d+)$")
+_ENABLE = re.compile(r"^(\S+) enable (\d+)$")
+_FILTER = re.compile(r"^(ip|ipv6) filter (?:(dynamic) )?(\d+) ")
+_NAT = re.compile(r"^nat descriptor \D*?(\d+)")
+
+
+class Change:
+    def __init__(self, block: BlockKey, type: ChangeType, line: str):
+        self.block = block
+        self.type = type
+        self.line = line
+
+    def __repr__(self) -> str:
+        return f"Change({self.block!r}, {self.type!r}, {self.line!r})"
+
+    def to_dict(self) -> dict[str, str]:
+        return {"block": " ".join(self.block), "type": self.type, "line": self.line}
+
+
+def parse_blocks(lines: Iterable[str], ignore: tuple[str, ...] = DEFAULT_IGNORE) -> Iterator[tuple[BlockKey, list[str]]]:
+    """
+    設定の行をブロックごとにまとめて、ブロックが閉じた時点で返す
+    グローバルな行は `("global", 行)` をキーとする 1 行のブロックとして返す
+    (同じ番号の NAT ディスクリプタの行が他の行を挟んで現れた場合は、別のブロックとして返す)
+    """
+    current: tuple[BlockKey, list[str]] | None = None
+    nat: tuple[BlockKey, list[str]] | None = None
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#") or line.startswith(ignore):
+            continue
+
+        nat_match = _NAT.match(line) if current is None else None
+        # 同じ番号の NAT ディスクリプタの行が途切れたら、そこまでを 1 つのブロックとして返す
+        if nat is not None and (nat_match is None or nat[0][1] != nat_match[1]):
+            yield nat
+            nat = None
+
+        if m := _SELECT.match(line):
+            if current is not None:
+                yield current
+            current = ((m[1], m[2]), [])
+            continue
+        if current is not None:
+            m = _ENABLE.match(line)
+            if m and current[0] == m.groups():
+                yield current
+                current = None
+            else:
+                current[1].append(line)
+            continue
+
+        if m := _FILTER.match(line):
+            yield ("filter", m[1], m[2] or "static", m[3]), [line]
+        elif nat_match is not None:
+            if nat is None:
+                nat = (("nat", nat_match[1]), [])
+            nat[1].append(line)
+        else:
+            yield (*GLOBAL_BLOCK, line), [line]
+
+    if current is not None:
+        yield current
+    if nat is not None:
+        yield nat
+
+
+def diff_block(key: BlockKey, old: list[str], new: list[str]) -> list[Change]:
+    """
+    ブロック内の差分を取る
+    重複行は出現回数ごとに別の行として扱い、両方に存在するが相対的な順序が変わった行は moved とする
+    (最長増加部分列で順序が保たれている行を求めるので O(n log n))
+    """
+
+    def keyed(lines: list[str]) -> dict[tuple[str, int], int]:
+        seen: dict[str, int] = {}
+        keys = {}
+        for pos, line in enumerate(lines):
+            n = seen[line] = seen.get(line, 0) + 1
+            keys[(line, n)] = pos
+        return keys
+
+    old_keys, new_keys = keyed(old), keyed(new)
+    common = [k for k in old_keys if k in new_keys]
+
+    # new 側の位置の最長増加部分列に含まれる行は順序が保たれている
+    positions = [new_keys[k] for k in common]
+    tails: list[int] = []
+    tails_idx: list[int] = []
+    prev = [-1] * len(positions)
+    for i, pos in enumerate(positions):
+        j = bisect_left(tails, pos)
+        if j == len(tails):
+            tails.append(pos)
+            tails_idx.append(i)
+        else:
+            tails[j] = pos
+            tails_idx[j] = i
+        prev[i] = tails_idx[j - 1] if j > 0 else -1
+    stable = set()
+    i = tails_idx[-1] if tails_idx else -1
+    while i >= 0:
+        stable.add(common[i])
+        i = prev[i]
+
+    changes = [Change(key, "removed", k[0]) for k in old_keys if k not in new_keys]
+    for k in new_keys:
+        if k not in old_keys:
+            changes.append(Change(key, "added", k[0]))
+        elif k not in stable:
+            changes.append(Change(key, "moved", k[0]))
+    return changes
+
+
+def diff(old: Iterable[str], new: Iterable[str], ignore: tuple[str, ...] = DEFAULT_IGNORE) -> Iterator[Change]:
+    """
+    ふたつの設定 (行のイテラブル) を比較して変更点を返す
+    同じキーのブロックが複数回現れる場合は、それぞれの設定で n 番目に現れたブロック同士を比較する
+    """
+    # ブロックのキー → 対になるブロックがまだ現れていないブロック (現れた順)
+    # 先に現れたものから対にするので、n 番目に現れたブロック同士が対になる
+    pending: tuple[dict[BlockKey, list[list[str]]], dict[BlockKey, list[list[str]]]] = ({}, {})
+    streams: list[Iterator[tuple[BlockKey, list[str]]] | None] = [parse_blocks(old, ignore), parse_blocks(new, ignore)]
+
+    # 両方のファイルから交互にブロックを読み、対になるブロックが揃ったら差分を出す
+    while streams[0] is not None or streams[1] is not None:
+        for side in (0, 1):
+            if streams[side] is None:
+                continue
+            try:
+                key, block = next(streams[side])
+            except StopIteration:
+                streams[side] = None
+                continue
+            waiting = pending[1 - side].get(key)
+            if waiting:
+                other = waiting.pop(0)
+                if not waiting:
+                    del pending[1 - side][key]
+                # 同じ内容のブロック (多くはこれ) は比較しない
+                if block != other:
+                    yield from diff_block(_report_key(key), *((block, other) if side == 0 else (other, block)))
+            else:
+                pending[side].setdefault(key, []).append(block)
+
+    for key, blocks in pending[0].items():
+        for block in blocks:
+            yield from diff_block(_report_key(key), block, [])
+    for key, blocks in pending[1].items():
+        for block in blocks:
+            yield from diff_block(_report_key(key), [], block)
+
+
+def _report_key(key: BlockKey) -> BlockKey:
+    """変更点に付けるブロックのキー (グローバルな行はまとめて GLOBAL_BLOCK とする)"""
+    return GLOBAL_BLOCK if key[0] == GLOBAL_BLOCK[0] else key
+
+
+def diff_files(old_path: str, new_path: str, ignore: tuple[str, ...] = DEFAULT_IGNORE) -> Iterator[Change]:
+    with open(old_path, "rt") as old, open(new_path, "rt") as new:
+        yield from diff(old, new, ignore)
@@ -0,0 +1,197 @@
+"""
+deploy のテスト・負荷試験用に、TFTP (RFC 1350) で書き込まれた設定を記録するだけのルーターの代わり
+
+ルーターと同様に `config/<管理パスワード>` というファイル名で書き込みを受け付ける
+最初の何回かの書き込み要求をエラーにする・パケットを一定の割合で落とす・応答を遅らせる、といった障害を再現できる
+最後の ACK が落ちた場合に備えて、転送が終わったセッションもしばらく覚えておき、最後のブロックの再送には ACK を返し直す (RFC 1350 の dally)
+
+usage: python -m yamaha_router_config_builder.fakerouter [--count N] [--port PORT] [--password PW]
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+
+from .deploy import ACK, BLOCK_SIZE, DATA, ERROR, RRQ, WRQ
+
+
+class Session:
+    """1 回の書き込み (TFTP の転送 1 回分)"""
+
+    def __init__(self, filename: str, peer: tuple):
+        self.filename = filename
+        self.peer = peer
+        self.block = 0
+        self.data = bytearray()
+        self.complete = False
+
+    @property
+    def lines(self) -> list[str]:
+        return self.data.decode().splitlines()
+
+
+class FakeRouter(asyncio.DatagramProtocol):
+    def __init__(
+        self,
+        password: str | None = None,
+        fail_first: int = 0,
+        drop_rate: float = 0.0,
+        delay: float = 0.0,
+        seed: int = 0,
+        dally: float = 5.0,
+    ):
+        """dally は転送が終わったセッションの最後のブロックの再送に ACK を返し直す期間 (秒)"""
+        self.password = password
+        self.fail_first = fail_first
+        self.drop_rate = drop_rate
+        self.delay = delay
+        self.dally = dally
+        self.random = random.Random(seed)
+        self.requests = 0
+        # 転送中のセッション (送信元アドレス → セッション) と、完了したセッション
+        self.active: dict[tuple, Session] = {}
+        self.sessions: list[Session] = []
+        # 転送が終わって dally 秒以内のセッション (送信元アドレス → セッション)
+        self.dallying: dict[tuple, Session] = {}
+        # 同時に転送中だったセッション数の最大値
+        self.max_active = 0
+        self.transport: asyncio.DatagramTransport | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeRouter":
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        return self
+
+    @property
+    def address(self) -> tuple[str, int]:
+        assert self.transport is not None
+        return self.transport.get_extra_info("sockname")[:2]
+
+    @property
+    def config(self) -> str | None:
+        """最後に書き込まれた設定"""
+        return self.sessions[-1].data.decode() if self.sessions else None
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            return
+        if self.delay:
+            asyncio.get_running_loop().call_later(self.delay, self.handle, data, addr)
+        else:
+            self.handle(data, addr)
+
+    def handle(self, data: bytes, addr: tuple):
+        if len(data) < 4:
+            return
+        (opcode,) = struct.unpack("!H", data[:2])
+        if opcode == WRQ:
+            self.write_request(data, addr)
+        elif opcode == DATA:
+            self.write_data(data, addr)
+        elif opcode == RRQ:
+            self.send_error(addr, 2, "Read is not supported")
+
+    def write_request(self, data: bytes, addr: tuple):
+        session = self.active.get(addr)
+        if session is not None and session.block == 0:
+            # 書き込み要求の再送には ACK を返し直す
+            self.send_ack(addr, 0)
+            return
+        # 同じ送信元からの次の転送が始まったので、前の転送の再送はもう届かない
+        self.dallying.pop(addr, None)
+        self.requests += 1
+        filename, mode = data[2:].split(b"\0")[:2]
+        if self.requests <= self.fail_first:
+            self.send_error(addr, 0, "Busy")
+            return
+        name, _, password = filename.decode().partition("/")
+        if name != "config" or mode.lower() != b"octet":
+            self.send_error(addr, 2, "Access violation")
+            return
+        if self.password is not None and password != self.password:
+            self.send_error(addr, 2, "Access violation")
+            return
+        self.active[addr] = Session(filename.decode(), addr)
+        self.max_active = max(self.max_active, len(self.active))
+        self.send_ack(addr, 0)
+
+    def write_data(self, data: bytes, addr: tuple):
+        (block,) = struct.unpack("!H", data[2:4])
+        session = self.active.get(addr)
+        if session is None:
+            session = self.dallying.get(addr)
+            if session is not None and block == session.block:
+                # 最後の ACK が届かずに再送された最後のブロック
+                self.send_ack(addr, block)
+            else:
+                self.send_error(addr, 5, "Unknown transfer ID")
+            return
+        if block == (session.block + 1) & 0xFFFF:
+            session.block = block
+            session.data += data[4:]
+            if len(data) - 4 < BLOCK_SIZE:
+                session.complete = True
+                self.sessions.append(self.active.pop(addr))
+                self.dallying[addr] = session
+                asyncio.get_running_loop().call_later(self.dally, self._forget, addr, session)
+        # 重複したブロックには ACK を返し直す
+        self.send_ack(addr, block)
+
+    def _forget(self, addr: tuple, session: Session):
+        # 同じ送信元から次の転送が終わっている場合は、そちらを残す
+        if self.dallying.get(addr) is session:
+            del self.dallying[addr]
+
+    def send_ack(self, addr: tuple, block: int):
+        assert self.transport is not None
+        self.transport.sendto(struct.pack("!HH", ACK, block), addr)
+
+    def send_error(self, addr: tuple, code: int, message: str):
+        assert self.transport is not None
+        self.transport.sendto(struct.pack("!HH", ERROR, code) + message.encode() + b"\0", addr)
+
+
+async def start_fake_routers(count: int, host: str = "127.0.0.1", **options) -> list[FakeRouter]:
+    """count 台分のルーターの代わりを、それぞれ空いているポートで起動する"""
+    return [await FakeRouter(**options).start(host) for _ in range(count)]
+
+
+async def serve(count: int, host: str, port: int, password: str | None):
+    routers = [await FakeRouter(password).start(host, port + i if port else 0) for i in range(count)]
+    for router in routers:
+        print(f"listening on {router.address[0]}:{router.address[1]}")
+    try:
+        while True:
+            await asyncio.sleep(1)
+            for router in routers:
+                for session in router.sessions:
+                    print(f"{router.address[1]}: received {len(session.data)} bytes ({len(session.lines)} lines)")
+                router.sessions.clear()
+    finally:
+        for router in routers:
+            router.close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Fake YAMAHA routers that accept configs over TFTP")
+    parser.add_argument("-n", "--count", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=6969, help="first port (0: ephemeral)")
+    parser.add_argument("--password")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.count, args.host, args.port, args.password))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
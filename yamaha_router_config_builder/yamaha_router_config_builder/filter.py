@@ -1,22 +1,143 @@
+import re
+from operator import itemgetter
+from typing import Iterable
+
 from .types import NetProtocol
-from .utils import uniq
 
 
 class Filter:
-    def __init__(self, protocol: NetProtocol, dynamic: bool, filter_num_base: int):
+    _removal = re.compile(r"^ip(v6)? filter (dynamic )?\d+")
+
+    def __init__(self, protocol: NetProtocol, dynamic: bool, filter_num_base: int, filter_num_size: int = 1000):
         self.protocol: NetProtocol = protocol
         self.dynamic = dynamic
         self.filter_num_base = filter_num_base
-        self.defs: list[str] = []
+        # フィルタ番号は filter_num_base から filter_num_size 個の範囲を使う
+        self.filter_num_size = filter_num_size
+        # フィルタ定義 → フィルタ番号 (dict は挿入順を保持するので、そのまま番号順になる)
+        self.index: dict[str, int] = {}
+        # index を他の Filter と共有しているか (共有している間は、新しい定義を追加する前にコピーする)
+        self.shared = False
+        # allocate() で番号を振り直したか (振り直した後は番号に空きがあるので、末尾の番号を使えない)
+        self.allocated = False
+        # allocate() の後に使える空き番号 (昇順、コピー同士で共有して変更しない) と、次に使う位置
+        self.free: list[int] = []
+        self.free_pos = 0
+        # index が番号順に並んでいるか (空き番号を使うと崩れることがある)
+        self.in_order = True
+
+    @property
+    def defs(self) -> list[str]:
+        return list(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, _def: str) -> bool:
+        return _def in self.index
+
+    def add(self, defs: Iterable[str]):
+        """未登録のフィルタ定義だけを末尾に追加する (追加分に比例した時間で済む)"""
+        if self.allocated:
+            self._add_allocated(defs)
+            return
+        index = self.index
+        for _def in defs:
+            if _def not in index:
+                if self.shared:
+                    index = self.index = dict(index)
+                    self.shared = False
+                index[_def] = self.filter_num_base + len(index)
+
+    def _add_allocated(self, defs: Iterable[str]):
+        """allocate() の後に追加された定義には、空いている番号を小さい方から割り当てる"""
+        index = self.index
+        for _def in defs:
+            if _def not in index:
+                if self.free_pos >= len(self.free):
+                    raise self._overflow_error()
+                if self.shared:
+                    index = self.index = dict(index)
+                    self.shared = False
+                num = self.free[self.free_pos]
+                self.free_pos += 1
+                if index and num < next(reversed(index.values())):
+                    self.in_order = False
+                index[_def] = num
 
-    def add(self, defs: list[str]):
-        self.defs = uniq(self.defs + defs)
+    def _overflow_error(self) -> ValueError:
+        return ValueError(
+            f"{self.protocol} filter{' dynamic' if self.dynamic else ''} exceeds "
+            f"{self.filter_num_size} numbers from {self.filter_num_base}"
+        )
+
+    def copy(self) -> "Filter":
+        """
+        定義テーブルを共有するコピー
+        どちらかに新しい定義を追加するときに、追加する側がテーブルをコピーする (共有している定義の番号は変わらない)
+        """
+        filter = Filter(self.protocol, self.dynamic, self.filter_num_base, self.filter_num_size)
+        filter.index = self.index
+        filter.shared = self.shared = True
+        filter.allocated = self.allocated
+        filter.free = self.free
+        filter.free_pos = self.free_pos
+        filter.in_order = self.in_order
+        return filter
+
+    def number(self, _def: str) -> int:
+        return self.index[_def]
+
+    def items(self) -> Iterable[tuple[str, int]]:
+        """(フィルタ定義, フィルタ番号) を番号順に返す"""
+        if self.in_order:
+            return self.index.items()
+        return sorted(self.index.items(), key=itemgetter(1))
+
+    def overflowed(self) -> bool:
+        return len(self.index) > self.filter_num_size
+
+    def allocate(self, lock: dict[str, int]) -> dict[str, int]:
+        """
+        ロックファイルに記録されたフィルタ番号を使って番号を振り直す
+        記録済みの定義は同じ番号を使い、新しい定義には空いている番号を小さい方から割り当てる
+        (使われなくなった定義の番号は空き番号として再利用される)
+        振り直した後のテーブル (定義 → 番号) を返すので、これを次回のロックとして保存する
+        """
+        base, end = self.filter_num_base, self.filter_num_base + self.filter_num_size
+        numbers: dict[str, int] = {}
+        for _def in self.index:
+            num = lock.get(_def)
+            if num is not None and base <= num < end:
+                numbers[_def] = num
+        used = set(numbers.values())
+        free = (num for num in range(base, end) if num not in used)
+        for _def in self.index:
+            if _def not in numbers:
+                num = next(free, None)
+                if num is None:
+                    raise self._overflow_error()
+                numbers[_def] = num
+        self.index = dict(sorted(numbers.items(), key=itemgetter(1)))
+        self.shared = False
+        self.allocated = True
+        self.free = list(free)
+        self.free_pos = 0
+        self.in_order = True
+        return dict(self.index)
 
     def build_table(self) -> dict[str, str]:
-        return {_def: str(self.filter_num_base + idx) for idx, _def in enumerate(self.defs)}
+        return {_def: str(num) for _def, num in self.items()}
+
+    def build_commands(self, table: dict[str, str] | None = None) -> list[str]:
+        """table には build_table() で確定済みのテーブルを渡せる (省略時はその場で作る)"""
+        prefix = f"{self.protocol} filter{' dynamic' if self.dynamic else ''} "
+        if table is None:
+            table = self.build_table()
+        return [prefix + num + " " + _def for _def, num in table.items()]
 
-    def build_commands(self) -> list[str]:
-        return [
-            f"{self.protocol} filter{' dynamic' if self.dynamic else ''} {num} {_def}"
-            for _def, num in self.build_table().items()
-        ]
+    @classmethod
+    def removal(cls, line: str) -> str | None:
+        """build_commands() が出力した行を取り消す `no` コマンドを返す"""
+        m = cls._removal.match(line)
+        return f"no {m[0]}" if m else None
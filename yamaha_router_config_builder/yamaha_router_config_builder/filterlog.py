@@ -0,0 +1,138 @@
+"""
+ルーターの syslog からフィルタのログ (`syslog notice on` で出力される) を集計し、フィルタ定義と対応付ける
+
+    LAN1 Rejected at IN(1001) filter: TCP 192.0.2.1:12345 > 192.168.57.2:445
+
+ファイルは mmap して一定サイズの区間ごとに正規表現で走査するので、ファイルサイズによらずメモリ使用量は一定になる
+jobs を指定すると、行の境界で区切った区間を複数プロセスで並列に集計する
+
+usage: python -m yamaha_router_config_builder.filterlog <syslog> [--config config.txt] [--jobs N] [--json]
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+# (インタフェース, 方向, 動作, フィルタ番号)
+type HitKey = tuple[str, str, str, int]
+
+# 正規表現をリテラルで始めると高速に検索できるので、インタフェース名と動作はマッチした位置から遡って取り出す
+_FILTER_LOG = re.compile(rb" at (IN|OUT)\((\d+)\) filter")
+_ACTIONS = (b"Rejected", b"Passed")
+_FILTER_DEF = re.compile(r"^(ip|ipv6) filter (?:dynamic )?(\d+) (.*)$")
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def count_hits_in_range(path: str, start: int, end: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Counter[HitKey]:
+    """ファイルの [start, end) の区間 (行の境界で区切られていること) に含まれるフィルタのログを数える"""
+    raw: Counter[tuple[bytes, bytes, bytes, bytes]] = Counter()
+    if start >= end:
+        return Counter()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            # 区間の途中で行が切れないように、chunk_size の先にある改行まで読む
+            stop = min(end, pos + chunk_size)
+            if stop < end:
+                newline = mm.find(b"\n", stop, end)
+                stop = end if newline < 0 else newline + 1
+            for m in _FILTER_LOG.finditer(mm, pos, stop):
+                line_start = max(pos, mm.rfind(b"\n", pos, m.start()) + 1)
+                words = mm[line_start : m.start()].rsplit(None, 2)
+                if len(words) >= 2 and words[-1] in _ACTIONS:
+                    raw[(words[-2], m[1], words[-1], m[2])] += 1
+            pos = stop
+    counts: Counter[HitKey] = Counter()
+    for (interface, direction, action, number), hits in raw.items():
+        counts[(interface.decode(), direction.decode().lower(), action.decode().lower(), int(number))] += hits
+    return counts
+
+
+def split_ranges(path: str, n: int) -> list[tuple[int, int]]:
+    """ファイルを行の境界でおよそ n 等分する"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, n):
+            newline = mm.find(b"\n", max(bounds[-1], size * i // n))
+            if newline < 0:
+                break
+            bounds.append(newline + 1)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def count_hits(path: str, jobs: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Counter[HitKey]:
+    """syslog ファイルに含まれるフィルタのログをインタフェース・方向・動作・フィルタ番号ごとに数える"""
+    ranges = split_ranges(path, max(jobs, 1))
+    if jobs <= 1 or len(ranges) <= 1:
+        return sum((count_hits_in_range(path, start, end, chunk_size) for start, end in ranges), Counter())
+    counts: Counter[HitKey] = Counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(count_hits_in_range, path, start, end, chunk_size) for start, end in ranges]
+        for future in futures:
+            counts.update(future.result())
+    return counts
+
+
+def builder_definitions(builder: "YamahaRouterConfigBuilder") -> dict[int, str]:
+    """フィルタ番号 → フィルタ定義の対応をビルダーのフィルタテーブルから作る"""
+    return {int(num): _def for table in builder.compile_filters().values() for _def, num in table.items()}
+
+
+def config_definitions(lines: Iterable[str]) -> dict[int, str]:
+    """フィルタ番号 → フィルタ定義の対応をビルド済みの設定 (`ip filter N ...` の行) から作る"""
+    return {int(m[2]): m[3] for line in lines if (m := _FILTER_DEF.match(line.strip()))}
+
+
+def report(counts: Counter[HitKey], definitions: dict[int, str]) -> list[dict]:
+    """ヒット数の多い順に、フィルタ定義を付けて返す"""
+    return [
+        {
+            "interface": interface,
+            "direction": direction,
+            "action": action,
+            "filter": number,
+            "definition": definitions.get(number),
+            "hits": hits,
+        }
+        for (interface, direction, action, number), hits in counts.most_common()
+    ]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Count IP filter hits in YAMAHA router syslog")
+    parser.add_argument("syslog")
+    parser.add_argument("-c", "--config", help="built config file to resolve filter definitions")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    definitions = {}
+    if args.config:
+        with open(args.config, "rt") as f:
+            definitions = config_definitions(f)
+    rows = report(count_hits(args.syslog, args.jobs), definitions)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    for row in rows:
+        print(
+            f"{row['hits']:>10} {row['interface']} {row['direction']} {row['action']} "
+            f"{row['filter']} {row['definition'] or ''}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+複数台のルーターの設定をプロセスプールで並列にビルドする
+
+usage: python -m yamaha_router_config_builder.fleet <module>:<DEVICES> [--jobs N] [--output-dir DIR]
+"""
+
+import argparse
+import importlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Mapping
+
+from .builder import YamahaRouterConfigBuilder
+
+# プロファイルはビルダーと環境変数 (シークレット) を受け取ってコマンドを追加する関数
+# ProcessPoolExecutor で子プロセスに渡すため、モジュールのトップレベルで定義されている必要がある
+type Profile = Callable[[YamahaRouterConfigBuilder, Mapping[str, str]], None]
+
+# (共通部分のプロファイル, 機種, バージョン, 環境変数) → 凍結したビルダー
+# 共通部分は build_fleet() 1 回につきプロセスごとに 1 回だけ実行し、各デバイスのビルダーはそこから derive() する
+# 環境変数 (シークレット) を含むので、build_fleet() が終わったら捨てる (モジュールのグローバル変数には置かない)
+type Bases = dict[tuple, YamahaRouterConfigBuilder]
+
+
+def base_builder(
+    profile: Profile, model: str | None, version: str | None, env: Mapping[str, str], bases: Bases
+) -> YamahaRouterConfigBuilder:
+    """共通部分のビルダーを bases から取り出す (なければ実行して bases に入れる)"""
+    key = (profile, model, version, tuple(sorted(env.items())))
+    if key not in bases:
+        config = YamahaRouterConfigBuilder(model, version)
+        profile(config, env)
+        bases[key] = config.freeze()
+    return bases[key]
+
+
+class Device:
+    def __init__(
+        self,
+        name: str,
+        profile: Profile,
+        model: str | None = None,
+        version: str | None = None,
+        env: Mapping[str, str] | None = None,
+        base: Profile | None = None,
+        base_env: Mapping[str, str] | None = None,
+    ):
+        self.name = name
+        self.profile = profile
+        self.model = model
+        self.version = version
+        self.env = dict(env or {})
+        # 複数のデバイスで共通の部分 (base の出力の後に profile の出力が続く)
+        # base には env ではなく、同じ base を使うデバイス間で共通の base_env を渡す
+        self.base = base
+        self.base_env = dict(base_env or {})
+
+    def builder(self, bases: Bases | None = None) -> YamahaRouterConfigBuilder:
+        """bases を渡すと、同じ bases を渡したデバイス間で共通部分のビルダーを共有する"""
+        if self.base is None:
+            config = YamahaRouterConfigBuilder(self.model, self.version)
+        else:
+            config = base_builder(self.base, self.model, self.version, self.base_env, {} if bases is None else bases)
+            config = config.derive()
+        self.profile(config, self.env)
+        return config
+
+
+class BuildResult:
+    def __init__(self, name: str, path: str, seconds: float):
+        self.name = name
+        self.path = path
+        self.seconds = seconds
+
+
+def build_device(device: Device, output_dir: str, bases: Bases | None = None) -> BuildResult:
+    """1 台分の設定をビルドしてファイルに書き出す"""
+    start = time.perf_counter()
+    path = os.path.join(output_dir, f"{device.name}.txt")
+    with open(path, "wt") as f:
+        device.builder(bases).build_to(f)
+        f.write("\n")
+    return BuildResult(device.name, path, time.perf_counter() - start)
+
+
+# build_fleet() が起動した子プロセスの中で共有する共通部分のビルダー (子プロセスとともに破棄される)
+_worker_bases: Bases = {}
+
+
+def _init_worker():
+    _worker_bases.clear()
+
+
+def _build_in_worker(device: Device, output_dir: str) -> BuildResult:
+    return build_device(device, output_dir, _worker_bases)
+
+
+def build_fleet(devices: list[Device], output_dir: str, jobs: int = 1) -> list[BuildResult]:
+    """
+    全台の設定をビルドする
+    各デバイスは独立したビルダーで組み立てるので、出力内容も結果の順序も jobs の値に依存しない
+    """
+    names = [device.name for device in devices]
+    if len(set(names)) != len(names):
+        raise ValueError("Device names must be unique")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if jobs <= 1:
+        bases: Bases = {}
+        return [build_device(device, output_dir, bases) for device in devices]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as executor:
+        return list(executor.map(_build_in_worker, devices, [output_dir] * len(devices)))
+
+
+def load_devices(target: str) -> list[Device]:
+    """`package.module:ATTR` 形式で指定されたデバイス定義のリストを読み込む"""
+    module_name, _, attr = target.partition(":")
+    return list(getattr(importlib.import_module(module_name), attr or "DEVICES"))
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Build YAMAHA router configs for many devices in parallel")
+    parser.add_argument("devices", help="device definitions as `module:ATTR` (default ATTR: DEVICES)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-o", "--output-dir", default="configs")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = build_fleet(load_devices(args.devices), args.output_dir, args.jobs)
+    for result in results:
+        print(f"{result.name}\t{result.seconds * 1000:.1f} ms\t{result.path}")
+    print(f"{len(results)} devices in {time.perf_counter() - start:.2f} s (jobs={args.jobs})")
+
+
+if __name__ == "__main__":
+    main()
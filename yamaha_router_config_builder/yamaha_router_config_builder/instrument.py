@@ -0,0 +1,178 @@
+"""
+ビルドの計測 (section() ごとの所要時間、コマンド種別ごとの数、フィルタテーブルのサイズ、build() のフェーズごとの所要時間)
+
+YamahaRouterConfigBuilder(instrument=Instrumentation()) のように渡したときだけ計測する
+渡さなければ section() / build() は計測のコードを一切通らない
+
+計測区間の種類 (kind) は次の 4 つ
+- section: section() の中でコマンドを追加している間 (プロファイルの実行)
+- build: build() 全体
+- phase: build() のフェーズ (filters / nat / commands)
+- render: build() で (最も外側の) セクションを出力している間
+"""
+
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Iterator
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+# 計測区間が終わるたびに (kind, name, 秒数) で呼ばれる
+# start(kind, name) メソッドを持っていれば、計測区間の開始時にも呼ばれる
+# to_dict() メソッドを持っていれば、その結果がレポートの hooks に入る
+type Hook = Callable[[str, str, float], None]
+
+
+class Instrumentation:
+    hooks: list[Hook]
+    # 終わった順の (kind, name, 秒数)
+    spans: list[tuple[str, str, float]]
+
+    def __init__(self, hooks: list[Hook] | None = None):
+        self.hooks = list(hooks or [])
+        self.spans = []
+
+    @contextmanager
+    def span(self, kind: str, name: str) -> Iterator[None]:
+        for hook in self.hooks:
+            start = getattr(hook, "start", None)
+            if start is not None:
+                start(kind, name)
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t
+            self.spans.append((kind, name, seconds))
+            for hook in reversed(self.hooks):
+                hook(kind, name, seconds)
+
+    def totals(self, kind: str) -> dict[str, float]:
+        """計測区間の名前ごとの合計秒数 (最初に終わった順)"""
+        totals: dict[str, float] = {}
+        for _kind, name, seconds in self.spans:
+            if _kind == kind:
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def report(self, builder: "YamahaRouterConfigBuilder") -> dict[str, Any]:
+        """計測結果 (JSON にそのまま変換できる dict)"""
+        build = self.totals("build")
+        sections = self.totals("section")
+        renders = self.totals("render")
+        commands: dict[str, int] = {}
+        for section in sorted(builder.sections, key=lambda section: section.start):
+            commands[section.title] = commands.get(section.title, 0) + section.end - section.start
+        return {
+            "device": builder.device,
+            "build_seconds": build.get("build"),
+            "phases": self.totals("phase"),
+            "sections": [
+                {
+                    "title": title,
+                    "seconds": sections.get(title),
+                    "render_seconds": renders.get(title),
+                    "commands": count,
+                }
+                for title, count in commands.items()
+            ],
+            "commands": dict(Counter(type(command).__name__ for command in builder.commands).most_common()),
+            "filters": {
+                name: {"size": len(filter), "capacity": filter.filter_num_size, "overflowed": filter.overflowed()}
+                for name, filter in builder.filters.items()
+            },
+            "hooks": {
+                type(hook).__name__: hook.to_dict() for hook in self.hooks if hasattr(hook, "to_dict")  # type: ignore
+            },
+        }
+
+    def to_json(self, builder: "YamahaRouterConfigBuilder", indent: int | None = 2) -> str:
+        return json.dumps(self.report(builder), ensure_ascii=False, indent=indent)
+
+
+class ProfileHook:
+    """kinds に含まれる計測区間の間だけ cProfile でプロファイルを取る"""
+
+    def __init__(self, kinds: tuple[str, ...] = ("build",), limit: int = 20):
+        self.kinds = kinds
+        self.limit = limit
+        self.profile = cProfile.Profile()
+        # 計測区間が入れ子になった場合は最も外側の区間だけを有効にする
+        self.depth = 0
+
+    def start(self, kind: str, name: str):
+        if kind in self.kinds:
+            if self.depth == 0:
+                self.profile.enable()
+            self.depth += 1
+
+    def __call__(self, kind: str, name: str, seconds: float):
+        if kind in self.kinds:
+            self.depth -= 1
+            if self.depth == 0:
+                self.profile.disable()
+
+    def stats(self) -> pstats.Stats:
+        return pstats.Stats(self.profile)
+
+    def to_dict(self) -> list[dict[str, Any]]:
+        """累積時間の長い順に limit 個の関数"""
+        stats = self.stats().stats  # type: ignore
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[: self.limit]
+        return [
+            {
+                "function": f"{file}:{line}({function})",
+                "calls": calls,
+                "seconds": round(tottime, 6),
+                "cumulative_seconds": round(cumtime, 6),
+            }
+            for (file, line, function), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+
+class TracemallocHook:
+    """kinds に含まれる計測区間ごとのメモリ使用量のピーク (区間の開始時点からの増分, bytes)"""
+
+    def __init__(self, kinds: tuple[str, ...] = ("section", "phase")):
+        self.kinds = kinds
+        self.peaks: dict[str, int] = {}
+        # 計測中の区間ごとの [開始時点の使用量, 入れ子の区間で観測したピーク]
+        self.stack: list[list[int]] = []
+        # tracemalloc をこのフックが開始した場合は最後の区間が終わったら止める
+        self.owner = False
+
+    def start(self, kind: str, name: str):
+        if kind not in self.kinds:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.owner = True
+        current, peak = tracemalloc.get_traced_memory()
+        # reset_peak() で外側の区間のピークが消えないように、ここまでのピークを外側の区間に記録しておく
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self.stack.append([current, current])
+
+    def __call__(self, kind: str, name: str, seconds: float):
+        if kind not in self.kinds:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        start, nested = self.stack.pop()
+        peak = max(peak, nested)
+        key = f"{kind}:{name}"
+        self.peaks[key] = max(self.peaks.get(key, 0), peak - start)
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        elif self.owner:
+            tracemalloc.stop()
+            self.owner = False
+
+    def to_dict(self) -> dict[str, int]:
+        return dict(self.peaks)
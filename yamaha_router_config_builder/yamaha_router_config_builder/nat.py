@@ -1,8 +1,27 @@
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+
 class Nat:
-    def __init__(self, descriptor: int, type: str):
+    def __init__(self, descriptor: int, type: str, owner: "YamahaRouterConfigBuilder | None" = None):
         self.descriptor = descriptor
         self.type = type
         self.commands: list[str] = [f"nat descriptor type {descriptor} {type}"]
+        # この NAT ディスクリプタを追加したビルダー (凍結した後はコマンドを追加できない)
+        self.owner = owner
 
     def add(self, command: str):
+        if self.owner is not None:
+            self.owner._check_frozen()
         self.commands.append(command)
+
+    # type は同じディスクリプタ番号に対して 1 つしか設定できないので、番号までが同じ行は上書きされる
+    _removal = re.compile(r"^nat descriptor type \d+")
+
+    @classmethod
+    def removal(cls, line: str) -> str | None:
+        m = cls._removal.match(line)
+        return f"no {m[0]}" if m else None
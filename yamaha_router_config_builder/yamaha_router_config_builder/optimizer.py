@@ -0,0 +1,254 @@
+"""
+インタフェースに適用する静的フィルタのリストから冗長なルールを取り除く
+
+ルーターはパケットごとにフィルタを先頭から順に評価するので、ルールが減ればその分だけ評価が速くなる
+以下の変換はいずれもフィルタの評価結果を変えない
+1. それより前のルール (の和集合) に完全に含まれていて、決してマッチしないルールを削除する
+2. 同じ動作 (pass/reject) のルールが連続している区間では順序が評価結果に影響しないので、
+   - 同じ区間の他のルールに完全に含まれているルールを削除する
+   - 1 つの条件以外が同じルール同士の、アドレス範囲やポート範囲をまとめる
+解釈できないフィルタ定義はそのまま残し、その前後のルールを入れ替えたりまとめたりはしない
+"""
+
+from bisect import bisect_right
+from itertools import product
+from typing import TYPE_CHECKING
+
+from .command import FilterCommand, RouteCommand
+from .policy import (
+    ADDRESS_MAX,
+    ALL_PORTS,
+    FilterRule,
+    Interval,
+    contains_intervals,
+    format_address,
+    format_ports,
+    format_protocols,
+    merge_intervals,
+    parse_rule,
+)
+from .types import Direction, NetProtocol
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+# ポートのリストに指定できる個数の上限
+MAX_PORTS = 10
+
+
+class IntervalSet:
+    """互いに素な区間をソートして持つ集合"""
+
+    def __init__(self):
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+
+    def add(self, lo: int, hi: int):
+        i = bisect_right(self.starts, lo)
+        # 左隣の区間と重なる (または接する) ならそこから統合する
+        if i > 0 and self.ends[i - 1] + 1 >= lo:
+            i -= 1
+            lo = self.starts[i]
+        j = i
+        while j < len(self.starts) and self.starts[j] <= hi + 1:
+            hi = max(hi, self.ends[j])
+            j += 1
+        self.starts[i:j] = [lo]
+        self.ends[i:j] = [hi]
+
+    def contains(self, lo: int, hi: int) -> bool:
+        i = bisect_right(self.starts, lo) - 1
+        return i >= 0 and self.ends[i] >= hi
+
+
+class CoverageIndex:
+    """
+    ルールの集合がマッチする範囲
+    送信元アドレス以外の条件ごとに送信元アドレスの和集合を持ち、その条件を含む条件の和集合に含まれるかを調べる
+    宛先アドレスは種類が多くなりやすいので、同じかワイルドカードのものだけを候補にする
+    プロトコルとポートも、出現した種類が MAX_CANDIDATES を超えたら同じかワイルドカードのものだけを候補にする
+    (それ以外の組み合わせで覆われている場合は見逃すが、誤って含まれると判定することはない)
+    """
+
+    MAX_CANDIDATES = 16
+
+    def __init__(self, protocol: NetProtocol):
+        self.any_address: Interval = (0, ADDRESS_MAX[protocol])
+        self.sets: dict[tuple, IntervalSet] = {}
+        self.protocols: set[frozenset[int] | None] = set()
+        self.sports: set[tuple[Interval, ...]] = set()
+        self.dports: set[tuple[Interval, ...]] = set()
+
+    def add(self, rule: FilterRule):
+        key = (rule.dst, rule.protocols, rule.sport, rule.dport)
+        self.sets.setdefault(key, IntervalSet()).add(*rule.src)
+        self.protocols.add(rule.protocols)
+        self.sports.add(rule.sport)
+        self.dports.add(rule.dport)
+
+    def covers(self, rule: FilterRule) -> bool:
+        for key in product(
+            {rule.dst, self.any_address},
+            self._candidates(self.protocols, rule.protocols, None, _contains_protocols),
+            self._candidates(self.sports, rule.sport, (ALL_PORTS,), contains_intervals),
+            self._candidates(self.dports, rule.dport, (ALL_PORTS,), contains_intervals),
+        ):
+            if key in self.sets and self.sets[key].contains(*rule.src):
+                return True
+        return False
+
+    def _candidates(self, seen: set, value, wildcard, contains) -> list:
+        if len(seen) > self.MAX_CANDIDATES:
+            return [v for v in {value, wildcard} if v in seen]
+        return [v for v in seen if contains(v, value)]
+
+
+def _contains_protocols(outer: frozenset[int] | None, inner: frozenset[int] | None) -> bool:
+    return outer is None or (inner is not None and inner <= outer)
+
+
+class FilterOptimization:
+    def __init__(self, protocol: NetProtocol, interface: str, direction: Direction, before: list[str], after: list[str]):
+        self.protocol: NetProtocol = protocol
+        self.interface = interface
+        self.direction = direction
+        self.before = before
+        self.after = after
+
+    @property
+    def removed(self) -> int:
+        return len(self.before) - len(self.after)
+
+    def to_dict(self) -> dict:
+        return {
+            "protocol": self.protocol,
+            "interface": self.interface,
+            "direction": self.direction,
+            "before": len(self.before),
+            "after": len(self.after),
+            "removed": self.removed,
+        }
+
+
+def optimize_rules(protocol: NetProtocol, defs: list[str]) -> list[str]:
+    """フィルタ定義のリストを評価結果が変わらない範囲で短くする"""
+    # 1. それより前のルールで覆われているルールを削除する
+    index = CoverageIndex(protocol)
+    kept: list[tuple[str, FilterRule | None]] = []
+    for _def in defs:
+        rule = parse_rule(protocol, _def)
+        if rule is not None:
+            if index.covers(rule):
+                continue
+            index.add(rule)
+        kept.append((_def, rule))
+
+    # 2. 同じ動作のルールが連続する区間ごとにまとめる
+    result: list[str] = []
+    run: list[FilterRule] = []
+    for _def, rule in kept:
+        if rule is None or (run and run[0].action != rule.action):
+            result += optimize_run(protocol, run)
+            run = []
+        if rule is None:
+            result.append(_def)
+        else:
+            run.append(rule)
+    result += optimize_run(protocol, run)
+    return result
+
+
+def optimize_run(protocol: NetProtocol, rules: list[FilterRule]) -> list[str]:
+    """同じ動作のルールの並び (順序を入れ替えても評価結果が変わらない) を短くする"""
+    if len(rules) <= 1:
+        return [rule.definition for rule in rules]
+    positions = {id(rule): pos for pos, rule in enumerate(rules)}
+
+    # 範囲の広いルールから順に見ていき、それまでのルールに覆われているものを削除する
+    # (あるルールが別のルールを含むなら、含む側の方が必ず先に来る順序にする)
+    def width(rule: FilterRule) -> tuple:
+        return (
+            rule.protocols is None,
+            len(rule.protocols or ()),
+            rule.src[1] - rule.src[0] + rule.dst[1] - rule.dst[0],
+            sum(hi - lo for lo, hi in rule.sport + rule.dport),
+        )
+
+    index = CoverageIndex(protocol)
+    survivors = []
+    for rule in sorted(rules, key=width, reverse=True):
+        if not index.covers(rule):
+            index.add(rule)
+            survivors.append(rule)
+
+    # 1 つの条件以外が同じルールの範囲をまとめる
+    for field in ("src", "dst", "sport", "dport"):
+        survivors = _merge(protocol, survivors, field, positions)
+
+    survivors.sort(key=lambda rule: positions[id(rule)])
+    return [rule.definition for rule in survivors]
+
+
+def _merge(protocol: NetProtocol, rules: list[FilterRule], field: str, positions: dict[int, int]) -> list[FilterRule]:
+    others = [f for f in ("src", "dst", "protocols", "sport", "dport") if f != field]
+    groups: dict[tuple, list[FilterRule]] = {}
+    for rule in rules:
+        groups.setdefault(tuple(getattr(rule, f) for f in others), []).append(rule)
+
+    result = []
+    for group in groups.values():
+        if len(group) == 1:
+            result += group
+            continue
+        if field in ("src", "dst"):
+            merged = [(interval,) for interval in merge_intervals([getattr(rule, field) for rule in group])]
+        else:
+            intervals = merge_intervals([interval for rule in group for interval in getattr(rule, field)])
+            merged = [intervals[i : i + MAX_PORTS] for i in range(0, len(intervals), MAX_PORTS)]
+        if len(merged) >= len(group):
+            result += group
+            continue
+        position = min(positions[id(rule)] for rule in group)
+        for value in merged:
+            fields = {f: getattr(group[0], f) for f in others}
+            fields[field] = value[0] if field in ("src", "dst") else value
+            rule = FilterRule("", group[0].action, **fields)
+            rule.definition = " ".join(
+                [
+                    rule.action,
+                    format_address(protocol, rule.src),
+                    format_address(protocol, rule.dst),
+                    format_protocols(rule.protocols),
+                    format_ports(rule.sport),
+                    format_ports(rule.dport),
+                ]
+            )
+            positions[id(rule)] = position
+            result.append(rule)
+    return result
+
+
+def optimize_filters(builder: "YamahaRouterConfigBuilder") -> list[FilterOptimization]:
+    """
+    ビルダーのすべての secure filter の静的フィルタを最適化し、フィルタテーブルを作り直す
+    フィルタ番号が変わるので、lock_filters() やビルドより前に呼ぶ
+    """
+    results = []
+    for command in builder.commands:
+        if isinstance(command, FilterCommand) and command.static_filters:
+            after = optimize_rules(command.protocol, command.static_filters)
+            results.append(
+                FilterOptimization(command.protocol, command.interface, command.direction, command.static_filters, after)
+            )
+            command.static_filters = tuple(after)
+
+    # 使われなくなった定義を除くため、静的フィルタのテーブルを登録順に作り直す
+    for name in ("ip_filter", "ipv6_filter"):
+        builder.filters[name].index = {}
+    for command in builder.commands:
+        if isinstance(command, FilterCommand):
+            builder.filters[command.static_table].add(command.static_filters)
+        elif isinstance(command, RouteCommand):
+            for gateway in command.gateways:
+                builder.filters[gateway.table].add(gateway.filters)
+    return results
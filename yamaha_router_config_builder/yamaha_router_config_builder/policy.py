@@ -0,0 +1,241 @@
+"""
+静的フィルタ定義 (`pass/reject 送信元 宛先 プロトコル 送信元ポート 宛先ポート`) のパーサ
+http://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ip/ip_filter.html
+
+アドレスやポートは閉区間 (lo, hi) のタプルとして扱う
+解釈できない定義 (ホスト名やプレフィックス名を使ったもの、TCP フラグ指定など) は parse_rule() が None を返すので、
+呼び出し側ではその定義が何にマッチするかわからないものとして扱うこと
+"""
+
+import ipaddress
+
+from .types import NetProtocol
+
+type Interval = tuple[int, int]
+
+PROTOCOL_NUMBERS = {
+    "icmp": 1,
+    "tcp": 6,
+    "udp": 17,
+    "gre": 47,
+    "esp": 50,
+    "ah": 51,
+    "icmp6": 58,
+}
+
+# ポート番号のニーモニック
+PORT_NUMBERS = {
+    "ftpdata": 20,
+    "ftp": 21,
+    "ssh": 22,
+    "telnet": 23,
+    "smtp": 25,
+    "domain": 53,
+    "bootps": 67,
+    "bootpc": 68,
+    "tftp": 69,
+    "www": 80,
+    "pop3": 110,
+    "sunrpc": 111,
+    "ident": 113,
+    "ntp": 123,
+    "nntp": 119,
+    "netbios_ns": 137,
+    "netbios_dgm": 138,
+    "netbios_ssn": 139,
+    "imap": 143,
+    "snmp": 161,
+    "snmptrap": 162,
+    "bgp": 179,
+    "https": 443,
+    "submission": 587,
+    "imaps": 993,
+    "pop3s": 995,
+    "pptp": 1723,
+}
+
+ALL_PORTS: Interval = (0, 0xFFFF)
+
+ADDRESS_MAX = {"ip": 0xFFFFFFFF, "ipv6": (1 << 128) - 1}
+
+# ポート番号を指定できるプロトコル
+PORT_PROTOCOLS = frozenset([PROTOCOL_NUMBERS["tcp"], PROTOCOL_NUMBERS["udp"]])
+
+
+class FilterRule:
+    """
+    パース済みのフィルタ定義
+    protocols が None の場合はすべてのプロトコルにマッチする
+    """
+
+    def __init__(
+        self,
+        definition: str,
+        action: str,
+        src: Interval,
+        dst: Interval,
+        protocols: frozenset[int] | None,
+        sport: tuple[Interval, ...],
+        dport: tuple[Interval, ...],
+    ):
+        self.definition = definition
+        self.action = action
+        self.src = src
+        self.dst = dst
+        self.protocols = protocols
+        self.sport = sport
+        self.dport = dport
+
+    def __repr__(self) -> str:
+        return f"FilterRule({self.definition!r})"
+
+    @property
+    def passes(self) -> bool:
+        return self.action.startswith("pass")
+
+    def covers(self, other: "FilterRule") -> bool:
+        """other にマッチするパケットがすべてこのルールにもマッチするか"""
+        return (
+            contains_intervals([self.src], [other.src])
+            and contains_intervals([self.dst], [other.dst])
+            and (self.protocols is None or (other.protocols is not None and other.protocols <= self.protocols))
+            and contains_intervals(self.sport, other.sport)
+            and contains_intervals(self.dport, other.dport)
+        )
+
+    def overlaps(self, other: "FilterRule") -> bool:
+        """このルールと other の両方にマッチするパケットが存在しうるか"""
+        # アドレスは 1 つの区間なので、区間のリストを作らずに比べる
+        return (
+            self.src[0] <= other.src[1]
+            and other.src[0] <= self.src[1]
+            and self.dst[0] <= other.dst[1]
+            and other.dst[0] <= self.dst[1]
+            and (self.protocols is None or other.protocols is None or not self.protocols.isdisjoint(other.protocols))
+            and intersects_intervals(self.sport, other.sport)
+            and intersects_intervals(self.dport, other.dport)
+        )
+
+
+def parse_rule(protocol: NetProtocol, definition: str) -> FilterRule | None:
+    """静的フィルタ定義をパースする (解釈できなければ None を返す)"""
+    words = definition.split()
+    if not 1 <= len(words) <= 6:
+        return None
+    words += ["*"] * (6 - len(words))
+    action, src, dst, proto, sport, dport = words
+    if not (action.startswith("pass") or action.startswith("reject")):
+        return None
+    try:
+        src_interval = parse_address(protocol, src)
+        dst_interval = parse_address(protocol, dst)
+        protocols = parse_protocols(proto)
+        sports = parse_ports(sport)
+        dports = parse_ports(dport)
+    except ValueError:
+        return None
+    # TCP/UDP 以外のプロトコルにポート番号を指定した場合の挙動は扱わない
+    if (sports != (ALL_PORTS,) or dports != (ALL_PORTS,)) and (protocols is None or not protocols <= PORT_PROTOCOLS):
+        return None
+    return FilterRule(definition, action, src_interval, dst_interval, protocols, sports, dports)
+
+
+def parse_address(protocol: NetProtocol, address: str) -> Interval:
+    if address == "*":
+        return (0, ADDRESS_MAX[protocol])
+    if "-" in address:
+        lo, hi = address.split("-", 1)
+        return (_parse_ip(protocol, lo), _parse_ip(protocol, hi))
+    network = ipaddress.ip_network(address, strict=False)
+    if network.version != (4 if protocol == "ip" else 6):
+        raise ValueError(f"Invalid address: {address}")
+    return (int(network.network_address), int(network.broadcast_address))
+
+
+def format_address(protocol: NetProtocol, interval: Interval) -> str:
+    """区間をアドレス表記に戻す (CIDR で表せれば CIDR、そうでなければ範囲表記)"""
+    lo, hi = interval
+    if interval == (0, ADDRESS_MAX[protocol]):
+        return "*"
+    cls = ipaddress.IPv4Address if protocol == "ip" else ipaddress.IPv6Address
+    if lo == hi:
+        return str(cls(lo))
+    size = hi - lo + 1
+    if size & (size - 1) == 0 and lo & (size - 1) == 0:
+        bits = 32 if protocol == "ip" else 128
+        return f"{cls(lo)}/{bits - size.bit_length() + 1}"
+    return f"{cls(lo)}-{cls(hi)}"
+
+
+def parse_protocols(protocols: str) -> frozenset[int] | None:
+    if protocols == "*":
+        return None
+    numbers = set()
+    for name in protocols.split(","):
+        if name.isdecimal():
+            numbers.add(int(name))
+        elif name in PROTOCOL_NUMBERS:
+            numbers.add(PROTOCOL_NUMBERS[name])
+        else:
+            raise ValueError(f"Unknown protocol: {name}")
+    return frozenset(numbers)
+
+
+def format_protocols(protocols: frozenset[int] | None) -> str:
+    if protocols is None:
+        return "*"
+    names = {num: name for name, num in PROTOCOL_NUMBERS.items()}
+    return ",".join(names.get(num, str(num)) for num in sorted(protocols))
+
+
+def parse_ports(ports: str) -> tuple[Interval, ...]:
+    if ports == "*":
+        return (ALL_PORTS,)
+    intervals = []
+    for item in ports.split(","):
+        lo, _, hi = item.partition("-")
+        interval = (_parse_port(lo), _parse_port(hi) if hi else _parse_port(lo))
+        intervals.append(interval)
+    return merge_intervals(intervals)
+
+
+def format_ports(ports: tuple[Interval, ...]) -> str:
+    if ports == (ALL_PORTS,):
+        return "*"
+    return ",".join(str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in ports)
+
+
+def merge_intervals(intervals: list[Interval]) -> tuple[Interval, ...]:
+    """重なっている区間や隣接している区間をまとめる"""
+    merged: list[Interval] = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return tuple(merged)
+
+
+def _parse_ip(protocol: NetProtocol, address: str) -> int:
+    addr = ipaddress.ip_address(address)
+    if addr.version != (4 if protocol == "ip" else 6):
+        raise ValueError(f"Invalid address: {address}")
+    return int(addr)
+
+
+def _parse_port(port: str) -> int:
+    if port.isdecimal():
+        return int(port)
+    if port in PORT_NUMBERS:
+        return PORT_NUMBERS[port]
+    raise ValueError(f"Unknown port: {port}")
+
+
+def contains_intervals(outer: tuple[Interval, ...] | list[Interval], inner: tuple[Interval, ...] | list[Interval]) -> bool:
+    """outer (ソート済みで互いに素な区間) が inner の区間をすべて含むか"""
+    return all(any(lo <= i_lo and i_hi <= hi for lo, hi in outer) for i_lo, i_hi in inner)
+
+
+def intersects_intervals(a: tuple[Interval, ...] | list[Interval], b: tuple[Interval, ...] | list[Interval]) -> bool:
+    return any(a_lo <= b_hi and b_lo <= a_hi for a_lo, a_hi in a for b_lo, b_hi in b)
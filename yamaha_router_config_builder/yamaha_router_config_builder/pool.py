@@ -0,0 +1,164 @@
+"""
+プレフィックスごとのアドレス割り当て表
+
+アドレスごとの使用状況はビット列 (bytearray、1 アドレス 1 ビット) で持つので、/8 でも 2 MiB に収まる
+名前を付けた予約 (DHCP スコープや mode-cfg のアドレスプールなど) は開始位置でソートした区間のリストで持ち、
+重なりを二分探索で検出する
+"""
+
+import copy
+from bisect import bisect_right
+
+from .utils import IPv4Addr
+
+# 空きを探すときに一度に走査するバイト数
+_WINDOW = 4096
+
+# translate で対象のバイトを 1、それ以外を 0 にするテーブル
+_NOT_FULL = bytes(int(b != 0xFF) for b in range(256))
+_NOT_EMPTY = bytes(int(b != 0) for b in range(256))
+
+
+class AddressPool:
+    """
+    IPv4Addr のネットワーク内のアドレスを、ホスト部の番号 (IPv4Addr(i) や range(min, max) と同じ) で管理する
+    min 〜 max の外側 (既定ではネットワークアドレスとブロードキャストアドレス) は割り当てない
+    """
+
+    def __init__(self, network: IPv4Addr, min: int = 1, max: int | None = None):
+        self.network = network
+        self.size = 1 << (32 - network.prefix())
+        self.min = min
+        self.max = self.size - 2 if max is None else max
+        if not 0 <= self.min <= self.max < self.size:
+            raise ValueError(f"Invalid address range for {network}: {min}-{max}")
+        self.bitmap = bytearray((self.size + 7) // 8)
+        self._mark(0, self.min - 1, True)
+        self._mark(self.max + 1, len(self.bitmap) * 8 - 1, True)
+        # これより前のアドレスはすべて使用中
+        self.cursor = self.min
+        # 名前付きの予約 (開始位置でソート)
+        self.starts: list[int] = []
+        self.reservations: list[tuple[int, int, str]] = []
+
+    def copy(self) -> "AddressPool":
+        pool = copy.copy(self)
+        pool.bitmap = bytearray(self.bitmap)
+        pool.starts = list(self.starts)
+        pool.reservations = list(self.reservations)
+        return pool
+
+    def _used(self, i: int) -> bool:
+        return bool(self.bitmap[i >> 3] >> (i & 7) & 1)
+
+    def _mark(self, first: int, last: int, used: bool):
+        """first 〜 last (両端を含む) の使用状況を設定する (バイト境界の内側はまとめて書き込む)"""
+        head, tail = (first + 7) >> 3, (last + 1) >> 3
+        if head < tail:
+            self.bitmap[head:tail] = (b"\xff" if used else b"\0") * (tail - head)
+            bits = [*range(first, head << 3), *range(tail << 3, last + 1)]
+        else:
+            bits = range(first, last + 1)
+        for i in bits:
+            if used:
+                self.bitmap[i >> 3] |= 1 << (i & 7)
+            else:
+                self.bitmap[i >> 3] &= ~(1 << (i & 7))
+
+    def _find_byte(self, table: bytes, head: int, tail: int) -> int | None:
+        """head 〜 tail - 1 バイト目のうち、table で 1 になる最初のバイトの位置"""
+        for pos in range(head, tail, _WINDOW):
+            i = self.bitmap[pos : min(pos + _WINDOW, tail)].translate(table).find(1)
+            if i >= 0:
+                return pos + i
+        return None
+
+    def _find_free(self, first: int) -> int | None:
+        """first 以降で最初の空きアドレス"""
+        head = (first + 7) >> 3
+        for i in range(first, min(head << 3, self.size)):
+            if not self._used(i):
+                return i
+        j = self._find_byte(_NOT_FULL, head, len(self.bitmap))
+        if j is None:
+            return None
+        byte = self.bitmap[j]
+        return (j << 3) + (~byte & (byte + 1)).bit_length() - 1
+
+    def _find_used(self, first: int, last: int) -> int | None:
+        """first 〜 last の中で最初の使用中アドレス"""
+        head, tail = (first + 7) >> 3, (last + 1) >> 3
+        if head >= tail:
+            return next((i for i in range(first, last + 1) if self._used(i)), None)
+        for i in range(first, head << 3):
+            if self._used(i):
+                return i
+        j = self._find_byte(_NOT_EMPTY, head, tail)
+        if j is not None:
+            byte = self.bitmap[j]
+            return (j << 3) + (byte & -byte).bit_length() - 1
+        return next((i for i in range(tail << 3, last + 1) if self._used(i)), None)
+
+    def _check(self, min: int, max: int):
+        if not self.min <= min <= max <= self.max:
+            raise ValueError(f"{self.network.range(min, max)} is out of {self.network.range(self.min, self.max)}")
+
+    def is_free(self, min: int, max: int | None = None) -> bool:
+        """min 〜 max がすべて空いているか"""
+        max = min if max is None else max
+        self._check(min, max)
+        return self._find_used(min, max) is None
+
+    def owner(self, min: int, max: int | None = None) -> str | None:
+        """min 〜 max と重なる名前付きの予約"""
+        max = min if max is None else max
+        i = bisect_right(self.starts, max) - 1
+        if i >= 0 and self.reservations[i][1] >= min:
+            return self.reservations[i][2]
+        return None
+
+    def reserve(self, min: int, max: int, owner: str) -> str:
+        """min 〜 max を owner の名前で予約し、範囲の文字列 (IPv4Addr.range と同じ形式) を返す"""
+        self._check(min, max)
+        if (other := self.owner(min, max)) is not None:
+            raise ValueError(f"{owner} ({self.network.range(min, max)}) overlaps {other}")
+        if not self.is_free(min, max):
+            raise ValueError(f"{owner} ({self.network.range(min, max)}) overlaps allocated addresses")
+        self._mark(min, max, True)
+        i = bisect_right(self.starts, min)
+        self.starts.insert(i, min)
+        self.reservations.insert(i, (min, max, owner))
+        return self.network.range(min, max)
+
+    def allocate(self) -> int:
+        """空いているアドレスを 1 つ割り当てる (前から順に割り当てるので償却 O(1))"""
+        i = self._find_free(self.cursor)
+        if i is None or i > self.max:
+            raise ValueError(f"No free address in {self.network}")
+        self._mark(i, i, True)
+        self.cursor = i + 1
+        return i
+
+    def allocate_range(self, size: int, owner: str) -> tuple[int, int]:
+        """連続した size 個の空きアドレスを owner の名前で予約し、(min, max) を返す"""
+        start = self.cursor
+        while (i := self._find_free(start)) is not None and i + size - 1 <= self.max:
+            used = self._find_used(i, i + size - 1)
+            if used is None:
+                self.reserve(i, i + size - 1, owner)
+                return i, i + size - 1
+            start = used + 1
+        raise ValueError(f"No {size} contiguous free addresses in {self.network}")
+
+    def release(self, min: int, max: int | None = None):
+        """min 〜 max の割り当てと、それに含まれる名前付きの予約を解除する (予約の一部だけを解除することはできない)"""
+        max = min if max is None else max
+        self._check(min, max)
+        kept = [r for r in self.reservations if not (min <= r[0] and r[1] <= max)]
+        if any(r[0] <= max and min <= r[1] for r in kept):
+            raise ValueError(f"{self.network.range(min, max)} partially overlaps a reservation")
+        self._mark(min, max, False)
+        self.reservations = kept
+        self.starts = [r[0] for r in kept]
+        if min < self.cursor:
+            self.cursor = min
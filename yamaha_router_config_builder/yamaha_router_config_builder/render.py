@@ -0,0 +1,33 @@
+"""
+出力する設定の先頭部分 (ヘッダ・フィルタ定義・NAT ディスクリプタ) の組み立て
+
+YamahaRouterConfigBuilder と CompiledConfig で同じレイアウトになるように、両方からここを使う
+"""
+
+from typing import Iterator
+
+from .filter import Filter
+
+
+def build_header(device: str, version: str) -> list[str]:
+    return [
+        f"# YAMAHA {device} config (version {version})",
+        "# This file is auto-generated by YamahaRouterConfigBuilder",
+        "# See also: https://github.com/hoto17296/yamaha-router-config",
+    ]
+
+
+def build_filters(filters: dict[str, Filter], filter_tables: dict[str, dict[str, str]] | None = None) -> Iterator[str]:
+    """filter_tables には compile_filters() で確定済みのテーブルを渡せる (省略時はその場で作る)"""
+    if len(filters) > 0:
+        yield "\n# Filter"
+    for name, filter in filters.items():
+        yield from filter.build_commands(filter_tables[name] if filter_tables is not None else None)
+
+
+def build_nat(nat_commands: list[list[str]]) -> Iterator[str]:
+    """NAT ディスクリプタごとのコマンドを並べる"""
+    if len(nat_commands) > 0:
+        yield "\n# NAT"
+    for commands in nat_commands:
+        yield from commands
@@ -0,0 +1,179 @@
+"""
+フィルタごとのヒット数をもとに secure filter の静的フィルタを並べ替え、パケットあたりの平均比較回数を減らす
+
+隣り合うルールを入れ替えても評価結果が変わらないのは、両者にマッチするパケットが存在しないか、動作が同じ場合に限られる
+そうでないルールの組 (および解釈できないルールとそれ以外のすべてのルール) は元の前後関係を保ったまま、
+前後関係の制約を満たす範囲でヒット数の多いルールから順に並べる
+重なりうるルールの組は OverlapIndex で絞り込み、すべての組を調べずに済ませる
+"""
+
+import csv
+import heapq
+import json
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Iterator
+
+from .command import FilterCommand
+from .policy import FilterRule, parse_rule
+from .types import Direction, NetProtocol
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+
+class FilterReordering:
+    def __init__(
+        self,
+        protocol: NetProtocol,
+        interface: str,
+        direction: Direction,
+        before_cost: float,
+        after_cost: float,
+    ):
+        self.protocol: NetProtocol = protocol
+        self.interface = interface
+        self.direction = direction
+        self.before_cost = before_cost
+        self.after_cost = after_cost
+
+    @property
+    def reduction(self) -> float:
+        return self.before_cost - self.after_cost
+
+    def to_dict(self) -> dict:
+        return {
+            "protocol": self.protocol,
+            "interface": self.interface,
+            "direction": self.direction,
+            "before_cost": self.before_cost,
+            "after_cost": self.after_cost,
+            "reduction": self.reduction,
+        }
+
+
+def load_hits(path: str) -> dict[str, int]:
+    """
+    フィルタ定義ごとのヒット数を読み込む
+    JSON (`{"定義": ヒット数}` または filterlog の --json 出力) か、`definition,hits` のヘッダを持つ CSV に対応
+    """
+    hits: dict[str, int] = {}
+    with open(path, newline="") as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+            rows = data.items() if isinstance(data, dict) else [(row["definition"], row["hits"]) for row in data]
+        else:
+            rows = [(row["definition"], row["hits"]) for row in csv.DictReader(f)]
+        for _def, count in rows:
+            if _def is not None:
+                hits[_def] = hits.get(_def, 0) + int(count)
+    return hits
+
+
+def expected_cost(defs: list[str], hits: dict[str, int]) -> float:
+    """いずれかのルールにマッチするパケット 1 つあたりの平均比較回数"""
+    total = sum(hits.get(_def, 0) for _def in defs)
+    if total == 0:
+        return 0.0
+    return sum(hits.get(_def, 0) * (pos + 1) for pos, _def in enumerate(defs)) / total
+
+
+class OverlapIndex:
+    """
+    ルールの集合のうち、あるルールと重なりうるものを探す
+    ルールを送信元アドレスの下端の順に BLOCK_SIZE 個ずつのブロックに分け、ブロックごとに送信元・宛先アドレスの範囲を持つ
+    アドレスの範囲が重ならないブロックは、中のルールを 1 つずつ調べずに読み飛ばす
+    """
+
+    BLOCK_SIZE = 32
+
+    def __init__(self, rules: list[tuple[int, FilterRule]]):
+        """rules は (元の位置, ルール) のリスト"""
+        rules = sorted(rules, key=lambda item: item[1].src[0])
+        self.starts = [rule.src[0] for _, rule in rules]
+        # (送信元アドレスの上端の最大値, 宛先アドレスの下端の最小値, 宛先アドレスの上端の最大値, ブロック内のルール)
+        self.blocks: list[tuple[int, int, int, list[tuple[int, FilterRule]]]] = []
+        for k in range(0, len(rules), self.BLOCK_SIZE):
+            block = rules[k : k + self.BLOCK_SIZE]
+            self.blocks.append(
+                (
+                    max(rule.src[1] for _, rule in block),
+                    min(rule.dst[0] for _, rule in block),
+                    max(rule.dst[1] for _, rule in block),
+                    block,
+                )
+            )
+
+    def overlapping(self, rule: FilterRule, before: int) -> Iterator[int]:
+        """元の位置が before より前のルールのうち、rule と重なりうるものの元の位置"""
+        (src_lo, src_hi), (dst_lo, dst_hi) = rule.src, rule.dst
+        # 送信元アドレスの下端が rule の上端より大きいルールは重ならない
+        end = bisect_right(self.starts, src_hi)
+        for k in range(0, (end + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE):
+            block_src_hi, block_dst_lo, block_dst_hi, block = self.blocks[k]
+            if block_src_hi < src_lo or block_dst_lo > dst_hi or block_dst_hi < dst_lo:
+                continue
+            for i, other in block[: end - k * self.BLOCK_SIZE]:
+                if i < before and other.overlaps(rule):
+                    yield i
+
+
+def reorder_rules(protocol: NetProtocol, defs: list[str], hits: dict[str, int]) -> list[str]:
+    """評価結果を変えない範囲で、ヒット数の多いルールが前に来るように並べ替える"""
+    rules: list[FilterRule | None] = [parse_rule(protocol, _def) for _def in defs]
+
+    # 解釈できないルールはすべてのルールとの前後関係を保つので、その間の区間ごとに並べ替える
+    order: list[int] = []
+    start = 0
+    for end in [*(i for i, rule in enumerate(rules) if rule is None), len(rules)]:
+        order += _reorder_run(defs, rules, start, end, hits)  # type: ignore
+        if end < len(rules):
+            order.append(end)
+        start = end + 1
+
+    reordered = [defs[i] for i in order]
+    return reordered if expected_cost(reordered, hits) < expected_cost(defs, hits) else list(defs)
+
+
+def _reorder_run(defs: list[str], rules: list[FilterRule], start: int, end: int, hits: dict[str, int]) -> list[int]:
+    """rules[start:end] (すべて解釈できたルール) を並べ替えた順序 (元の位置のリスト)"""
+    # 動作ごとのルール (動作が同じルール同士は入れ替えても評価結果が変わらない)
+    by_action: dict[str, list[tuple[int, FilterRule]]] = {}
+    for i in range(start, end):
+        by_action.setdefault(rules[i].action, []).append((i, rules[i]))
+    indexes = {action: OverlapIndex(items) for action, items in by_action.items()}
+
+    # 前後関係を保たなければならないルールの組 (i < j で i を j より前に置く)
+    predecessors = dict.fromkeys(range(start, end), 0)
+    successors: dict[int, list[int]] = {i: [] for i in range(start, end)}
+    for j in range(start, end):
+        b = rules[j]
+        for action, index in indexes.items():
+            if action != b.action:
+                for i in index.overlapping(b, j):
+                    predecessors[j] += 1
+                    successors[i].append(j)
+
+    # 制約を満たすルールのうち、ヒット数が多い (同じなら元の位置が前の) ものから並べる
+    order = []
+    available = [(-hits.get(defs[i], 0), i) for i in range(start, end) if predecessors[i] == 0]
+    heapq.heapify(available)
+    while available:
+        _, best = heapq.heappop(available)
+        order.append(best)
+        for j in successors[best]:
+            predecessors[j] -= 1
+            if predecessors[j] == 0:
+                heapq.heappush(available, (-hits.get(defs[j], 0), j))
+    return order
+
+
+def reorder_filters(builder: "YamahaRouterConfigBuilder", hits: dict[str, int]) -> list[FilterReordering]:
+    """ビルダーのすべての secure filter の静的フィルタを並べ替え、インタフェース・方向ごとの平均比較回数を返す"""
+    results = []
+    for command in builder.commands:
+        if isinstance(command, FilterCommand) and command.static_filters:
+            before = expected_cost(command.static_filters, hits)
+            command.static_filters = tuple(reorder_rules(command.protocol, command.static_filters, hits))
+            after = expected_cost(command.static_filters, hits)
+            results.append(FilterReordering(command.protocol, command.interface, command.direction, before, after))
+    return results
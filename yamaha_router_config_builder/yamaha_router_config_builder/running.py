@@ -0,0 +1,189 @@
+"""
+ルーターの設定 (`show config` の出力や保存した config.txt) を読み込み、オブジェクトごとに索引を付けたモデルにする
+
+行はすべて元の順序・元の文字列のまま保持して索引には行番号を持たせるので、render() は読み込んだテキストをそのまま返す
+索引はすべて dict なので、フィルタ番号やトンネル番号などからの参照は O(1)
+"""
+
+import re
+
+# `ip <インタフェース> ...` の形のコマンドのインタフェース名
+_INTERFACE = re.compile(r"^(lan\d+(/\d+|\.\d+)?|onu\d+|wan\d+|bridge\d+|loopback\d+|vlan\d+|tunnel\d*|pp\d*|null)$")
+
+# フィルタテーブルの名前 (YamahaRouterConfigBuilder.filters と同じ)
+FILTER_TABLES = {
+    ("ip", False): "ip_filter",
+    ("ip", True): "ip_dynamic_filter",
+    ("ipv6", False): "ipv6_filter",
+    ("ipv6", True): "ipv6_dynamic_filter",
+}
+
+
+class InterfaceBlock:
+    """`tunnel select N` 〜 `tunnel enable N` の範囲 (lines は中の行の行番号)"""
+
+    def __init__(self, interface: str, id: int, start: int):
+        self.interface = interface
+        self.id = id
+        self.start = start
+        self.end: int | None = None
+        self.lines: list[int] = []
+
+
+class SecureFilter:
+    """インタフェースに適用した secure filter (フィルタ番号のリスト)"""
+
+    def __init__(self, protocol: str, interface: str, direction: str, static: list[int], dynamic: list[int], line: int):
+        self.protocol = protocol
+        self.interface = interface
+        self.direction = direction
+        self.static = static
+        self.dynamic = dynamic
+        self.line = line
+
+
+class RunningConfig:
+    lines: list[str]
+    # コマンドの先頭 2 語 (`ip <インタフェース> ...` はインタフェース名を除く) → 行番号
+    keywords: dict[str, list[int]]
+    # フィルタテーブル名 → フィルタ番号 → フィルタ定義
+    filters: dict[str, dict[int, str]]
+    # (プロトコル, インタフェース, 方向) → secure filter
+    secure_filters: dict[tuple[str, str, str], SecureFilter]
+    # (インタフェースの種類, 番号) → ブロック
+    interfaces: dict[tuple[str, int], InterfaceBlock]
+    # NAT ディスクリプタ番号 → 行番号
+    nat_descriptors: dict[int, list[int]]
+    # (DHCP スコープ番号, IP アドレス) → MAC アドレス
+    dhcp_binds: dict[tuple[int, str], str]
+    # (DHCP スコープ番号, MAC アドレス) → IP アドレス
+    dhcp_macs: dict[tuple[int, str], str]
+    # (プロトコル, 宛先ネットワーク) → 行番号
+    routes: dict[tuple[str, str], int]
+
+    def __init__(self, text: str):
+        self.lines = text.split("\n")
+        self.keywords = {}
+        self.filters = {name: {} for name in FILTER_TABLES.values()}
+        self.secure_filters = {}
+        self.interfaces = {}
+        self.nat_descriptors = {}
+        self.dhcp_binds = {}
+        self.dhcp_macs = {}
+        self.routes = {}
+        self._parse()
+
+    @classmethod
+    def load(cls, path: str) -> "RunningConfig":
+        with open(path, "rt") as f:
+            return cls(f.read())
+
+    def render(self) -> str:
+        return "\n".join(self.lines)
+
+    def find(self, keyword: str) -> list[str]:
+        """コマンドの先頭 2 語 (例: `ip filter`、`ip secure`、`dhcp scope`) で行を引く"""
+        return [self.lines[i].strip() for i in self.keywords.get(keyword, [])]
+
+    def filter(self, number: int) -> str | None:
+        """フィルタ番号からフィルタ定義を引く (静的フィルタと動的フィルタ、IPv4 と IPv6 のいずれか)"""
+        for table in self.filters.values():
+            if number in table:
+                return table[number]
+        return None
+
+    @property
+    def tunnels(self) -> dict[int, InterfaceBlock]:
+        return {id: block for (interface, id), block in self.interfaces.items() if interface == "tunnel"}
+
+    def _parse(self):
+        keywords = self.keywords
+        handlers = {
+            "ip filter": self._parse_filter,
+            "ipv6 filter": self._parse_filter,
+            "nat descriptor": self._parse_nat,
+            "dhcp scope": self._parse_dhcp,
+            "ip route": self._parse_route,
+            "ipv6 route": self._parse_route,
+        }
+        # インタフェース名かどうかの判定結果 (正規表現は同じ単語について 1 回だけ評価する)
+        is_interface: dict[str, bool] = {}
+        block: InterfaceBlock | None = None
+        block_end: list[str] = []
+        for i, raw in enumerate(self.lines):
+            words = raw.split()
+            if not words or words[0][0] == "#":
+                continue
+            command = words[0]
+            # コマンド名の位置 (`ip <インタフェース> ...` ならインタフェース名の次)
+            k = 1
+            if (command == "ip" or command == "ipv6") and len(words) > 2:
+                interface = words[1]
+                if interface not in is_interface:
+                    is_interface[interface] = _INTERFACE.match(interface) is not None
+                if is_interface[interface]:
+                    k = 2
+            keyword = f"{command} {words[k]}" if len(words) > k else command
+            if keyword in keywords:
+                keywords[keyword].append(i)
+            else:
+                keywords[keyword] = [i]
+
+            if len(words) == 3 and words[1] == "select" and words[2].isdigit():
+                block = InterfaceBlock(command, int(words[2]), i)
+                block_end = [command, "enable", words[2]]
+                self.interfaces[(command, block.id)] = block
+                continue
+            if block is not None:
+                if words == block_end:
+                    block.end = i
+                    block = None
+                    continue
+                block.lines.append(i)
+
+            if k == 2 and words[2] == "secure" and len(words) > 4 and words[3] == "filter":
+                interface = words[1]
+                if block is not None and (interface == "tunnel" or interface == "pp"):
+                    # `tunnel select N` の中では `ip tunnel ...` のようにインタフェース番号を省略する
+                    interface = f"{interface}{block.id}"
+                self._parse_secure_filter(i, command, interface, words[4:])
+            elif (handler := handlers.get(keyword)) is not None:
+                handler(i, words, raw)
+
+    def _parse_filter(self, i: int, words: list[str], raw: str):
+        dynamic = len(words) > 2 and words[2] == "dynamic"
+        k = 3 if dynamic else 2
+        if len(words) <= k + 1 or not words[k].isdigit():
+            return
+        # 定義部分は元の行から (定義の中の空白も含めて) 切り出す
+        definition = raw.split(None, k + 1)[-1].rstrip()
+        self.filters[FILTER_TABLES[(words[0], dynamic)]][int(words[k])] = definition
+
+    def _parse_secure_filter(self, i: int, protocol: str, interface: str, words: list[str]):
+        direction = words[0]
+        static: list[int] = []
+        dynamic: list[int] = []
+        numbers = static
+        for word in words[1:]:
+            if word == "dynamic":
+                numbers = dynamic
+            elif word.isdigit():
+                numbers.append(int(word))
+        self.secure_filters[(protocol, interface, direction)] = SecureFilter(
+            protocol, interface, direction, static, dynamic, i
+        )
+
+    def _parse_nat(self, i: int, words: list[str], raw: str):
+        number = next((word for word in words[2:] if word.isdigit()), None)
+        if number is not None:
+            self.nat_descriptors.setdefault(int(number), []).append(i)
+
+    def _parse_dhcp(self, i: int, words: list[str], raw: str):
+        if len(words) >= 6 and words[2] == "bind":
+            scope = int(words[3])
+            self.dhcp_binds[(scope, words[4])] = words[5]
+            self.dhcp_macs[(scope, words[5])] = words[4]
+
+    def _parse_route(self, i: int, words: list[str], raw: str):
+        if len(words) >= 3:
+            self.routes[(words[0], words[2])] = i
@@ -0,0 +1,164 @@
+"""
+secure filter に適用した静的フィルタにフロー (送信元, 宛先, プロトコル, 送信元ポート, 宛先ポート) を流し、
+どのフィルタにマッチして通過・破棄されるかを NumPy でまとめて評価する
+
+- IPv4 のフィルタのみ対応
+- どのフィルタにもマッチしないフローは破棄される (フィルタ番号は 0)
+- 解釈できないフィルタ定義 (policy.parse_rule() が None を返すもの) に到達したフローは判定不能 (UNKNOWN) とする
+- 動的フィルタは評価しない
+
+要 numpy (`pip install yamaha-router-config-builder[simulator]`)
+"""
+
+import csv
+import ipaddress
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .command import FilterCommand
+from .policy import ALL_PORTS, parse_rule
+from .types import Direction
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+REJECT = 0
+PASS = 1
+UNKNOWN = -1
+
+# 1 つのルールに指定できるポート区間の数 (YAMAHA のポートリストは 10 個まで)
+MAX_PORT_INTERVALS = 10
+
+
+class Flows:
+    """フローの各要素を列ごとの配列として持つ"""
+
+    def __init__(self, src, dst, proto, sport, dport):
+        self.src = np.asarray(src, dtype=np.uint32)
+        self.dst = np.asarray(dst, dtype=np.uint32)
+        self.proto = np.asarray(proto, dtype=np.uint8)
+        self.sport = np.asarray(sport, dtype=np.uint16)
+        self.dport = np.asarray(dport, dtype=np.uint16)
+
+    def __len__(self) -> int:
+        return len(self.src)
+
+    def __getitem__(self, key) -> "Flows":
+        return Flows(self.src[key], self.dst[key], self.proto[key], self.sport[key], self.dport[key])
+
+    @classmethod
+    def read_csv(cls, path: str) -> "Flows":
+        """`src,dst,proto,sport,dport` のヘッダを持つ CSV を読み込む (アドレスはドット区切り表記)"""
+        columns: list[list[int]] = [[], [], [], [], []]
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                columns[0].append(int(ipaddress.IPv4Address(row["src"])))
+                columns[1].append(int(ipaddress.IPv4Address(row["dst"])))
+                columns[2].append(int(row["proto"]))
+                columns[3].append(int(row["sport"] or 0))
+                columns[4].append(int(row["dport"] or 0))
+        return cls(*columns)
+
+
+class PolicySimulator:
+    def __init__(self, defs: list[str], numbers: list[int] | None = None):
+        """defs は secure filter に並べた順の静的フィルタ定義、numbers はそれぞれのフィルタ番号"""
+        n = len(defs)
+        self.defs = defs
+        self.numbers = np.asarray(numbers if numbers is not None else range(1, n + 1), dtype=np.int32)
+        self.known = np.zeros(n, dtype=bool)
+        self.verdicts = np.full(n, UNKNOWN, dtype=np.int8)
+        self.src = np.zeros((n, 2), dtype=np.uint32)
+        self.dst = np.zeros((n, 2), dtype=np.uint32)
+        self.protocols = np.zeros((n, 256), dtype=bool)
+        # 使わないポート区間は lo > hi にしてどのポートにもマッチしないようにする
+        self.sport = np.tile(np.array([1, 0], dtype=np.uint16), (n, MAX_PORT_INTERVALS, 1))
+        self.dport = self.sport.copy()
+        self.any_port = np.zeros((n, 2), dtype=bool)
+
+        for i, _def in enumerate(defs):
+            rule = parse_rule("ip", _def)
+            if rule is None or len(rule.sport) > MAX_PORT_INTERVALS or len(rule.dport) > MAX_PORT_INTERVALS:
+                continue
+            self.known[i] = True
+            self.verdicts[i] = PASS if rule.passes else REJECT
+            self.src[i] = rule.src
+            self.dst[i] = rule.dst
+            if rule.protocols is None:
+                self.protocols[i] = True
+            else:
+                self.protocols[i, list(rule.protocols)] = True
+            for column, ports in enumerate([rule.sport, rule.dport]):
+                self.any_port[i, column] = ports == (ALL_PORTS,)
+                (self.sport if column == 0 else self.dport)[i, : len(ports)] = ports
+
+    def evaluate(self, flows: Flows, batch_size: int = 1 << 18) -> tuple[np.ndarray, np.ndarray]:
+        """
+        各フローの判定結果 (PASS/REJECT/UNKNOWN) とマッチしたフィルタ番号を返す
+        フローを batch_size 件ずつに分け、ルールごとに未判定のフローをまとめて評価する (先にマッチしたルールが優先)
+        """
+        verdicts = np.full(len(flows), REJECT, dtype=np.int8)
+        numbers = np.zeros(len(flows), dtype=np.int32)
+        for start in range(0, len(flows), batch_size):
+            batch = flows[start : start + batch_size]
+            v, n = self._evaluate_batch(batch)
+            verdicts[start : start + len(batch)] = v
+            numbers[start : start + len(batch)] = n
+        return verdicts, numbers
+
+    def _evaluate_batch(self, flows: Flows) -> tuple[np.ndarray, np.ndarray]:
+        verdicts = np.full(len(flows), REJECT, dtype=np.int8)
+        numbers = np.zeros(len(flows), dtype=np.int32)
+        # まだどのルールにもマッチしていないフローの位置
+        pending = np.arange(len(flows))
+        src, dst, proto, sport, dport = flows.src, flows.dst, flows.proto, flows.sport, flows.dport
+
+        for i in range(len(self.defs)):
+            if len(pending) == 0:
+                break
+            if not self.known[i]:
+                # 解釈できないルールに到達したフローは判定不能
+                verdicts[pending] = UNKNOWN
+                numbers[pending] = self.numbers[i]
+                pending = pending[:0]
+                break
+            match = (
+                (src >= self.src[i, 0])
+                & (src <= self.src[i, 1])
+                & (dst >= self.dst[i, 0])
+                & (dst <= self.dst[i, 1])
+                & self.protocols[i][proto]
+            )
+            if not self.any_port[i, 0]:
+                match &= _in_intervals(sport, self.sport[i])
+            if not self.any_port[i, 1]:
+                match &= _in_intervals(dport, self.dport[i])
+            hit = pending[match]
+            if len(hit):
+                verdicts[hit] = self.verdicts[i]
+                numbers[hit] = self.numbers[i]
+                keep = ~match
+                pending = pending[keep]
+                src, dst, proto, sport, dport = src[keep], dst[keep], proto[keep], sport[keep], dport[keep]
+        return verdicts, numbers
+
+
+def _in_intervals(values: np.ndarray, intervals: np.ndarray) -> np.ndarray:
+    match = np.zeros(len(values), dtype=bool)
+    for lo, hi in intervals:
+        if lo > hi:
+            break
+        match |= (values >= lo) & (values <= hi)
+    return match
+
+
+def build_simulators(builder: "YamahaRouterConfigBuilder") -> dict[tuple[str, Direction], PolicySimulator]:
+    """ビルダーの IPv4 の secure filter ごとのシミュレータを (インタフェース, 方向) をキーにして返す"""
+    table = builder.compile_filters()["ip_filter"]
+    simulators = {}
+    for command in builder.commands:
+        if isinstance(command, FilterCommand) and command.protocol == "ip":
+            numbers = [int(table[_def]) for _def in command.static_filters]
+            simulators[(command.interface, command.direction)] = PolicySimulator(command.static_filters, numbers)
+    return simulators
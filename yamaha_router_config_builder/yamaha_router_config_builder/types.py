@@ -3,3 +3,5 @@ from typing import Literal
 type NetProtocol = Literal["ip", "ipv6"]
 
 type Direction = Literal["in", "out"]
+
+type ChangeType = Literal["added", "removed", "moved"]
@@ -1,7 +1,13 @@
+import ipaddress
 from typing import Any, Generator, NoReturn
 
 type Counter = Generator[int, Any, NoReturn]
 
+# プレフィックス長 → ネットマスク
+_MASKS = tuple(0xFFFFFFFF >> (32 - prefix) << (32 - prefix) for prefix in range(33))
+# ネットマスク → プレフィックス長
+_PREFIXES = {mask: prefix for prefix, mask in enumerate(_MASKS)}
+
 
 def counter(initial: int = 0) -> Counter:
     n = initial
@@ -15,44 +21,116 @@ def uniq(arr: list[str]) -> list[str]:
     return list(dict.fromkeys(arr).keys())
 
 
+def addr2int(addr: str) -> int:
+    """IPv4 アドレスの文字列を整数にする"""
+    octets = addr.split(".")
+    assert len(octets) == 4
+    a, b, c, d = map(int, octets)
+    assert 0 <= a <= 0xFF and 0 <= b <= 0xFF and 0 <= c <= 0xFF and 0 <= d <= 0xFF
+    return a << 24 | b << 16 | c << 8 | d
+
+
+def int2addr(addr: int) -> str:
+    """整数を IPv4 アドレスの文字列にする"""
+    return f"{addr >> 24}.{addr >> 16 & 0xFF}.{addr >> 8 & 0xFF}.{addr & 0xFF}"
+
+
 class IPv4Addr:
     def __init__(self, cidr: str):
         self.addr, self.mask = _cidr2int(cidr)
+        self._prefix = _PREFIXES[self.mask]
+        self._network = self.addr & self.mask
+        self._cidr: str | None = None
 
     def __call__(self, i: int, prefix: bool = False) -> str:
-        cidr = _int2cidr((self.addr & self.mask) + i, self.mask)
-        return cidr if prefix else cidr.split("/")[0]
+        addr = self._network + i
+        assert 0 <= addr <= 0xFFFFFFFF
+        return f"{int2addr(addr)}/{self._prefix}" if prefix else int2addr(addr)
 
     def __str__(self) -> str:
         return self.cidr()
 
     def cidr(self) -> str:
-        return _int2cidr(self.addr & self.mask, self.mask)
+        # フィルタ定義などで何度も使われるので、初回に作った文字列を使い回す
+        if self._cidr is None:
+            self._cidr = f"{int2addr(self._network)}/{self._prefix}"
+        return self._cidr
 
     def prefix(self) -> int:
-        return bin(self.mask).count("1")
+        return self._prefix
 
     def range(self, min: int, max: int) -> str:
-        return f"{self(min)}-{self(max)}/{self.prefix()}"
+        return f"{self(min)}-{self(max)}/{self._prefix}"
+
+    def addresses(self, min: int, max: int, prefix: bool = False) -> list[str]:
+        """min 〜 max 番目のアドレスをまとめて作る"""
+        network = self._network
+        assert 0 <= network + min and network + max <= 0xFFFFFFFF
+        addrs = [
+            f"{addr >> 24}.{addr >> 16 & 0xFF}.{addr >> 8 & 0xFF}.{addr & 0xFF}"
+            for addr in range(network + min, network + max + 1)
+        ]
+        if prefix:
+            suffix = f"/{self._prefix}"
+            return [addr + suffix for addr in addrs]
+        return addrs
+
+
+class IPv6Prefix:
+    """
+    IPv6 のプレフィックス
+    `2001:db8::/64` のようなアドレスのほか、`dhcp-prefix@onu1` や `ra-prefix@lan2` のように
+    ルーターが取得したプレフィックスを参照する形式も扱う (この場合はホスト部だけを `::1` のように付け足す)
+    """
+
+    def __init__(self, prefix: str, length: int | None = None):
+        base, _, _length = prefix.partition("/")
+        length = int(_length) if _length else 64 if length is None else length
+        assert 0 <= length <= 128
+        self.length = length
+        # ホスト部で表せるアドレスの数
+        self.size = 1 << (128 - length)
+        self.mask = (1 << 128) - self.size
+        if "@" in base:
+            self.name: str | None = base.removesuffix("::")
+            self.addr = 0
+        else:
+            self.name = None
+            self.addr = int(ipaddress.IPv6Address(base)) & self.mask
+        self._cidr = f"{self(0)}/{length}"
 
+    def __call__(self, i: int, prefix: bool = False) -> str:
+        assert 0 <= i < self.size
+        if self.name is None:
+            addr = ipaddress.IPv6Address(self.addr + i).compressed
+        else:
+            # 参照形式ではホスト部だけを `::` に続けて付け足す (0 番目は `::` になる)
+            groups = []
+            while i:
+                groups.append(f"{i & 0xFFFF:x}")
+                i >>= 16
+            addr = f"{self.name}::{':'.join(reversed(groups))}"
+        return f"{addr}/{self.length}" if prefix else addr
 
-def _cidr2int(cidr: str) -> tuple[int, int]:
-    _addr, prefix = cidr.split("/", 1)
-    _addr = _addr.split(".")
-    assert len(_addr) == 4
-    prefix = int(prefix)
-    assert 0 <= prefix <= 32
+    def __str__(self) -> str:
+        return self._cidr
 
-    addr = 0
-    for i, octet in enumerate(_addr):
-        assert 0 <= int(octet) <= 0xFF
-        addr += int(octet) * 0x100 ** (3 - i)
-    mask = 0xFFFFFFFF >> (32 - prefix) << (32 - prefix)
-    return addr, mask
+    def cidr(self) -> str:
+        return self._cidr
+
+    def prefix(self) -> int:
+        return self.length
+
+    def range(self, min: int, max: int) -> str:
+        return f"{self(min)}-{self(max)}/{self.length}"
 
+    def addresses(self, min: int, max: int, prefix: bool = False) -> list[str]:
+        """min 〜 max 番目のアドレスをまとめて作る"""
+        return [self(i, prefix) for i in range(min, max + 1)]
 
-def _int2cidr(addr: int, mask: int) -> str:
-    assert 0 <= addr <= 0xFFFFFFFF
-    assert 0 <= mask <= 0xFFFFFFFF
-    octets = reversed([(addr & (0xFF * 0x100**i)) >> (i * 8) for i in range(4)])
-    return f"{'.'.join([str(octet) for octet in octets])}/{bin(mask).count('1')}"
+
+def _cidr2int(cidr: str) -> tuple[int, int]:
+    addr, prefix = cidr.split("/", 1)
+    prefix = int(prefix)
+    assert 0 <= prefix <= 32
+    return addr2int(addr), _MASKS[prefix]
@@ -0,0 +1,165 @@
+"""
+出力する前にビルダーの状態を検証する
+
+コマンドを 1 回だけ走査してインタフェースブロック・NAT ディスクリプタ・DHCP スコープと固定割り当てのハッシュインデックスを作り、
+重複や上限超過、参照先の欠落を検出する (コマンド数に比例した時間で済む)
+問題のあるコマンドがどのセクションにあるかは、見つかった問題についてだけ後から求める
+"""
+
+from typing import TYPE_CHECKING, Any
+
+from .cache import Section
+from .command import BasicCommand, FilterCommand, RouteCommand
+from .dhcp import DhcpScopeCommand
+from .utils import addr2int, int2addr
+from .vpn import MAX_PEERS, IkeV2RemoteAccess
+
+if TYPE_CHECKING:
+    from .builder import YamahaRouterConfigBuilder
+
+
+class Problem:
+    """
+    検証で見つかった問題
+    code は問題の種類、command は問題のあるコマンドの位置 (builder.commands の添字、特定のコマンドに由来しない場合は None)
+    """
+
+    def __init__(self, code: str, message: str, command: int | None = None, section: str | None = None):
+        self.code = code
+        self.message = message
+        self.command = command
+        self.section = section
+
+    def __repr__(self) -> str:
+        return f"Problem({self.code!r}, {self.message!r}, {self.command!r}, {self.section!r})"
+
+    def __str__(self) -> str:
+        return f"[{self.section}] {self.message}" if self.section is not None else self.message
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"code": self.code, "message": self.message, "command": self.command, "section": self.section}
+
+
+def _section_title(sections: list[Section], i: int) -> str | None:
+    """i 番目のコマンドを含む最も内側のセクション"""
+    innermost = None
+    for section in sections:
+        if section.start <= i < section.end and (innermost is None or section.start >= innermost.start):
+            innermost = section
+    return innermost.title if innermost is not None else None
+
+
+class _Validator:
+    def __init__(self, builder: "YamahaRouterConfigBuilder"):
+        self.builder = builder
+        self.max_peers = MAX_PEERS.get(builder.device)
+        self.problems: list[Problem] = []
+        # (インタフェースの種類, 番号) → 最初に select したコマンド
+        self.interfaces: dict[tuple[str, int], int] = {}
+        # type を設定した NAT ディスクリプタ番号 (nat() で作ったものと、`nat descriptor type N ...` を直接追加したもの)
+        self.nat_types: set[int] = {nat.descriptor for nat in builder.nat_descriptions}
+        # NAT ディスクリプタ番号 → 最初にインタフェースに適用したコマンド
+        self.nat_bindings: dict[int, int] = {}
+        # DHCP スコープ番号 → 定義したコマンド
+        self.dhcp_scopes: dict[int, int] = {}
+        # (DHCP スコープ番号, IP アドレス) → 固定割り当てを追加したコマンド
+        self.dhcp_binds: dict[tuple[int, int], int] = {}
+        # フィルタ番号の枠を超えたフィルタ定義 (テーブル名, 定義) → フィルタ番号
+        self.overflowed: dict[tuple[str, str], int] = {}
+        for name, filter in builder.filters.items():
+            if filter.overflowed():
+                end = filter.filter_num_base + filter.filter_num_size
+                self.overflowed.update(((name, _def), num) for _def, num in filter.index.items() if num >= end)
+
+    def report(self, code: str, message: str, i: int | None):
+        self.problems.append(Problem(code, message, i))
+
+    def select(self, interface: str, id: int, i: int):
+        key = (interface, id)
+        if key in self.interfaces:
+            self.report("duplicate-interface", f"{interface} {id} is selected more than once", i)
+        else:
+            self.interfaces[key] = i
+        if interface == "tunnel" and self.max_peers is not None and id > self.max_peers:
+            self.report(
+                "tunnel-limit", f"tunnel {id} exceeds the {self.max_peers} peers supported by {self.builder.device}", i
+            )
+
+    def scope(self, id: int, i: int):
+        if id in self.dhcp_scopes:
+            self.report("duplicate-dhcp-scope", f"DHCP scope {id} is defined more than once", i)
+        else:
+            self.dhcp_scopes[id] = i
+
+    def bind(self, scope: int, addr: int, i: int):
+        key = (scope, addr)
+        if key in self.dhcp_binds:
+            self.report("duplicate-dhcp-bind", f"{int2addr(addr)} is bound more than once in DHCP scope {scope}", i)
+        else:
+            self.dhcp_binds[key] = i
+
+    def basic(self, text: str, i: int):
+        words = text.split()
+        if len(words) == 3 and words[1] == "select" and words[2].isdigit():
+            self.select(words[0], int(words[2]), i)
+        elif len(words) > 4 and words[0] in ("ip", "ipv6") and words[2] == "nat" and words[3] == "descriptor":
+            # `ip <インタフェース> nat descriptor N [N ...]`
+            for word in words[4:]:
+                if word.isdigit():
+                    self.nat_bindings.setdefault(int(word), i)
+        elif len(words) > 4 and words[0] == "nat" and words[1] == "descriptor" and words[2] == "type":
+            if words[3].isdigit():
+                self.nat_types.add(int(words[3]))
+        elif len(words) > 2 and words[0] == "dhcp" and words[1] == "scope":
+            if words[2] == "bind" and len(words) > 4 and words[3].isdigit():
+                try:
+                    addr = addr2int(words[4])
+                except (AssertionError, ValueError):
+                    # IP アドレス以外 (ipcp など) は対象外
+                    return
+                self.bind(int(words[3]), addr, i)
+            elif words[2].isdigit():
+                self.scope(int(words[2]), i)
+
+    def filters(self, command: FilterCommand | RouteCommand, i: int):
+        for ref in command.filter_refs():
+            num = self.overflowed.pop(ref, None)
+            if num is not None:
+                self.report("filter-overflow", f"{ref[0]} {num} ({ref[1]}) is outside the filter number range", i)
+
+    def run(self) -> list[Problem]:
+        overflowed = bool(self.overflowed)
+        for i, command in enumerate(self.builder.commands):
+            kind = type(command)
+            if kind is BasicCommand:
+                text: str = command.command  # type: ignore
+                # 大半の行は対象外なので、分割する前に部分文字列で絞り込む
+                if "select " in text or "descriptor " in text or text.startswith("dhcp scope "):
+                    self.basic(text, i)
+            elif kind is IkeV2RemoteAccess:
+                for id in command.ids:  # type: ignore
+                    self.select("tunnel", id, i)
+            elif kind is DhcpScopeCommand:
+                scope = command.scope  # type: ignore
+                self.scope(scope.id, i)
+                for addr in scope.by_ip:
+                    self.bind(scope.id, addr, i)
+            elif overflowed and (kind is FilterCommand or kind is RouteCommand):
+                self.filters(command, i)  # type: ignore
+
+        for descriptor, i in self.nat_bindings.items():
+            if descriptor not in self.nat_types:
+                self.report("nat-without-type", f"NAT descriptor {descriptor} is applied but has no type", i)
+        for (table, _def), num in self.overflowed.items():
+            self.report("filter-overflow", f"{table} {num} ({_def}) is outside the filter number range", None)
+
+        sections = self.builder.sections
+        for problem in self.problems:
+            if problem.command is not None:
+                problem.section = _section_title(sections, problem.command)
+        return sorted(self.problems, key=lambda problem: (problem.command is None, problem.command or 0))
+
+
+def validate(builder: "YamahaRouterConfigBuilder") -> list[Problem]:
+    """ビルダーの状態を検証して、見つかった問題をコマンドの順に返す (問題がなければ空のリスト)"""
+    return _Validator(builder).run()
@@ -0,0 +1,102 @@
+"""
+IKEv2 リモートアクセス VPN のクライアントごとのトンネル設定
+
+クライアントごとに `tunnel select N` 〜 `tunnel enable N` のブロックを作る
+トンネルインタフェース番号・セキュアゲートウェイ ID・SA ポリシー ID はクライアントごとに同じ番号を使う (本来同じである必要はないが)
+ブロックのテンプレートはクライアント間で共通の部分を埋め込んだ状態で 1 回だけ作り、クライアントごとには番号と名前だけを埋める
+"""
+
+from .command import YamahaRouterCommand
+
+# 機種ごとの VPN 対地数 (トンネルインタフェース番号とセキュアゲートウェイ ID の上限)
+# https://www.rtpro.yamaha.co.jp/RT/manual/rt-common/ipsec/ipsec_chapter.html
+MAX_PEERS = {
+    "NVR700W": 20,
+}
+
+_TEMPLATE = (
+    "tunnel select {id}",
+    "description tunnel {name}",
+    "tunnel encapsulation ipsec",
+    # SA ポリシーを定義し、暗号化と認証の方式として ESP を設定する (SA は IPsec 接続のこと)
+    "ipsec sa policy {id} {id} esp",
+    # トンネルで使用する SA のポリシーを設定する
+    "ipsec tunnel {id}",
+    # IKE の鍵交換を自動で開始しない (クライアント側から接続するので)
+    "ipsec auto refresh {id} off",
+    # セキュアゲートウェイで使用する IKE のバージョンを設定する
+    "ipsec ike version {id} 2",
+    # IKE キープアライブのログ出力を無効にする
+    "ipsec ike keepalive log {id} off",
+    # IKE キープアライブの設定 (10秒間隔で送信し、3回届かなかったら障害とみなす)
+    "ipsec ike keepalive use {id} on rfc4306 10 3",
+    # 自分側のセキュアゲートウェイの ID として FQDN を設定する
+    "ipsec ike local name {id} {domain} fqdn",
+    # 事前共有鍵 (PSK) を設定する
+    "ipsec ike pre-shared-key {id} text {psk}",
+    # 相手側のセキュアゲートウェイの ID としてユーザ FQDN を設定する
+    "ipsec ike remote name {id} {name}@{domain} user-fqdn",
+    # IPsec クライアントに内部 IP アドレスを割り当てる際のアドレスプールを設定する
+    "ipsec ike mode-cfg address {id} {pool_id}",
+    "tunnel enable {id}",
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("{", "{{").replace("}", "}}")
+
+
+class IkeV2RemoteAccess(YamahaRouterCommand):
+    """
+    VPN クライアントごとの IPsec トンネル (IKEv2)
+    clients[i] には first_id + i 番を割り当てる
+    """
+
+    __slots__ = ("clients", "first_id", "domain", "psk", "pool_id", "template")
+
+    def __init__(
+        self,
+        clients: list[str],
+        first_id: int,
+        domain: str,
+        psk: str,
+        pool_id: int,
+        max_peers: int | None = None,
+    ):
+        if len(set(clients)) != len(clients):
+            raise ValueError("VPN client names must be unique")
+        last_id = first_id + len(clients) - 1
+        if first_id < 1:
+            raise ValueError(f"Invalid tunnel ID: {first_id}")
+        if max_peers is not None and clients and last_id > max_peers:
+            raise ValueError(
+                f"{len(clients)} VPN clients need tunnel IDs {first_id}-{last_id}, "
+                f"but this device supports up to {max_peers} peers"
+            )
+        self.clients = list(clients)
+        self.first_id = first_id
+        self.domain = domain
+        self.psk = psk
+        self.pool_id = pool_id
+        # クライアント間で共通の値はテンプレートに埋め込んでおく
+        self.template = "\n".join(_TEMPLATE).format(
+            id="{id}",
+            name="{name}",
+            domain=_escape(domain),
+            psk=_escape(psk),
+            pool_id=pool_id,
+        )
+
+    @property
+    def ids(self) -> range:
+        return range(self.first_id, self.first_id + len(self.clients))
+
+    def build(self, filter_tables):
+        template = self.template
+        lines = []
+        for id, name in zip(self.ids, self.clients):
+            lines += template.format(id=id, name=name).split("\n")
+        return lines
+
+    def cache_key(self):
+        return repr((self.clients, self.first_id, self.domain, self.psk, self.pool_id))
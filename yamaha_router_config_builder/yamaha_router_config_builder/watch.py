@@ -0,0 +1,214 @@
+"""
+プロファイルのスクリプトを監視し、変更されるたびに同じプロセスで設定をビルドし直す
+
+インタプリタの起動やライブラリの import は最初の 1 回だけで済む
+プロファイルは変更のたびに実行し直すが、レンダリングはメモリ上のセクションキャッシュを使うので、
+内容が変わったセクションだけが再レンダリングされる
+ビルドのたびに設定を書き出し、前回の設定との差分とフェーズごとの所要時間を表示する
+
+usage: python -m yamaha_router_config_builder.watch <profile.py> [--output FILE] [--lock FILE] [--watch FILE ...] [--json]
+"""
+
+import argparse
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+from typing import Any
+
+from .builder import YamahaRouterConfigBuilder
+from .cache import MemorySectionCache
+from .diff import Change, diff
+from .validate import Problem
+
+COLORS = {
+    "added": "\033[32m",  # green
+    "removed": "\033[31m",  # red
+    "moved": "\033[33m",  # yellow
+}
+
+
+def load_profile(path: str, attr: str = "config") -> YamahaRouterConfigBuilder:
+    """
+    プロファイルのスクリプトを実行して、モジュールのトップレベルの attr にあるビルダーを返す
+    `if __name__ == "__main__":` の中は実行しない
+    """
+    namespace = runpy.run_path(path, run_name="__watch__")
+    config = namespace.get(attr)
+    if not isinstance(config, YamahaRouterConfigBuilder):
+        raise ValueError(f"{path} does not define a YamahaRouterConfigBuilder named {attr!r}")
+    return config
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Rebuild:
+    """1 回分のビルドの結果"""
+
+    def __init__(self):
+        # フェーズ (profile, validate, build, diff, write) → 所要時間 (秒)
+        self.seconds: dict[str, float] = {}
+        self.problems: list[Problem] = []
+        self.changes: list[Change] = []
+        self.lines = 0
+        # 再レンダリングしたセクション数 / キャッシュを使ったセクション数
+        self.rendered = 0
+        self.cached = 0
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "seconds": self.total_seconds,
+            "phases": self.seconds,
+            "lines": self.lines,
+            "sections": {"rendered": self.rendered, "cached": self.cached},
+            "problems": [problem.to_dict() for problem in self.problems],
+            "changes": [change.to_dict() for change in self.changes],
+        }
+
+
+class Watcher:
+    def __init__(
+        self,
+        profile: str,
+        output: str | None = None,
+        lock: str | None = None,
+        watch: list[str] | None = None,
+        attr: str = "config",
+    ):
+        self.profile = os.path.abspath(profile)
+        self.output = output
+        self.lock = lock
+        self.attr = attr
+        # プロファイルと、プロファイルが import しているモジュールなど
+        self.paths = [self.profile, *(os.path.abspath(path) for path in watch or [])]
+        self.mtimes: dict[str, int | None] = {}
+        self.cache = MemorySectionCache()
+        # 前回ビルドした設定 (最初のビルドの前は None)
+        self.previous: list[str] | None = None
+
+    def changed(self) -> bool:
+        """前回呼んだときから監視対象のファイルが変わったか (最初の呼び出しでは True)"""
+        mtimes = {path: _mtime(path) for path in self.paths}
+        if mtimes == self.mtimes:
+            return False
+        self.mtimes = mtimes
+        return True
+
+    def _forget_modules(self):
+        """監視対象のモジュールを import し直させる"""
+        paths = set(self.paths)
+        for name, module in list(sys.modules.items()):
+            file = getattr(module, "__file__", None)
+            if file is not None and os.path.abspath(file) in paths:
+                del sys.modules[name]
+
+    def rebuild(self) -> Rebuild:
+        """
+        プロファイルを実行し直して設定を書き出す
+        検証で問題が見つかった場合は書き出さない (前回の設定をそのまま残す)
+        """
+        result = Rebuild()
+        start = time.perf_counter()
+
+        def lap(phase: str):
+            nonlocal start
+            now = time.perf_counter()
+            result.seconds[phase] = now - start
+            start = now
+
+        self._forget_modules()
+        config = load_profile(self.profile, self.attr)
+        lap("profile")
+
+        result.problems = config.validate()
+        lap("validate")
+        if result.problems:
+            return result
+
+        if self.lock is not None:
+            config.lock_filters(self.lock)
+        hits, misses = self.cache.hits, self.cache.misses
+        # ファイルから読んだ設定と同じ行に揃える (セクションの見出しは改行を含む)
+        lines = "\n".join(config.build_iter(self.cache)).split("\n")
+        self.cache.prune()
+        result.lines = len(lines)
+        result.cached = self.cache.hits - hits
+        result.rendered = self.cache.misses - misses
+        lap("build")
+
+        if self.previous is not None:
+            result.changes = list(diff(self.previous, lines))
+        self.previous = lines
+        lap("diff")
+
+        if self.output is not None:
+            # 書き込み途中のファイルを読まないように、一時ファイルに書いてから置き換える
+            tmp = f"{self.output}.{os.getpid()}.tmp"
+            with open(tmp, "wt") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self.output)
+        lap("write")
+        return result
+
+
+def report(result: Rebuild, color: bool = True) -> str:
+    """ビルドの結果を人が読む形式にする"""
+    phases = ", ".join(f"{phase} {seconds * 1000:.1f}" for phase, seconds in result.seconds.items())
+    lines = [f"[{time.strftime('%H:%M:%S')}] {result.total_seconds * 1000:.1f} ms ({phases})"]
+    if result.problems:
+        lines.extend(f"error: {problem}" for problem in result.problems)
+        return "\n".join(lines)
+    lines[0] += f", {result.lines} lines, {result.rendered} sections rendered, {result.cached} cached"
+    block = None
+    for change in result.changes:
+        if change.block != block:
+            block = change.block
+            lines.append(f"# {' '.join(block)}")
+        lines.append(f"{COLORS[change.type]}{change.line}\033[39m" if color else f"{change.type[0]} {change.line}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Rebuild a YAMAHA router config whenever the profile changes")
+    parser.add_argument("profile", help="profile script that defines a builder at the top level")
+    parser.add_argument("-o", "--output", help="output file")
+    parser.add_argument("--lock", help="filter lock file (see YamahaRouterConfigBuilder.lock_filters)")
+    parser.add_argument("-w", "--watch", nargs="*", default=[], help="other files to watch (e.g. imported modules)")
+    parser.add_argument("--attr", default="config", help="name of the builder in the profile (default: config)")
+    parser.add_argument("--interval", type=float, default=0.2, help="polling interval in seconds")
+    parser.add_argument("--json", action="store_true", help="print each rebuild as a JSON line")
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(args.profile, args.output, args.lock, args.watch, args.attr)
+    # `python profile.py` と同じように、プロファイルと同じディレクトリのモジュールを import できるようにする
+    sys.path.insert(0, os.path.dirname(watcher.profile))
+    color = sys.stdout.isatty()
+    try:
+        while True:
+            if watcher.changed():
+                try:
+                    result = watcher.rebuild()
+                except Exception:
+                    # 編集途中のプロファイルはエラーになることがあるので、表示して次の変更を待つ
+                    traceback.print_exc()
+                else:
+                    print(json.dumps(result.to_dict(), ensure_ascii=False) if args.json else report(result, color))
+                sys.stdout.flush()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()